@@ -0,0 +1,86 @@
+import os
+import threading
+from exports import inflight_bytes
+from jobs import job_executor, JOB_GROUPS
+from metrics import registry
+from slack_client import TokenBucket
+
+# Pedidos de job por pessoa: ritmo sustentado (por minuto) e rajada permitida
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', '6'))
+ADMISSION_USER_BURST = int(os.getenv('ADMISSION_USER_BURST', '3'))
+# Bytes de exportação em construção acima dos quais novas consultas ao Redshift esperam na fila
+ADMISSION_MAX_INFLIGHT_BYTES = int(os.getenv('ADMISSION_MAX_INFLIGHT_BYTES', 512 * 1024 * 1024))
+# Fração da fila ocupada a partir da qual o /health/ready responde degraded
+ADMISSION_QUEUE_HIGH_WATER = float(os.getenv('ADMISSION_QUEUE_HIGH_WATER', '0.8'))
+# Acima disso os contadores de pessoas com o balde cheio são descartados
+ADMISSION_MAX_USERS = 10000
+
+ADMISSION_EVENTS = registry.counter('slackbot_admission_total', 'Job requests by admission outcome (admitted, throttled, rejected).')
+EXPORT_INFLIGHT_BYTES = registry.gauge('slackbot_export_inflight_bytes', 'Bytes held by exports still being built or uploaded.')
+
+
+# Controle de admissão: limite por pessoa, limite de memória das exportações e prontidão para o balanceador
+class AdmissionControl:
+    def __init__(self, executor, user_rate=ADMISSION_USER_RATE, user_burst=ADMISSION_USER_BURST,
+                 max_inflight_bytes=ADMISSION_MAX_INFLIGHT_BYTES):
+        self.executor = executor
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_inflight_bytes = max_inflight_bytes
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, user_id):
+        with self._lock:
+            bucket = self._users.get(user_id)
+            if bucket is None:
+                if len(self._users) > ADMISSION_MAX_USERS:
+                    for key in [key for key, b in self._users.items() if b.tokens >= b.capacity]:
+                        del self._users[key]
+                bucket = self._users[user_id] = TokenBucket(self.user_rate / 60, self.user_burst)
+            return bucket
+
+    # 0 se a pessoa pode pedir mais um job agora; senão quantos segundos esperar
+    def allow(self, user_id):
+        if user_id is None or self.user_rate <= 0:
+            return 0
+        wait = self._bucket(user_id).try_acquire()
+        ADMISSION_EVENTS.inc(outcome='throttled' if wait else 'admitted')
+        return wait
+
+    def rejected(self):
+        ADMISSION_EVENTS.inc(outcome='rejected')
+
+    # Gate do executor (chamado com o lock dele): segura consultas novas ao Redshift enquanto as exportações
+    # ocupam memória demais; só segura se outra consulta estiver rodando, cujo fim libera a fila
+    def gate(self, job, running):
+        if job.job_type not in JOB_GROUPS['warehouse'] or self.max_inflight_bytes <= 0:
+            return True
+        if not any(running[job_type] for job_type in JOB_GROUPS['warehouse']):
+            return True
+        return inflight_bytes() < self.max_inflight_bytes
+
+    # Motivos para o balanceador deixar de mandar trabalho novo para este processo
+    def readiness(self, jobs=None):
+        jobs = jobs if jobs is not None else self.executor.stats()
+        nbytes = inflight_bytes()
+        EXPORT_INFLIGHT_BYTES.set(nbytes)
+        reasons = []
+        max_queue = jobs.get('max_queue')
+        if max_queue and jobs['queue_depth'] >= ADMISSION_QUEUE_HIGH_WATER * max_queue:
+            reasons.append(f"job queue at {jobs['queue_depth']}/{max_queue}")
+        for group, state in jobs.get('groups', {}).items():
+            if state['limit'] is not None and state['running'] >= state['limit'] and jobs['queue_depth']:
+                reasons.append(f"{group} slots full ({state['running']}/{state['limit']}) with jobs waiting")
+        if self.max_inflight_bytes > 0 and nbytes >= self.max_inflight_bytes:
+            reasons.append(f"exports holding {nbytes} bytes (limit {self.max_inflight_bytes})")
+        return {
+            'status': 'degraded' if reasons else 'ok',
+            'reasons': reasons,
+            'inflight_bytes': nbytes,
+            'max_inflight_bytes': self.max_inflight_bytes,
+        }
+
+
+admission = AdmissionControl(job_executor)
+job_executor.gate = admission.gate
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import time
+
+# Diretório das exportações pré-computadas e quantas versões manter de cada consulta
+ARTIFACT_DIR = os.getenv('EXPORT_ARTIFACT_DIR', 'artifacts')
+ARTIFACT_KEEP = int(os.getenv('EXPORT_ARTIFACT_KEEP', '2'))
+
+
+# Chave de um artefato: a consulta que o gerou e o formato do arquivo
+def export_fingerprint(query_fingerprint, export_format):
+    return f"{query_fingerprint}-{export_format.replace('.', '_')}"
+
+
+# Exportação já gravada em disco, pronta para ser enviada ao Slack
+class Artifact:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def created_at(self):
+        return self.meta['created_at']
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def files(self):
+        return self.meta['files']
+
+    def open_files(self):
+        return [(name, open(os.path.join(self.path, name), 'rb')) for name in self.files]
+
+
+# Guarda as exportações por fingerprint; cada versão fica em um diretório com o horário de criação
+class ArtifactStore:
+    def __init__(self, directory=ARTIFACT_DIR, keep=ARTIFACT_KEEP):
+        self.directory = directory
+        self.keep = max(keep, 1)
+
+    def save(self, fingerprint, export_file, rows, basename):
+        created_at = time.time()
+        path = os.path.join(self.directory, fingerprint, f"{int(created_at * 1000)}")
+        # Grava em um diretório temporário e renomeia, para nunca servir uma versão pela metade
+        os.makedirs(path + '.tmp', exist_ok=True)
+        names = []
+        for name, part in export_file.files(basename):
+            part.seek(0)
+            with open(os.path.join(path + '.tmp', name), 'wb') as output:
+                shutil.copyfileobj(part, output)
+            names.append(name)
+        meta = {'created_at': created_at, 'rows': rows, 'files': names, 'format': export_file.export_format}
+        with open(os.path.join(path + '.tmp', 'meta.json'), 'w') as output:
+            json.dump(meta, output)
+        os.replace(path + '.tmp', path)
+        self._prune(fingerprint)
+        return Artifact(path, meta)
+
+    def _versions(self, fingerprint):
+        directory = os.path.join(self.directory, fingerprint)
+        if not os.path.isdir(directory):
+            return []
+        return sorted((name for name in os.listdir(directory) if name.isdigit()), key=int, reverse=True)
+
+    # Versão mais recente da exportação, ou None se ainda não houver nenhuma
+    def latest(self, fingerprint):
+        for version in self._versions(fingerprint):
+            path = os.path.join(self.directory, fingerprint, version)
+            try:
+                with open(os.path.join(path, 'meta.json')) as meta:
+                    return Artifact(path, json.load(meta))
+            except (OSError, ValueError) as e:
+                print(f"Error reading artifact {path}: {e}")
+        return None
+
+    def _prune(self, fingerprint):
+        for version in self._versions(fingerprint)[self.keep:]:
+            shutil.rmtree(os.path.join(self.directory, fingerprint, version), ignore_errors=True)
+
+
+artifact_store = ArtifactStore()
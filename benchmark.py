@@ -0,0 +1,707 @@
+# Benchmark de ponta a ponta sem Redshift nem Slack de verdade:
+# - um Postgres local com o esquema EAV do Magento (magento.product_basic, product_attribute_var/int/txt...)
+#   preenchido com produtos sintéticos
+# - uma Web API do Slack falsa, em outro processo, que registra mensagens, chat_update e uploads
+# Roda os fluxos generate_redshift_csv, generate_csv e eventos de mensagem pelo próprio Bolt, além das
+# extrações (consulta original com joins por nome x joins x pivot, partições, frame compacto) e grava os resultados em JSON para comparar com um baseline.
+#
+# Uso:
+#   python benchmark.py --products 100000 --baseline benchmarks/baseline.json
+#   python benchmark.py --scenarios events,generate_csv        (sem Postgres)
+#   python benchmark.py --database-url postgresql://user@host/db --reset-schema
+import argparse
+import glob
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+SCENARIOS = ('export', 'generate_csv', 'events', 'extract')
+DEFAULT_TOLERANCE = 0.25
+
+# Métricas comparadas com o baseline: sufixo -> True quando maior é melhor
+METRIC_DIRECTIONS = {
+    '_per_second': True,
+    '_seconds': False,
+    '_ms': False,
+    '_mb': False,
+    '_per_event': False,
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Postgres local descartável (initdb + pg_ctl do PATH ou de BENCH_PG_BIN)
+class LocalPostgres:
+    def __init__(self, directory):
+        self.directory = directory
+        self.port = free_port()
+        self.bin_dir = os.environ.get('BENCH_PG_BIN') or self._find_bin_dir()
+
+    @staticmethod
+    def _find_bin_dir():
+        initdb = shutil.which('initdb')
+        if initdb:
+            return os.path.dirname(initdb)
+        candidates = sorted(glob.glob('/usr/lib/postgresql/*/bin') + glob.glob('/usr/local/pgsql/bin'))
+        if not candidates:
+            raise RuntimeError("Postgres binaries not found: install PostgreSQL, set BENCH_PG_BIN or use --database-url")
+        return candidates[-1]
+
+    def _run(self, name, *args):
+        subprocess.run([os.path.join(self.bin_dir, name), *args], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+    def start(self):
+        data_dir = os.path.join(self.directory, 'data')
+        self._run('initdb', '-D', data_dir, '-U', 'bench', '--auth=trust', '-E', 'UTF8')
+        # Sem fsync: o benchmark mede a leitura, não a durabilidade da carga
+        options = (f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 "
+                   f"-c fsync=off -c synchronous_commit=off -c full_page_writes=off")
+        self._run('pg_ctl', '-D', data_dir, '-o', options, '-l', os.path.join(self.directory, 'postgres.log'), '-w', 'start')
+        return {'host': '127.0.0.1', 'port': str(self.port), 'dbname': 'postgres', 'user': 'bench', 'password': ''}
+
+    def stop(self):
+        self._run('pg_ctl', '-D', os.path.join(self.directory, 'data'), '-m', 'fast', '-w', 'stop')
+
+
+def parse_database_url(url):
+    from psycopg2.extensions import parse_dsn
+    params = parse_dsn(url)
+    return {'host': params.get('host', '127.0.0.1'), 'port': params.get('port', '5432'),
+            'dbname': params.get('dbname', 'postgres'), 'user': params.get('user', ''),
+            'password': params.get('password', '')}
+
+
+# Esquema EAV do Magento como o Redshift o expõe, com produtos sintéticos gerados no próprio servidor
+def load_catalog(params, products, reset=True):
+    import psycopg2
+    from redshift import BASE_ATTRIBUTES, ADDITIONAL_ATTRIBUTES, EXCLUDED_MANUFACTURERS
+
+    conn = psycopg2.connect(**params)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    if not reset:
+        cursor.execute("SELECT to_regclass('magento.bench_meta')")
+        if cursor.fetchone()[0] is not None:
+            cursor.execute("SELECT products FROM magento.bench_meta")
+            if cursor.fetchone()[0] == products:
+                print(f"Reusing the synthetic catalog ({products} products)")
+                conn.close()
+                return
+
+    started_at = time.time()
+    cursor.execute("""
+        DROP SCHEMA IF EXISTS magento CASCADE;
+        DROP SCHEMA IF EXISTS mbdw CASCADE;
+        CREATE SCHEMA magento;
+        CREATE SCHEMA mbdw;
+        -- Função do Redshift usada nas consultas (o valor guardado está em UTC)
+        CREATE OR REPLACE FUNCTION convert_timezone(text, timestamp) RETURNS timestamp AS
+            $$ SELECT ($2 AT TIME ZONE 'UTC') AT TIME ZONE $1 $$ LANGUAGE sql IMMUTABLE;
+        CREATE TABLE magento.bench_meta (products integer);
+        CREATE TABLE magento.attribute_set (id integer, name varchar(255));
+        CREATE TABLE magento.attribute_product (id integer, name varchar(255), label varchar(255));
+        CREATE TABLE magento.manufacturer_listing (manufacturer_id integer, name varchar(255));
+        CREATE TABLE magento.product_basic (
+            id integer, row_id integer, sku varchar(64), attribute_set_id integer, type_id varchar(32),
+            created_at timestamp, updated_at timestamp,
+            _sdc_deleted_at__string varchar(64), _sdc_deleted_at__inst timestamp);
+        CREATE TABLE mbdw.catalog_product_entity_int (
+            row_id integer, attribute_id integer, store_id integer, value integer,
+            _sdc_deleted_at__string varchar(64), _sdc_deleted_at__inst timestamp);
+        CREATE TABLE magento.product_attribute_var (product_id integer, attribute_id integer, store_id integer, value varchar(255));
+        CREATE TABLE magento.product_attribute_int (product_id integer, attribute_id integer, store_id integer, value integer);
+        CREATE TABLE magento.product_attribute_txt (product_id integer, attribute_id integer, store_id integer, value text);
+    """)
+    cursor.execute("INSERT INTO magento.bench_meta VALUES (%s)", (products,))
+    cursor.execute("INSERT INTO magento.attribute_set SELECT g, 'Set ' || g FROM generate_series(1, 20) g")
+    cursor.execute("INSERT INTO magento.manufacturer_listing SELECT g, 'Manufacturer ' || g FROM generate_series(1, 200) g")
+    cursor.execute(f"INSERT INTO magento.manufacturer_listing SELECT unnest(ARRAY{list(EXCLUDED_MANUFACTURERS)}), 'Excluded'")
+    # Sem parâmetros do psycopg2: as expressões usam % (módulo) e os valores são inteiros
+    cursor.execute(f"""
+        INSERT INTO magento.product_basic
+        SELECT g, g, 'SKU-' || lpad(g::text, 8, '0'), 1 + g % 20,
+               CASE WHEN g % 10 = 0 THEN 'configurable' ELSE 'simple' END,
+               timestamp '2020-01-01' + (g % 1000) * interval '1 hour',
+               timestamp '2024-01-01' + (g % 5000) * interval '1 minute',
+               NULL, CASE WHEN g % 500 = 0 THEN timestamp '2024-06-01' END
+        FROM generate_series(1, {int(products)}) g
+    """)
+    # Um em cada 97 produtos pertence a um fabricante excluído da exportação
+    cursor.execute(f"""
+        INSERT INTO mbdw.catalog_product_entity_int
+        SELECT g, 83, 0, CASE WHEN g % 97 = 0 THEN {int(EXCLUDED_MANUFACTURERS[0])} ELSE 1 + g % 200 END, NULL, NULL
+        FROM generate_series(1, {int(products)}) g
+    """)
+
+    attributes = list(dict.fromkeys(BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES))
+    cursor.executemany("INSERT INTO magento.attribute_product VALUES (%s, %s, %s)",
+                       [(attribute_id, name, name.replace('_', ' ').title())
+                        for attribute_id, (_, name) in enumerate(attributes, start=100)])
+    for attribute_id, (table, name) in enumerate(attributes, start=100):
+        value, density = attribute_value_sql(table, name, attribute_id)
+        cursor.execute(f"""
+            INSERT INTO magento.{table} (product_id, attribute_id, store_id, value)
+            SELECT g, {attribute_id}, 0, {value} FROM generate_series(1, {int(products)}) g
+            WHERE (g::bigint * {attribute_id}) % 10 < {density}
+        """)
+    # Valores de outra loja, que as consultas devem ignorar
+    cursor.execute("""
+        INSERT INTO magento.product_attribute_var
+        SELECT product_id, attribute_id, 1, value || ' (store 1)' FROM magento.product_attribute_var WHERE product_id % 10 = 0
+    """)
+
+    # Índices no lugar das sort keys do Redshift
+    for table in ('product_attribute_var', 'product_attribute_int', 'product_attribute_txt'):
+        cursor.execute(f"CREATE INDEX ON magento.{table} (attribute_id, product_id)")
+    cursor.execute("CREATE INDEX ON magento.product_basic (row_id)")
+    cursor.execute("CREATE INDEX ON mbdw.catalog_product_entity_int (row_id)")
+    cursor.execute("ANALYZE")
+    conn.close()
+    print(f"Loaded {products} synthetic products in {time.time() - started_at:.1f}s")
+
+
+WORDS = ['porcelain', 'ceramic', 'vinyl', 'oak', 'walnut', 'matte', 'gloss', 'hexagon', 'plank', 'marble', 'slate', 'linen']
+
+
+# Expressão SQL do valor de um atributo e densidade (em décimos dos produtos que têm o atributo)
+def attribute_value_sql(table, name, attribute_id):
+    words = "(ARRAY[" + ', '.join(f"'{word}'" for word in WORDS) + "])"
+    if name == 'name':
+        return f"initcap({words}[1 + g % 12] || ' ' || {words}[1 + (g / 12) % 12]) || ' ' || g", 10
+    if name == 'url_key':
+        return "'product-' || g", 10
+    if name == 'manufacturer_sku':
+        return "'MS-' || ((g::bigint * 7919) % 1000003)", 9
+    if name == 'hide_from_product_view':
+        return "CASE WHEN g % 20 = 0 THEN 1 ELSE 0 END", 10
+    if name == 'visibility':
+        return "CASE WHEN g % 10 = 0 THEN 1 ELSE 2 END", 10
+    if name == 'status':
+        return "CASE WHEN g % 7 = 0 THEN 2 ELSE 1 END", 10
+    if name == 'category_ids':
+        return "(g % 40) || ',' || (40 + g % 7)", 9
+    if table.endswith('_int'):
+        return f"g % {3 + attribute_id % 50}", 3 + attribute_id % 7
+    if table.endswith('_txt'):
+        return (f"repeat(initcap({words}[1 + (g + {attribute_id}) % 12]) || ' finish for residential and commercial "
+                f"spaces. ', 1 + g % 4) || md5(g::text)"), 3 + attribute_id % 7
+    # Atributos _var com poucos valores distintos (3 a 62), como no catálogo real
+    return f"'{name} ' || ((g::bigint * 7919 + {attribute_id}) % {3 + attribute_id * 37 % 60})", 3 + attribute_id % 7
+
+
+# Web API do Slack falsa: responde como o Slack e registra cada chamada (método, canal, texto, bytes, horário)
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self, body):
+        content_type = self.headers.get('Content-Type', '')
+        if 'json' in content_type:
+            return json.loads(body or b'{}')
+        params = dict(urllib.parse.parse_qsl(body.decode('utf-8', 'replace')))
+        params.update(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        return params
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == '/_bench/calls':
+            with server.condition:
+                self._reply(server.calls[int(query.get('since', 0)):])
+        elif url.path == '/_bench/wait':
+            self._reply(server.wait_for(query))
+        else:
+            self._reply({'ok': False, 'error': 'unknown_method'}, 404)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if server.latency:
+            time.sleep(server.latency)
+        path = urllib.parse.urlsplit(self.path).path
+
+        if path.startswith('/upload/'):
+            server.record('upload', None, '', len(body))
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'OK')
+            return
+
+        method = path.rsplit('/', 1)[-1]
+        params = self._params(body)
+        channel = params.get('channel') or params.get('channel_id')
+        server.record(method, channel, str(params.get('text') or '')[:200], len(body))
+
+        if method == 'auth.test':
+            self._reply({'ok': True, 'url': 'https://bench.slack.com/', 'team': 'bench', 'user': 'bot',
+                         'team_id': 'TBENCH', 'user_id': 'UBOT', 'bot_id': 'BBOT'})
+        elif method in ('chat.postMessage', 'chat.update'):
+            ts = params.get('ts') or server.next_ts()
+            self._reply({'ok': True, 'channel': channel, 'ts': ts, 'message': {'text': params.get('text'), 'ts': ts}})
+        elif method == 'files.getUploadURLExternal':
+            file_id = f"F{server.next_ts().replace('.', '')}"
+            self._reply({'ok': True, 'file_id': file_id,
+                         'upload_url': f"http://127.0.0.1:{server.server_address[1]}/upload/{file_id}"})
+        elif method == 'files.completeUploadExternal':
+            files = params.get('files')
+            files = json.loads(files) if isinstance(files, str) else files or []
+            self._reply({'ok': True, 'files': [{'id': f.get('id'), 'title': f.get('title')} for f in files]})
+        else:
+            self._reply({'ok': True})
+
+
+class FakeSlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, FakeSlackHandler)
+        self.latency = latency
+        self.calls = []
+        self.condition = threading.Condition()
+        self._ts = 0
+
+    def next_ts(self):
+        with self.condition:
+            self._ts += 1
+            return f"{int(time.time())}.{self._ts:06d}"
+
+    def record(self, method, channel, text, nbytes):
+        with self.condition:
+            self.calls.append({'t': time.time(), 'method': method, 'channel': channel, 'text': text, 'bytes': nbytes})
+            self.condition.notify_all()
+
+    # Espera a primeira chamada (a partir de since) com o método, o canal e um dos prefixos de texto pedidos
+    def wait_for(self, query):
+        deadline = time.time() + float(query.get('timeout', 600))
+        prefixes = [prefix for prefix in query.get('prefix', '').split('|') if prefix]
+        position = int(query.get('since', 0))
+        with self.condition:
+            while True:
+                for call in self.calls[position:]:
+                    if (call['method'] == query['method'] and call['channel'] == query.get('channel')
+                            and (not prefixes or any(call['text'].startswith(prefix) for prefix in prefixes))):
+                        return call
+                position = len(self.calls)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+
+def run_fake_slack(port, latency):
+    FakeSlackServer(('127.0.0.1', port), latency).serve_forever()
+
+
+# Slack falso em outro processo, para não disputar o GIL com o bot medido
+class FakeSlack:
+    def __init__(self, latency=0.0):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = multiprocessing.get_context('fork').Process(
+            target=run_fake_slack, args=(self.port, latency), daemon=True)
+
+    def start(self):
+        self.process.start()
+        for _ in range(100):
+            try:
+                self.calls()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("Fake Slack API did not start")
+
+    def _get(self, path, **query):
+        with urllib.request.urlopen(f"{self.url}{path}?{urllib.parse.urlencode(query)}", timeout=700) as response:
+            return json.load(response)
+
+    def calls(self, since=0):
+        return self._get('/_bench/calls', since=since)
+
+    def count(self):
+        return len(self.calls())
+
+    def wait_for(self, method, channel, since, prefixes=(), timeout=600):
+        return self._get('/_bench/wait', method=method, channel=channel, since=since,
+                         prefix='|'.join(prefixes), timeout=timeout)
+
+    def stop(self):
+        self.process.terminate()
+
+
+# RSS (MB) do processo e dos filhos (pool de serialização), amostrado em segundo plano
+def process_tree_rss():
+    try:
+        pids = [os.getpid()]
+        for task in os.listdir('/proc/self/task'):
+            with open(f'/proc/self/task/{task}/children') as children:
+                pids.extend(int(pid) for pid in children.read().split())
+        total = 0
+        for pid in pids:
+            with open(f'/proc/{pid}/statm') as statm:
+                total += int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        return total / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = process_tree_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss())
+
+
+def percentiles(values, suffix='_seconds', scale=1.0):
+    import numpy as np
+    if not values:
+        return {}
+    values = np.asarray(values) * scale
+    return {f'p50{suffix}': round(float(np.percentile(values, 50)), 4),
+            f'p90{suffix}': round(float(np.percentile(values, 90)), 4),
+            f'p99{suffix}': round(float(np.percentile(values, 99)), 4),
+            f'max{suffix}': round(float(values.max()), 4)}
+
+
+def uploaded_bytes(calls):
+    return sum(call['bytes'] for call in calls if call['method'] == 'upload')
+
+
+# Importa o bot (buttons-interaction.py) apontando para o Slack falso; o App faz auth.test na criação
+def load_bot():
+    spec = importlib.util.spec_from_file_location('bot', os.path.join(REPO_DIR, 'buttons-interaction.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def action_request(action_id, channel, user='UBENCH'):
+    from slack_bolt.request import BoltRequest
+    body = {
+        'type': 'block_actions', 'api_app_id': 'ABENCH', 'token': 'bench', 'trigger_id': 'bench',
+        'team': {'id': 'TBENCH'}, 'user': {'id': user}, 'channel': {'id': channel},
+        'container': {'type': 'message', 'channel_id': channel, 'message_ts': '1.0'},
+        'actions': [{'type': 'button', 'action_id': action_id, 'block_id': 'menu', 'value': action_id,
+                     'action_ts': str(time.time())}],
+    }
+    return BoltRequest(body=body, mode='socket_mode')
+
+
+def message_request(channel, user, text='hello'):
+    from slack_bolt.request import BoltRequest
+    ts = f"{time.time():.6f}"
+    body = {
+        'type': 'event_callback', 'team_id': 'TBENCH', 'api_app_id': 'ABENCH', 'token': 'bench',
+        'event_id': f"Ev{ts.replace('.', '')}", 'event_time': int(time.time()),
+        'event': {'type': 'message', 'channel': channel, 'user': user, 'text': text, 'ts': ts, 'channel_type': 'channel'},
+    }
+    return BoltRequest(body=body, mode='socket_mode')
+
+
+# Clique no botão até a mensagem final no canal; cada iteração usa um canal novo (limite por canal do Slack)
+def run_action(bot, slack, action_id, iterations, method, prefixes=()):
+    latencies = []
+    before = slack.count()
+    with RssSampler() as rss:
+        for i in range(iterations):
+            channel = f"C{action_id.upper()}{i}"
+            since = slack.count()
+            started_at = time.time()
+            # Uma pessoa por clique: o limite de pedidos por pessoa não entra na medição
+            response = bot.slack_app.dispatch(action_request(action_id, channel, user=f"UBENCH{i}"))
+            if response.status != 200:
+                raise RuntimeError(f"{action_id} was not acknowledged: {response.status} {response.body}")
+            call = slack.wait_for(method, channel, since, prefixes)
+            if call is None:
+                raise RuntimeError(f"{action_id} did not finish in channel {channel}")
+            latencies.append(call['t'] - started_at)
+    calls = slack.calls(before)
+    return dict(percentiles(latencies), iterations=iterations, peak_rss_mb=round(rss.peak, 1),
+                bytes_uploaded=uploaded_bytes(calls), chat_updates=sum(call['method'] == 'chat.update' for call in calls),
+                slack_calls=len(calls))
+
+
+def bench_export(bot, slack, iterations):
+    finished = ("Export generated", "Failed", "An error")
+    # Refresh: consulta, serialização, artefato e upload; clique normal: upload do artefato já pronto
+    results = {'refresh': run_action(bot, slack, 'refresh_redshift_csv', iterations, 'chat.postMessage', finished)}
+    results['from_artifact'] = run_action(bot, slack, 'generate_redshift_csv', iterations, 'chat.postMessage', finished)
+    return results
+
+
+def bench_generate_csv(bot, slack, iterations):
+    return run_action(bot, slack, 'generate_csv', iterations, 'files.completeUploadExternal')
+
+
+# Rajada de mensagens em poucos canais, despachadas como o SocketModeHandler faz (várias threads)
+def bench_events(bot, slack, events, channels=20, users=100, concurrency=10):
+    before = slack.count()
+    acks = []
+
+    def dispatch(i):
+        started_at = time.perf_counter()
+        bot.slack_app.dispatch(message_request(f"CEVENTS{i % channels}", f"U{(i * 7) % users}"))
+        acks.append(time.perf_counter() - started_at)
+
+    with RssSampler() as rss:
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(dispatch, range(events)))
+        elapsed = time.perf_counter() - started_at
+        # Espera as chamadas de saída terminarem (nenhuma chamada nova por meio segundo)
+        count = slack.count()
+        while True:
+            time.sleep(0.5)
+            if slack.count() == count:
+                break
+            count = slack.count()
+
+    calls = slack.calls(before)
+    posts = sum(call['method'] == 'chat.postMessage' for call in calls)
+    return dict(percentiles(acks, '_ack_ms', 1000), events=events, events_per_second=round(events / elapsed, 1),
+                menus_posted=posts, outbound_calls_per_event=round(len(calls) / events, 4),
+                peak_rss_mb=round(rss.peak, 1))
+
+
+# Consulta original do catálogo: um JOIN com magento.attribute_product por atributo, resolvendo o id pelo nome,
+# sem o catálogo de atributos nem partições; é o ponto de partida das otimizações de extração
+def extract_joins_by_name():
+    import redshift
+
+    pool = redshift.get_pool()
+    with pool.connection() as conn, redshift.raise_query_errors():
+        return redshift.query_to_dataframe(conn, redshift.build_catalog_query(None))
+
+
+# Extração do catálogo: consulta original, joins x pivot, número de partições e memória do frame (objetos x compacto)
+def bench_extract(partitions, iterations):
+    import redshift
+
+    results = {}
+    timings = []
+    with RssSampler() as rss:
+        for _ in range(iterations):
+            started_at = time.perf_counter()
+            df = extract_joins_by_name()
+            timings.append(time.perf_counter() - started_at)
+    results['joins_by_name'] = dict(percentiles(timings), rows=len(df), peak_rss_mb=round(rss.peak, 1))
+
+    for mode in ('joins', 'pivot'):
+        for count in partitions:
+            timings = []
+            with RssSampler() as rss:
+                for _ in range(iterations):
+                    started_at = time.perf_counter()
+                    df = redshift.main(extraction_mode=mode, limit=None, compact=False, partitions=count)
+                    timings.append(time.perf_counter() - started_at)
+            results[f"{mode}_{count}_partitions"] = dict(
+                percentiles(timings), rows=len(df), peak_rss_mb=round(rss.peak, 1))
+
+    frame = redshift.restore_empty_strings(df)
+    results['frame_memory'] = {
+        'object_mb': round(frame.astype(object).memory_usage(deep=True).sum() / 2 ** 20, 1),
+        'compact_mb': round(redshift.compact_catalog_frame(frame).memory_usage(deep=True).sum() / 2 ** 20, 1),
+        'rows': len(frame),
+    }
+    return results
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def metric_direction(name):
+    for suffix, higher_is_better in METRIC_DIRECTIONS.items():
+        if name.endswith(suffix):
+            return higher_is_better
+    return None
+
+
+# Métricas piores que o baseline além da tolerância (fração)
+def find_regressions(results, baseline, tolerance):
+    current, previous = flatten(results['scenarios']), flatten(baseline['scenarios'])
+    regressions = []
+    for name, value in sorted(current.items()):
+        higher_is_better = metric_direction(name)
+        old = previous.get(name)
+        if higher_is_better is None or not isinstance(old, (int, float)) or not old:
+            continue
+        change = (value - old) / old
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the Slack bot.")
+    parser.add_argument('--products', type=int, default=20000, help="synthetic products in the warehouse")
+    parser.add_argument('--iterations', type=int, default=5, help="runs of each button flow")
+    parser.add_argument('--events', type=int, default=2000, help="message events in the burst")
+    parser.add_argument('--partitions', default='1,2,4', help="partition counts for the extract scenario")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument('--slack-latency-ms', type=float, default=20, help="latency added to each fake Slack call")
+    parser.add_argument('--database-url', help="existing Postgres database instead of a temporary local server")
+    parser.add_argument('--reset-schema', action='store_true',
+                        help="drop and reload the magento/mbdw schemas in --database-url")
+    parser.add_argument('--output', default='benchmark-results.json', help="where to write the results")
+    parser.add_argument('--baseline', help="baseline JSON to compare with (exit code 1 on regression)")
+    parser.add_argument('--update-baseline', action='store_true', help="write the results to --baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed relative regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = tempfile.mkdtemp(prefix='slackbot-bench-')
+    postgres = None
+    # O Slack falso é criado antes de qualquer thread do bot (fork)
+    slack = FakeSlack(args.slack_latency_ms / 1000).start()
+    try:
+        params = None
+        if {'export', 'extract'} & set(scenarios):
+            if args.database_url:
+                params = parse_database_url(args.database_url)
+            else:
+                postgres = LocalPostgres(workdir)
+                params = postgres.start()
+
+        # Configuração lida pelos módulos na importação; artefatos e snapshots ficam no diretório temporário
+        os.environ.update({
+            'SLACK_BOT_TOKEN': 'xoxb-bench', 'SLACK_APP_TOKEN': 'xapp-bench', 'SLACK_API_URL': f"{slack.url}/api/",
+            'EXPORT_SCHEDULE': '', 'REDSHIFT_EXPORT_LIMIT': '',
+        })
+        if params:
+            os.environ.update({'REDSHIFT_HOST': params['host'], 'REDSHIFT_PORT': params['port'],
+                               'REDSHIFT_DBNAME': params['dbname'], 'REDSHIFT_USER': params['user'],
+                               'REDSHIFT_PASSWORD': params['password']})
+        os.chdir(workdir)
+        if params:
+            load_catalog(params, args.products, reset=postgres is not None or args.reset_schema)
+
+        bot = load_bot()
+        results = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpus': os.cpu_count(), 'pandas': __import__('pandas').__version__},
+            'parameters': {'products': args.products, 'iterations': args.iterations, 'events': args.events,
+                           'slack_latency_ms': args.slack_latency_ms},
+            'scenarios': {},
+        }
+        for name in scenarios:
+            print(f"Running {name}...")
+            started_at = time.time()
+            if name == 'export':
+                bot.warm_pool()
+                results['scenarios'][name] = bench_export(bot, slack, args.iterations)
+            elif name == 'generate_csv':
+                results['scenarios'][name] = bench_generate_csv(bot, slack, args.iterations)
+            elif name == 'events':
+                results['scenarios'][name] = bench_events(bot, slack, args.events)
+            elif name == 'extract':
+                partitions = [int(count) for count in args.partitions.split(',') if count.strip()]
+                results['scenarios'][name] = bench_extract(partitions, args.iterations)
+            print(f"  {name} took {time.time() - started_at:.1f}s")
+        bot.job_executor.shutdown()
+    finally:
+        slack.stop()
+        if postgres is not None:
+            postgres.stop()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    for name, value in flatten(results['scenarios']).items():
+        print(f"{name:55} {value}")
+    print(f"Results written to {output}")
+
+    if baseline_path and args.update_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated: {baseline_path}")
+    elif baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old} -> {new} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 import os
 from slack_bolt import App, Ack
@@ -8,8 +7,26 @@ import openai
 import time
 import pandas as pd
 import io
-from redshift import main
-from flask import Flask, jsonify
+import json
+import asyncio
+from redshift import (main, export_catalog, warm_pool, catalog_fingerprint, restore_empty_strings, catalog_snapshot,
+                      EXTRACTION_MODE, CHUNK_SIZE, COMPACT_FRAMES)
+from jobs import job_executor, JobRejected
+from admission import admission
+from supervisor import Supervisor
+from metrics import registry, render, with_labels, stage
+from slack_client import get_slack_client, get_async_slack_client, upload_files
+from progress import ProgressMessage
+from exports import ExportFile, EXPORT_FORMAT
+from artifacts import artifact_store, export_fingerprint
+from scheduler import Scheduler, EXPORT_SCHEDULE
+from diffs import catalog_diff, row_hashes
+from spellcheck import spell_checker
+from sentences import sentence_checker
+from images import image_scanner, IMAGE_URL_TEMPLATE
+from lookup import CatalogIndex, LOOKUP_FIELDS
+from menus import menu_debouncer
+from flask import Flask, jsonify, Response
 
 # Load environment variables
 load_dotenv()
@@ -18,120 +35,202 @@ api_key = os.environ.get('OPENAI_API_KEY')
 SLACK_BOT_TOKEN = os.environ.get('SLACK_BOT_TOKEN')
 SLACK_APP_TOKEN = os.environ.get('SLACK_APP_TOKEN')
 
+# Limite de linhas da exportação do Redshift (vazio = catálogo completo)
+EXPORT_LIMIT = int(os.environ['REDSHIFT_EXPORT_LIMIT']) if os.environ.get('REDSHIFT_EXPORT_LIMIT') else None
+# Idade máxima (segundos) de uma exportação pré-computada para ainda ser servida no clique
+EXPORT_ARTIFACT_MAX_AGE = float(os.environ.get('EXPORT_ARTIFACT_MAX_AGE', 24 * 3600))
+EXPORT_BASENAME = "redshift_output"
+# Chave das exportações guardadas: muda quando a consulta, o limite ou o formato mudam
+EXPORT_FINGERPRINT = export_fingerprint(catalog_fingerprint(EXTRACTION_MODE, EXPORT_LIMIT), EXPORT_FORMAT)
+
+# Runtime do bot: 'threads' (Flask + SocketModeHandler) ou 'async' (AsyncApp + aiohttp)
+BOT_RUNTIME = os.environ.get('BOT_RUNTIME', 'threads')
+# Processos worker, cada um com sua própria conexão Socket Mode (1 = processo único)
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', '1'))
+
 # Set up OpenAI and Slack app
 openai.api_key = api_key
-slack_app = App(token=SLACK_BOT_TOKEN)
+slack_client = get_slack_client()
+slack_app = App(client=slack_client)
 
 app = Flask(__name__)
 
+# Definido quando o processo principal supervisiona vários workers
+supervisor = None
+
+
+# O Bolt cria um WebClient por requisição; usa o cliente compartilhado para que say() também respeite os limites
+@slack_app.middleware
+def use_shared_client(context, next):
+    context["client"] = slack_client
+    next()
+
+
+# Prontidão deste processo ou, com supervisor, de todos os workers: degraded se algum está saturado
+def readiness():
+    if supervisor is not None:
+        health = supervisor.health()
+        reasons = [f"worker {worker['index']}: {reason}" for worker in health["workers"]
+                   for reason in worker.get("admission", {}).get("reasons", [])]
+        if health["status"] != "ok":
+            reasons.append(f"workers {health['status']}")
+        return dict(health, status="degraded" if reasons else "ok", reasons=reasons), health["status"] != "down"
+    jobs = job_executor.stats()
+    return dict(admission.readiness(jobs), jobs=jobs), True
+
 
-# Rota de saúde para o Render verificar se o serviço está ativo
+# Rota de saúde para o Render verificar se o serviço está ativo (vivo + prontidão no corpo)
 @app.route("/health")
 def health_check():
+    health, alive = readiness()
+    return jsonify(health), 200 if alive else 503
+
+
+# Liveness: o processo responde; reiniciar não resolve uma fila cheia
+@app.route("/health/live")
+def liveness_check():
+    if supervisor is not None and supervisor.health()["status"] == "down":
+        return jsonify({"status": "down"}), 503
     return jsonify({"status": "ok"}), 200
 
 
-def send_buttons(channel_id):
-    client = WebClient(token=os.environ["SLACK_BOT_TOKEN"])
-    try:
-        # Button structure
-        blocks = [
+# Readiness: 503 enquanto saturado, para o balanceador mandar trabalho novo a outra instância
+@app.route("/health/ready")
+def readiness_check():
+    health, alive = readiness()
+    return jsonify(health), 200 if alive and health["status"] == "ok" else 503
+
+
+# Métricas no formato de texto do Prometheus (com label worker no modo multiprocesso)
+@app.route("/metrics")
+def metrics_endpoint():
+    if supervisor is not None:
+        families = []
+        for index, report in supervisor.reports().items():
+            families.extend(with_labels(report.get('metrics', []), worker=str(index)))
+    else:
+        families = registry.collect()
+    return Response(render(families), mimetype="text/plain; version=0.0.4")
+
+
+# Relatório que cada worker envia ao supervisor junto com o sinal de vida
+def worker_report():
+    jobs = job_executor.stats()
+    return {"jobs": jobs, "admission": admission.readiness(jobs), "metrics": registry.collect()}
+
+
+# Estrutura do menu de botões
+MENU_BLOCKS = [
+    {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": "Choose an action:"
+        }
+    },
+    {
+        "type": "actions",
+        "elements": [
             {
-                "type": "section",
+                "type": "button",
                 "text": {
-                    "type": "mrkdwn",
-                    "text": "Choose an action:"
-                }
+                    "type": "plain_text",
+                    "text": "Search for missing images"
+                },
+                "action_id": "missing_images",
+                "value": "missing_images"
+            },
+            # {
+            #     "type": "button",
+            #     "text": {
+            #         "type": "plain_text",
+            #         "text": "Problems with text formatting"
+            #     },
+            #     "action_id": "text_formatting",
+            #     "value": "text_formatting"
+            # },
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Incorrect sentences"
+                },
+                "action_id": "wrong_sentences",
+                "value": "wrong_sentences"
+            },
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Misspelled words"
+                },
+                "action_id": "misspelled_words",
+                "value": "misspelled_words"
+            },
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Generate CSV"
+                },
+                "action_id": "generate_csv",
+                "value": "generate_csv"
+            },
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Generate Redshift CSV"
+                },
+                "action_id": "generate_redshift_csv",
+                "value": "generate_redshift_csv"
+            },
+            {
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Diff since last run"
+                },
+                "action_id": "catalog_diff",
+                "value": "catalog_diff"
             },
             {
-                "type": "actions",
-                "elements": [
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Search for missing images"
-                        },
-                        "action_id": "missing_images",
-                        "value": "missing_images"
-                    },
-                    # {
-                    #     "type": "button",
-                    #     "text": {
-                    #         "type": "plain_text",
-                    #         "text": "Problems with text formatting"
-                    #     },
-                    #     "action_id": "text_formatting",
-                    #     "value": "text_formatting"
-                    # },
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Incorrect sentences"
-                        },
-                        "action_id": "wrong_sentences",
-                        "value": "wrong_sentences"
-                    },
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Misspelled words"
-                        },
-                        "action_id": "misspelled_words",
-                        "value": "misspelled_words"
-                    },
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Generate CSV"
-                        },
-                        "action_id": "generate_csv",
-                        "value": "generate_csv"
-                    },
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Generate Redshift CSV"
-                        },
-                        "action_id": "generate_redshift_csv",
-                        "value": "generate_redshift_csv"
-                    },
-                    {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "text": "Count to Ten"
-                        },
-                        "action_id": "count_to_ten",
-                        "value": "count_to_ten"
-                    }
-                ]
+                "type": "button",
+                "text": {
+                    "type": "plain_text",
+                    "text": "Count to Ten"
+                },
+                "action_id": "count_to_ten",
+                "value": "count_to_ten"
             }
         ]
-        response = client.chat_postMessage(
-            channel=channel_id,
-            text="Please choose an action from the buttons below.",
-            blocks=blocks
-        )
+    }
+]
+
+MENU_TEXT = "Please choose an action from the buttons below."
+# Blocos do menu serializados uma única vez; o slack_sdk envia a string sem converter de novo
+MENU_PAYLOAD = json.dumps(MENU_BLOCKS)
+
+
+def send_buttons(channel_id):
+    try:
+        slack_client.chat_postMessage(channel=channel_id, text=MENU_TEXT, blocks=MENU_PAYLOAD)
+        return True
     except SlackApiError as e:
         print(f"Error: {e}")
+        return False
 
 
 def count_to_ten(channel_id):
-    client = WebClient(token=os.environ["SLACK_BOT_TOKEN"])
     # Envia a mensagem inicial
-    response = client.chat_postMessage(channel=channel_id, text="Counting: 0")
+    response = slack_client.chat_postMessage(channel=channel_id, text="Counting: 0")
     ts = response['ts']  # Timestamp da mensagem original
 
     # Atualiza a mesma mensagem com um novo número a cada segundo
     for i in range(1, 11):
         time.sleep(1)  # Delay entre as atualizações
         new_text = f"Counting: {i}"
-        client.chat_update(channel=channel_id, ts=ts, text=new_text)
+        slack_client.chat_update(channel=channel_id, ts=ts, text=new_text)
 
 
 def generate_csv_and_upload(channel_id):
@@ -149,9 +248,8 @@ def generate_csv_and_upload(channel_id):
     output.seek(0)  # Rewind the file-like object to the beginning
 
     # Upload the file to Slack using files_upload_v2
-    client = WebClient(token=os.environ["SLACK_BOT_TOKEN"])
     try:
-        client.files_upload_v2(
+        slack_client.files_upload_v2(
             channel=channel_id,  # Use 'channel' instead of 'channels'
             file=output,
             filename="report.csv",
@@ -163,12 +261,96 @@ def generate_csv_and_upload(channel_id):
         output.close()
 
 
+# Enfileira um job pedido por uma pessoa: aplica o limite por pessoa, recusa com a fila cheia e avisa a posição
+# Retorna None se o pedido não foi aceito, senão se ele foi agregado a um job idêntico (como job_executor.submit)
+def submit_request(say, user_id, job_type, fn, **kwargs):
+    wait = admission.allow(user_id)
+    if wait:
+        say(text=f"You are sending requests too quickly, please try again in {int(wait) + 1}s.")
+        return None
+    try:
+        coalesced = job_executor.submit(job_type, fn, **kwargs)
+    except JobRejected:
+        admission.rejected()
+        say(text="The bot is at capacity right now, please try again in a few minutes.")
+        return None
+    if not coalesced:
+        position = job_executor.position(job_type, key=kwargs.get('key'), channel=kwargs.get('channel'))
+        if position:
+            say(text=f"Your request is queued (position {position}), it will start as soon as a slot frees up.")
+    return coalesced
+
+
 @slack_app.action("generate_csv")
 def handle_generate_csv(ack, body, say):
     ack()
     say(text="Processing your request, please wait... :hourglass_flowing_sand:")
     channel_id = body['channel']['id']
-    generate_csv_and_upload(channel_id)
+    start_generate_csv(channel_id, say, body['user']['id'])
+
+
+def start_generate_csv(channel_id, say, user_id=None):
+    submit_request(say, user_id, "generate_csv", lambda: generate_csv_and_upload(channel_id), channel=channel_id)
+
+
+# Gera a exportação do Redshift e guarda o resultado como a versão mais recente do artefato
+# Sem channel_id (execução agendada) não há mensagem de progresso
+def run_redshift_export(channel_id=None):
+    progress = ProgressMessage(slack_client, channel_id, "Redshift export").start() if channel_id else None
+    export_file = ExportFile()
+    try:
+        rows = export_catalog(export_file.write, limit=EXPORT_LIMIT, progress=progress)
+        export_file.close()
+        artifact = artifact_store.save(EXPORT_FINGERPRINT, export_file, rows, EXPORT_BASENAME) if rows is not None else None
+    except Exception:
+        if progress is not None:
+            progress.finish("failed")
+        raise
+    finally:
+        export_file.cleanup()
+    if artifact is None and progress is not None:
+        progress.finish("failed")
+    return artifact, progress
+
+
+def finish_redshift_export(result):
+    artifact, progress = result
+    if progress is not None:
+        progress.finish()
+
+
+# Mensagem final com a data dos dados e o botão para gerar uma versão nova
+def export_message_blocks(text):
+    return [
+        {"type": "section", "text": {"type": "mrkdwn", "text": text}},
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Refresh now"},
+                    "action_id": "refresh_redshift_csv",
+                    "value": "refresh_redshift_csv"
+                }
+            ]
+        }
+    ]
+
+
+def upload_artifact(channel_id, artifact, say, progress=None):
+    files = artifact.open_files()
+    try:
+        # O progresso do upload aparece na mensagem do canal que iniciou a exportação
+        upload_files(slack_client, channel_id, files, "Your Redshift CSV Data",
+                     progress=progress if progress is not None and progress.channel == channel_id else None)
+    finally:
+        for _, fileobj in files:
+            fileobj.close()
+    parts = f", {len(files)} parts" if len(files) > 1 else ""
+    generated_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(artifact.created_at))
+    text = (f"Export generated from Redshift and uploaded successfully ({artifact.rows} rows, {EXPORT_FORMAT}{parts}). "
+            f"Data as of {generated_at} ({artifact.age / 60:.0f} min ago).")
+    say(text=text, blocks=export_message_blocks(text))
 
 
 # Handler para o botão "Generate Redshift CSV"
@@ -177,25 +359,207 @@ def handle_generate_csv(ack, body, say):
     ack()
     channel_id = body['channel']['id']
     say(text="Processing your Redshift CSV request, please wait... :hourglass_flowing_sand:")
+    start_redshift_export(channel_id, say, body['user']['id'])
+
+
+@slack_app.action("refresh_redshift_csv")
+def handle_refresh_redshift_csv(ack, body, say):
+    ack()
+    channel_id = body['channel']['id']
+    say(text="Refreshing the Redshift export from the warehouse, please wait... :hourglass_flowing_sand:")
+    start_redshift_export(channel_id, say, body['user']['id'], refresh=True)
+
+
+# Envia a exportação pré-computada mais recente ou, sem uma válida (ou com refresh), enfileira uma nova
+# say é chamado pelas threads do executor com o resultado
+def start_redshift_export(channel_id, say, user_id=None, refresh=False):
+    def report_error(e):
+        say(f"An error occurred while generating or uploading the CSV: {e}")
+
+    artifact = None if refresh else artifact_store.latest(EXPORT_FINGERPRINT)
+    if artifact is not None and artifact.age <= EXPORT_ARTIFACT_MAX_AGE:
+        submit_request(say, user_id, "upload_artifact", lambda: upload_artifact(channel_id, artifact, say),
+                       on_error=report_error, channel=channel_id)
+        return
+
+    def upload_result(result):
+        artifact, progress = result
+        if artifact is None:
+            say(text="Failed to generate the CSV from Redshift.")
+            return
+        try:
+            upload_artifact(channel_id, artifact, say, progress)
+        except Exception as e:
+            report_error(e)
+
+    # Cliques simultâneos (e a execução agendada) compartilham a mesma consulta e recebem o mesmo arquivo
+    coalesced = submit_request(
+        say,
+        user_id,
+        "generate_redshift_csv",
+        lambda: run_redshift_export(channel_id),
+        on_done=upload_result,
+        on_error=report_error,
+        key="generate_redshift_csv",
+        channel=channel_id,
+        cleanup=finish_redshift_export
+    )
+    if coalesced:
+        say(text="An identical export is already running, you will receive the same file.")
+
+
+# Regenera a exportação em segundo plano, para que os cliques sejam atendidos do artefato
+def refresh_export_artifact():
+    try:
+        job_executor.submit("generate_redshift_csv", run_redshift_export,
+                            key="generate_redshift_csv", cleanup=finish_redshift_export)
+    except JobRejected as e:
+        # A execução agendada seguinte tenta de novo
+        print(f"Scheduled export skipped: {e}")
+
+
+def start_export_scheduler():
+    if not EXPORT_SCHEDULE:
+        return None
+    # Sem nenhuma versão guardada, gera a primeira já na inicialização
+    if artifact_store.latest(EXPORT_FINGERPRINT) is None:
+        refresh_export_artifact()
+    scheduler = Scheduler(EXPORT_SCHEDULE, refresh_export_artifact, name="export-scheduler").start()
+    print(f"Export scheduler started ({EXPORT_SCHEDULE})")
+    return scheduler
+
+
+# Compara o catálogo atual com o da última comparação e gera um arquivo só com as mudanças
+# A base é a da última comparação, não a da última exportação: a exportação grava blocos já renomeados e
+# com outros tipos (Decimal, '' em vez de nulo), e os hashes precisam vir do mesmo DataFrame do main()
+# Retorna (arquivo ou None se ainda não havia base, contagem por tipo de mudança, produtos no catálogo,
+# horário da base anterior)
+def run_catalog_diff():
+    df = main(limit=EXPORT_LIMIT, compact=COMPACT_FRAMES)
+    if df is None:
+        return None
+    baseline_at = catalog_diff.baseline_info()['saved_at'] if catalog_diff.has_baseline else None
+    with stage('diff'):
+        hashes = row_hashes(df)
+        report = catalog_diff.compare(df, hashes)
+    catalog_diff.save(df, hashes)
+    if report is None:
+        return None, {}, len(df), None
+
+    counts = {change: int((report['change'] == change).sum()) for change in ('added', 'removed', 'modified')}
+    export_file = ExportFile()
+    try:
+        for start in range(0, len(report), CHUNK_SIZE):
+            export_file.write(restore_empty_strings(report.iloc[start:start + CHUNK_SIZE]))
+        export_file.close()
+    except Exception:
+        export_file.cleanup()
+        raise
+    return export_file, counts, len(df), baseline_at
+
+
+def finish_catalog_diff(result):
+    export_file = result[0]
+    if export_file is not None:
+        export_file.cleanup()
+
+
+# Handler para o botão "Diff since last run"
+@slack_app.action("catalog_diff")
+def handle_catalog_diff(ack, body, say):
+    ack()
+    say(text="Comparing the catalog with the last diff, please wait... :hourglass_flowing_sand:")
+    start_catalog_diff(body['channel']['id'], say, body['user']['id'])
+
+
+def start_catalog_diff(channel_id, say, user_id=None):
+    def upload_diff(result):
+        if result is None:
+            say(text="Failed to read the catalog from Redshift.")
+            return
+        export_file, counts, products, baseline_at = result
+        if baseline_at is None:
+            say(text=f"No previous diff to compare with. Saved the current catalog ({products} products) "
+                     f"as the baseline for the next diff.")
+            return
+        since = time.strftime("%Y-%m-%d %H:%M", time.localtime(baseline_at))
+        if not any(counts.values()):
+            say(text=f"No changes since the last diff on {since} ({products} products).")
+        else:
+            upload_files(slack_client, channel_id, export_file.files("catalog_diff"), f"Catalog changes since {since}")
+            say(text=f"Catalog changes since the last diff on {since}: {counts['added']} added, "
+                     f"{counts['removed']} removed, {counts['modified']} modified ({products} products, "
+                     f"changed columns in `changed_columns`).")
+
+    def report_error(e):
+        say(f"An error occurred while comparing the catalog: {e}")
+
+    submit_request(say, user_id, "catalog_diff", run_catalog_diff, on_done=upload_diff, on_error=report_error,
+                   key="catalog_diff", channel=channel_id, cleanup=finish_catalog_diff)
+
+
+# Catálogo usado pelo lookup: no modo snapshot, a cópia local (sem consultar o Redshift)
+def load_lookup_catalog():
+    if EXTRACTION_MODE == 'snapshot':
+        if catalog_snapshot.df is None:
+            catalog_snapshot.load()
+        if catalog_snapshot.df is not None:
+            return catalog_snapshot.df
+    return main(limit=EXPORT_LIMIT, compact=COMPACT_FRAMES, rename=False)
+
+
+# Versão da cópia local: o índice é reconstruído quando o snapshot é atualizado
+def lookup_catalog_version():
     try:
-        df = main()  # Executa a função que retorna o DataFrame
-        if df is not None:
-            output = io.BytesIO()
-            df.to_csv(output, index=False, encoding='utf-8')
-            output.seek(0)  # Rewind to the start of the file-like object
-            client = WebClient(token=os.environ["SLACK_BOT_TOKEN"])
-            client.files_upload_v2(
-                channel=channel_id,
-                file=output,
-                filename="redshift_output.csv",
-                title="Your Redshift CSV Data"
-            )
-            output.close()
-            say(text="CSV generated from Redshift and uploaded successfully.")
+        return os.path.getmtime(catalog_snapshot.data_path)
+    except OSError:
+        return None
+
+
+catalog_index = CatalogIndex(load_lookup_catalog,
+                             version=lookup_catalog_version if EXTRACTION_MODE == 'snapshot' else None)
+
+
+def format_lookup_value(value):
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    value = ' '.join(str(value).split())
+    return value[:200] + '…' if len(value) > 200 else value or None
+
+
+# Resposta do lookup (texto e blocos): todos os atributos de um produto ou um resumo de cada produto
+def lookup_blocks(query):
+    result = catalog_index.search(query)
+    if result is None:
+        return "The catalog index is still loading, please try again in a moment.", None
+    products, total = result
+    if products.empty:
+        return f"No products found for `{query}`.", None
+
+    text = f"{total} product{'s' if total != 1 else ''} found for `{query}`" + (f", showing the first {len(products)}." if total > len(products) else ".")
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+    for _, product in products.iterrows():
+        title = f"*{format_lookup_value(product.get('name')) or '(no name)'}*"
+        if len(products) == 1:
+            fields = [(column, format_lookup_value(product[column])) for column in LOOKUP_FIELDS if column in product.index]
+            fields = [{"type": "mrkdwn", "text": f"*{column}*\n{value}"} for column, value in fields if value]
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": title}})
+            # Uma seção aceita no máximo 10 campos
+            blocks.extend({"type": "section", "fields": fields[start:start + 10]} for start in range(0, len(fields), 10))
         else:
-            say(text="Failed to generate the CSV from Redshift.")
-    except Exception as e:
-        say(f"An error occurred while generating or uploading the CSV: {e}")
+            details = " · ".join(f"{column}: {value}" for column, value in (
+                (column, format_lookup_value(product.get(column))) for column in ('sku', 'manufacturer_sku', 'manufacturer_name', 'row_id'))
+                if value)
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": f"{title}\n{details}"}})
+    return text, blocks
+
+
+# "lookup <sku, manufacturer_sku, row_id ou trecho do nome>" em uma mensagem
+def lookup_query(text):
+    parts = (text or '').strip().split(None, 1)
+    if len(parts) == 2 and parts[0].lower() == 'lookup':
+        return parts[1]
+    return None
 
 
 @slack_app.event("message")
@@ -203,13 +567,81 @@ def handle_message_events(body, say):
     event = body['event']
     if 'subtype' in event or 'app_mention' in event.get('type'):
         return  # Ignore subtype messages and app mentions
-    send_buttons(event['channel'])
+    query = lookup_query(event.get('text'))
+    if query is not None:
+        with stage('lookup'):
+            text, blocks = lookup_blocks(query)
+        say(text=text, blocks=blocks)
+        return
+    # O Bolt já confirmou o evento; numa rajada só a primeira mensagem do canal recebe o menu
+    if menu_debouncer.claim(event['channel'], event.get('user')) and not send_buttons(event['channel']):
+        menu_debouncer.release(event['channel'], event.get('user'))
+
+
+# Slash command /lookup: a resposta (visível só para quem pediu) vai no próprio ack, sem outra chamada à API
+@slack_app.command("/lookup")
+def handle_lookup_command(ack, command):
+    query = command.get('text', '').strip()
+    if not query:
+        ack(text="Usage: `/lookup <sku, manufacturer sku, row id or part of the name>`")
+        return
+    with stage('lookup'):
+        text, blocks = lookup_blocks(query)
+    ack(text=text, blocks=blocks)
 
 
 @slack_app.action("missing_images")
 def handle_missing_images(ack, body, say):
     ack()
     say(text="Running script to search for missing images...")
+    start_missing_images(body['channel']['id'], say, body['user']['id'])
+
+
+# Verifica a imagem de cada produto (HEAD assíncrono, com cache por URL) e gera o relatório
+def run_missing_images():
+    df = main(limit=EXPORT_LIMIT, compact=COMPACT_FRAMES, rename=False)
+    if df is None:
+        return None
+    with stage('images'):
+        report = image_scanner.scan(df)
+    export_file = ExportFile()
+    try:
+        for start in range(0, len(report), CHUNK_SIZE):
+            export_file.write(report.iloc[start:start + CHUNK_SIZE])
+        export_file.close()
+    except Exception:
+        export_file.cleanup()
+        raise
+    return export_file, report, dict(image_scanner.stats)
+
+
+def start_missing_images(channel_id, say, user_id=None):
+    if not IMAGE_URL_TEMPLATE:
+        say(text="Image URL template is not configured (set IMAGE_URL_TEMPLATE).")
+        return
+
+    def upload_report(result):
+        if result is None:
+            say(text="Failed to read the catalog from Redshift.")
+            return
+        export_file, report, stats = result
+        summary = (f"{stats['urls']} image URLs, {stats['fresh_from_cache']} from cache, "
+                   f"{stats['checked']} checked now at {stats['urls_per_second']}/s")
+        if stats['errors']:
+            summary += f", {stats['errors']} could not be reached"
+        if report.empty:
+            say(text=f"No missing images found ({summary}).")
+            return
+        upload_files(slack_client, channel_id, export_file.files("missing_images"), "Missing images")
+        counts = report['status'].value_counts()
+        say(text=f"Found {counts.get('missing', 0)} missing and {counts.get('broken', 0)} broken images "
+                 f"in {report['row_id'].nunique()} products ({summary}).")
+
+    def report_error(e):
+        say(f"An error occurred while checking the images: {e}")
+
+    submit_request(say, user_id, "missing_images", run_missing_images, on_done=upload_report, on_error=report_error,
+                   key="missing_images", channel=channel_id, cleanup=finish_report)
 
 
 @slack_app.action("text_formatting")
@@ -222,12 +654,100 @@ def handle_text_formatting(ack, body, say):
 def handle_wrong_sentences(ack, body, say):
     ack()
     say(text="Running script to correct incorrect sentences...")
+    start_wrong_sentences(body['channel']['id'], say, body['user']['id'])
+
+
+# Verifica as frases das descrições com o modelo (em lotes, com cache por frase) e gera o relatório
+def run_wrong_sentences():
+    df = main(limit=EXPORT_LIMIT, compact=COMPACT_FRAMES, rename=False)
+    if df is None:
+        return None
+    with stage('sentences'):
+        report = sentence_checker.check(df)
+    export_file = ExportFile()
+    try:
+        for start in range(0, len(report), CHUNK_SIZE):
+            export_file.write(report.iloc[start:start + CHUNK_SIZE])
+        export_file.close()
+    except Exception:
+        export_file.cleanup()
+        raise
+    return export_file, report, dict(sentence_checker.stats)
+
+
+def start_wrong_sentences(channel_id, say, user_id=None):
+    def upload_report(result):
+        if result is None:
+            say(text="Failed to read the catalog from Redshift.")
+            return
+        export_file, report, stats = result
+        summary = (f"{stats['unique_sentences']} distinct sentences, {stats['cache_hit_rate']:.0%} from cache, "
+                   f"{stats['checked']} checked now at {stats['sentences_per_second']}/s")
+        if stats['unchecked']:
+            summary += f", {stats['unchecked']} could not be checked"
+        if report.empty:
+            say(text=f"No incorrect sentences found ({summary}).")
+            return
+        upload_files(slack_client, channel_id, export_file.files("incorrect_sentences"), "Incorrect sentences")
+        say(text=f"Found {len(report)} incorrect sentences in {report['row_id'].nunique()} products ({summary}).")
+
+    def report_error(e):
+        say(f"An error occurred while checking the sentences: {e}")
+
+    submit_request(say, user_id, "wrong_sentences", run_wrong_sentences, on_done=upload_report, on_error=report_error,
+                   key="wrong_sentences", channel=channel_id, cleanup=finish_report)
 
 
 @slack_app.action("misspelled_words")
 def handle_misspelled_words(ack, body, say):
     ack()
     say(text="Running script to correct misspelled words...")
+    start_misspelled_words(body['channel']['id'], say, body['user']['id'])
+
+
+# Verifica a grafia dos atributos de texto do catálogo e gera o relatório
+def run_misspelled_words():
+    # Nomes originais dos atributos (name, description...), sem o rename para os labels
+    df = main(limit=EXPORT_LIMIT, compact=COMPACT_FRAMES, rename=False)
+    if df is None:
+        return None
+    with stage('spellcheck'):
+        report = spell_checker.check(df)
+    export_file = ExportFile()
+    try:
+        for start in range(0, len(report), CHUNK_SIZE):
+            export_file.write(report.iloc[start:start + CHUNK_SIZE])
+        export_file.close()
+    except Exception:
+        export_file.cleanup()
+        raise
+    return export_file, report, dict(spell_checker.stats)
+
+
+# Apaga o arquivo temporário de um relatório depois do upload
+def finish_report(result):
+    result[0].cleanup()
+
+
+def start_misspelled_words(channel_id, say, user_id=None):
+    def upload_report(result):
+        if result is None:
+            say(text="Failed to read the catalog from Redshift.")
+            return
+        export_file, report, stats = result
+        if report.empty:
+            say(text=f"No misspelled words found ({stats['texts']} texts, {stats['checked']} checked now).")
+            return
+        upload_files(slack_client, channel_id, export_file.files("misspelled_words"), "Misspelled words")
+        say(text=f"Found {len(report)} possible misspellings in {report['row_id'].nunique()} products "
+                 f"({report['word'].nunique()} distinct words; {stats['checked']} of {stats['unique_texts']} "
+                 f"texts checked now, the rest from cache).")
+
+    def report_error(e):
+        say(f"An error occurred while checking the spelling: {e}")
+
+    submit_request(say, user_id, "misspelled_words", run_misspelled_words, on_done=upload_report,
+                   on_error=report_error, key="misspelled_words", channel=channel_id, cleanup=finish_report)
 
 
 @slack_app.action("count_to_ten")
@@ -236,10 +756,205 @@ def handle_count_to_ten(ack, body, say):
     # Envia a mensagem de espera antes de começar a contagem
     say(text="We are running your request, please wait... :hourglass_flowing_sand:")
     channel_id = body['channel']['id']
-    # Simula um delay para efeito de demonstração, pode ser removido ou ajustado conforme necessário
-    import time
-    time.sleep(2)  # Delays for 2 seconds
-    count_to_ten(channel_id)
+
+    def run_count():
+        # Simula um delay para efeito de demonstração, pode ser removido ou ajustado conforme necessário
+        time.sleep(2)  # Delays for 2 seconds
+        count_to_ten(channel_id)
+
+    submit_request(say, body['user']['id'], "count_to_ten", run_count, channel=channel_id)
+
+
+# say() síncrono para uso fora de um listener do Bolt (ex.: callbacks de jobs no runtime assíncrono)
+# Chamado no event loop (respostas imediatas dos handlers), o envio vai para uma thread: o limite por canal
+# do cliente síncrono dorme e travaria os acks do Socket Mode e o /health
+def channel_say(channel_id):
+    def post(text, **kwargs):
+        try:
+            slack_client.chat_postMessage(channel=channel_id, text=text, **kwargs)
+        except SlackApiError as e:
+            print(f"Error: {e}")
+
+    def say(text, **kwargs):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            post(text, **kwargs)
+            return
+        loop.run_in_executor(None, lambda: post(text, **kwargs))
+    return say
+
+
+# Runtime assíncrono: AsyncApp + Socket Mode via aiohttp e /health no mesmo event loop
+def create_async_app():
+    from slack_bolt.async_app import AsyncApp
+
+    async_client = get_async_slack_client()
+    async_app = AsyncApp(client=async_client)
+
+    @async_app.middleware
+    async def use_shared_async_client(context, next):
+        context["client"] = async_client
+        await next()
+
+    @async_app.event("message")
+    async def handle_message_events_async(body, say):
+        event = body['event']
+        if 'subtype' in event or 'app_mention' in event.get('type'):
+            return  # Ignore subtype messages and app mentions
+        query = lookup_query(event.get('text'))
+        if query is not None:
+            # A busca no índice leva milissegundos e pode rodar no event loop
+            with stage('lookup'):
+                text, blocks = lookup_blocks(query)
+            await say(text=text, blocks=blocks)
+            return
+        if not menu_debouncer.claim(event['channel'], event.get('user')):
+            return
+        try:
+            await async_client.chat_postMessage(channel=event['channel'], text=MENU_TEXT, blocks=MENU_PAYLOAD)
+        except SlackApiError as e:
+            print(f"Error: {e}")
+            menu_debouncer.release(event['channel'], event.get('user'))
+
+    @async_app.command("/lookup")
+    async def handle_lookup_command_async(ack, command):
+        query = command.get('text', '').strip()
+        if not query:
+            await ack(text="Usage: `/lookup <sku, manufacturer sku, row id or part of the name>`")
+            return
+        with stage('lookup'):
+            text, blocks = lookup_blocks(query)
+        await ack(text=text, blocks=blocks)
+
+    @async_app.action("generate_csv")
+    async def handle_generate_csv_async(ack, body, say):
+        await ack()
+        await say(text="Processing your request, please wait... :hourglass_flowing_sand:")
+        channel_id = body['channel']['id']
+        start_generate_csv(channel_id, channel_say(channel_id), body['user']['id'])
+
+    @async_app.action("generate_redshift_csv")
+    async def handle_generate_redshift_csv_async(ack, body, say):
+        await ack()
+        channel_id = body['channel']['id']
+        await say(text="Processing your Redshift CSV request, please wait... :hourglass_flowing_sand:")
+        # A consulta e o upload rodam no executor de jobs; as respostas usam o cliente síncrono
+        start_redshift_export(channel_id, channel_say(channel_id), body['user']['id'])
+
+    @async_app.action("refresh_redshift_csv")
+    async def handle_refresh_redshift_csv_async(ack, body, say):
+        await ack()
+        channel_id = body['channel']['id']
+        await say(text="Refreshing the Redshift export from the warehouse, please wait... :hourglass_flowing_sand:")
+        start_redshift_export(channel_id, channel_say(channel_id), body['user']['id'], refresh=True)
+
+    @async_app.action("catalog_diff")
+    async def handle_catalog_diff_async(ack, body, say):
+        await ack()
+        channel_id = body['channel']['id']
+        await say(text="Comparing the catalog with the last diff, please wait... :hourglass_flowing_sand:")
+        start_catalog_diff(channel_id, channel_say(channel_id), body['user']['id'])
+
+    @async_app.action("missing_images")
+    async def handle_missing_images_async(ack, body, say):
+        await ack()
+        channel_id = body['channel']['id']
+        await say(text="Running script to search for missing images...")
+        start_missing_images(channel_id, channel_say(channel_id), body['user']['id'])
+
+    @async_app.action("text_formatting")
+    async def handle_text_formatting_async(ack, say):
+        await ack()
+        await say(text="Running script to correct text formatting...")
+
+    @async_app.action("wrong_sentences")
+    async def handle_wrong_sentences_async(ack, body, say):
+        await ack()
+        channel_id = body['channel']['id']
+        await say(text="Running script to correct incorrect sentences...")
+        start_wrong_sentences(channel_id, channel_say(channel_id), body['user']['id'])
+
+    @async_app.action("misspelled_words")
+    async def handle_misspelled_words_async(ack, body, say):
+        await ack()
+        channel_id = body['channel']['id']
+        await say(text="Running script to correct misspelled words...")
+        start_misspelled_words(channel_id, channel_say(channel_id), body['user']['id'])
+
+    @async_app.action("count_to_ten")
+    async def handle_count_to_ten_async(ack, body, say):
+        await ack()
+        await say(text="We are running your request, please wait... :hourglass_flowing_sand:")
+        channel_id = body['channel']['id']
+        await asyncio.sleep(2)
+        response = await async_client.chat_postMessage(channel=channel_id, text="Counting: 0")
+        for i in range(1, 11):
+            await asyncio.sleep(1)
+            await async_client.chat_update(channel=channel_id, ts=response['ts'], text=f"Counting: {i}")
+
+    return async_app
+
+
+async def health_check_async(request):
+    from aiohttp import web
+    health, _ = readiness()
+    return web.json_response(health)
+
+
+async def liveness_check_async(request):
+    from aiohttp import web
+    return web.json_response({"status": "ok"})
+
+
+async def readiness_check_async(request):
+    from aiohttp import web
+    health, _ = readiness()
+    return web.json_response(health, status=200 if health["status"] == "ok" else 503)
+
+
+async def metrics_async(request):
+    from aiohttp import web
+    return web.Response(text=render(registry.collect()), content_type="text/plain")
+
+
+async def run_async_bot():
+    from aiohttp import web
+    from slack_bolt.adapter.socket_mode.aiohttp import AsyncSocketModeHandler
+
+    async_app = create_async_app()
+
+    web_app = web.Application()
+    web_app.router.add_get("/health", health_check_async)
+    web_app.router.add_get("/health/live", liveness_check_async)
+    web_app.router.add_get("/health/ready", readiness_check_async)
+    web_app.router.add_get("/metrics", metrics_async)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", int(os.environ.get("PORT", 3000))).start()
+
+    # Abre as conexões mínimas do pool sem bloquear o event loop
+    await asyncio.get_running_loop().run_in_executor(None, warm_pool)
+    start_export_scheduler()
+    catalog_index.refresh_async()
+
+    handler = AsyncSocketModeHandler(async_app, SLACK_APP_TOKEN)
+    try:
+        await handler.start_async()
+    finally:
+        await runner.cleanup()
+
+
+# Cada worker abre sua própria conexão Socket Mode; o Slack entrega cada evento a uma delas
+# Fica no nível do módulo: o supervisor inicia os workers com spawn, que reimporta este arquivo
+def run_worker(index):
+    warm_pool()
+    # Os artefatos ficam em disco, compartilhados; só o primeiro worker os regenera
+    if index == 0:
+        start_export_scheduler()
+    # Cada worker tem sua própria cópia do índice de lookup
+    catalog_index.refresh_async()
+    SocketModeHandler(slack_app, SLACK_APP_TOKEN).start()
 
 
 #
@@ -248,7 +963,28 @@ def handle_count_to_ten(ack, body, say):
 #     handler.start()
 
 # Inicializa o Slack bot e o Flask
-if __name__ == "__main__":
+if __name__ == "__main__" and BOT_RUNTIME == "async":
+    asyncio.run(run_async_bot())
+
+elif __name__ == "__main__" and BOT_WORKERS > 1:
+    import signal
+    import sys
+
+    supervisor = Supervisor(run_worker, BOT_WORKERS, report=worker_report).start()
+
+
+    def stop_workers(signum, frame):
+        supervisor.stop()
+        sys.exit(0)
+
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    # O processo principal só supervisiona e responde ao /health agregado
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 3000)))
+
+elif __name__ == "__main__":
     from threading import Thread
 
 
@@ -261,6 +997,11 @@ if __name__ == "__main__":
     flask_thread = Thread(target=run_flask)
     flask_thread.start()
 
+    # Abre as conexões mínimas do pool antes de aceitar cliques
+    warm_pool()
+    start_export_scheduler()
+    catalog_index.refresh_async()
+
     # Inicia o SocketModeHandler para o Slack Bot
     handler = SocketModeHandler(slack_app, SLACK_APP_TOKEN)
     handler.start()
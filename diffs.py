@@ -0,0 +1,210 @@
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Diretório com a última versão do catálogo usada como base da comparação
+DIFF_DIR = os.getenv('CATALOG_DIFF_DIR', 'snapshots/diff')
+# Colunas que mudam sem alterar o conteúdo do produto e não entram no hash
+DIFF_IGNORE_COLUMNS = [column.strip() for column in os.getenv('DIFF_IGNORE_COLUMNS', 'updated_at').split(',') if column.strip()]
+
+DIFF_KEY = 'row_id'
+DIFF_ROW_GROUP_SIZE = 5000
+# Muda quando a forma de calcular o hash muda; bases antigas têm os hashes recalculados na leitura
+DIFF_HASH_VERSION = 2
+
+
+# Valor fixo para ausentes, igual em qualquer dtype
+_NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+# Hash (uint64) de cada valor de uma coluna; textos repetidos (categorias, colunas de baixa
+# cardinalidade) são hasheados uma vez por valor distinto
+def column_hashes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+        # Números e datas comparam pelo valor, não pelo texto
+        mask = series.isna().to_numpy()
+        values = series.to_numpy(dtype='float64' if pd.api.types.is_numeric_dtype(series.dtype) else 'int64',
+                                 na_value=0)
+        hashes = pd.util.hash_array(values, categorize=False)
+        hashes[mask] = _NULL_HASH
+        return hashes
+    elif is_low_cardinality(series):
+        codes, uniques = pd.factorize(series)
+    else:
+        mask = series.isna().to_numpy()
+        hashes = pd.util.hash_array(series.fillna('').to_numpy(dtype=object), categorize=False)
+        hashes[mask] = _NULL_HASH
+        return hashes
+
+    unique_hashes = pd.util.hash_array(np.asarray(uniques, dtype=object), categorize=False)
+    hashes = unique_hashes[codes] if len(unique_hashes) else np.zeros(len(codes), dtype=np.uint64)
+    hashes[codes < 0] = _NULL_HASH
+    return hashes
+
+
+def is_low_cardinality(series):
+    return series.head(1000).nunique() < 500
+
+
+# Textos de alta cardinalidade (sku, nome, descrições) unidos numa string por linha pelo Arrow, para
+# um único hash_array em vez de um por coluna (o custo é dominado pela chamada por valor, não pelos bytes)
+# None se alguma coluna não for só texto
+def joined_text_hashes(df, columns):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for column in columns:
+        try:
+            array = pa.array(df[column], from_pandas=True).cast(pa.large_string())
+        except (pa.ArrowException, TypeError, ValueError):
+            return None
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        # \x00 distingue ausente de ''
+        arrays.append(pc.fill_null(array, '\x00'))
+    joined = pc.binary_join_element_wise(*arrays, pa.scalar('\x1f', pa.large_string()))
+    return pd.util.hash_array(joined.to_numpy(zero_copy_only=False), categorize=False)
+
+
+def _is_text(series):
+    return (isinstance(series.dtype, pd.StringDtype) or series.dtype == object) and not is_low_cardinality(series)
+
+
+# Hash de conteúdo de cada linha (uint64), combinando de forma vetorizada o hash de cada coluna
+def row_hashes(df, ignore_columns=DIFF_IGNORE_COLUMNS):
+    columns = [column for column in df.columns if column not in ignore_columns and column != DIFF_KEY]
+    texts = [column for column in columns if _is_text(df[column])]
+    text_hashes = joined_text_hashes(df, texts) if texts else None
+    if text_hashes is not None:
+        columns = [column for column in columns if column not in texts]
+    hashes = np.full(len(df), 0x345678, dtype=np.uint64)
+    for column_hash in [column_hashes(df[column]) for column in columns] + \
+            ([text_hashes] if text_hashes is not None else []):
+        # Mesma mistura do hash de tuplas do Python: a ordem das colunas importa
+        hashes = (hashes ^ column_hash) * np.uint64(1000003)
+    return pd.Series(hashes, index=df[DIFF_KEY].to_numpy())
+
+
+# A extração com joins pode repetir um produto; a comparação usa a primeira linha de cada row_id
+def unique_rows(df):
+    duplicated = df[DIFF_KEY].duplicated().to_numpy()
+    if duplicated.any():
+        print(f"Catalog diff: ignoring {int(duplicated.sum())} duplicate {DIFF_KEY} rows")
+        df = df[~duplicated]
+    return df
+
+
+# Nomes das colunas diferentes entre duas versões das mesmas linhas (mesma ordem e colunas)
+def changed_columns(current, previous, ignore_columns=DIFF_IGNORE_COLUMNS):
+    columns = [column for column in current.columns
+               if column in previous.columns and column not in ignore_columns and column != DIFF_KEY]
+    # Valores ausentes (NaN, NA, None) viram None para que dois ausentes sejam iguais
+    left = current[columns].astype(object).where(current[columns].notna(), None).to_numpy()
+    right = previous[columns].astype(object).where(previous[columns].notna(), None).to_numpy()
+    differs = left != right
+    names = np.array(columns, dtype=object)
+    return [', '.join(names[row]) for row in differs]
+
+
+# Compara o catálogo com a versão da execução anterior usando os hashes guardados
+class CatalogDiff:
+    def __init__(self, directory=DIFF_DIR):
+        self.data_path = os.path.join(directory, 'previous.parquet')
+        self.state_path = os.path.join(directory, 'previous.json')
+
+    @property
+    def has_baseline(self):
+        return os.path.exists(self.data_path) and os.path.exists(self.state_path)
+
+    def baseline_info(self):
+        with open(self.state_path) as state:
+            return json.load(state)
+
+    # Hashes da base por row_id; bases gravadas com outra versão do hash são recalculadas
+    def _previous_hashes(self):
+        import pyarrow.parquet as pq
+
+        if self.baseline_info().get('hash_version') == DIFF_HASH_VERSION:
+            table = pq.read_table(self.data_path, columns=[DIFF_KEY, '_row_hash'])
+            previous = pd.Series(table.column('_row_hash').to_numpy(), index=table.column(DIFF_KEY).to_numpy())
+        else:
+            previous = row_hashes(pq.read_table(self.data_path).to_pandas().drop(columns=['_row_hash']))
+        return previous[~previous.index.duplicated()]
+
+    # Linhas da base com os row_id pedidos, lendo só os grupos cujo intervalo de row_id os contém
+    def _read_rows(self, keys):
+        import pyarrow.parquet as pq
+
+        keys = np.sort(np.asarray(keys))
+        parquet = pq.ParquetFile(self.data_path)
+        key_index = parquet.schema_arrow.get_field_index(DIFF_KEY)
+        groups = []
+        for group in range(parquet.num_row_groups):
+            statistics = parquet.metadata.row_group(group).column(key_index).statistics
+            if statistics is None or not statistics.has_min_max:
+                groups.append(group)
+                continue
+            start = np.searchsorted(keys, statistics.min, side='left')
+            if start < len(keys) and keys[start] <= statistics.max:
+                groups.append(group)
+        old = parquet.read_row_groups(groups).to_pandas() if groups else parquet.schema_arrow.empty_table().to_pandas()
+        old = old[old[DIFF_KEY].isin(keys)]
+        return old[~old[DIFF_KEY].duplicated()].drop(columns=['_row_hash'])
+
+    # Relatório com as linhas adicionadas, removidas e modificadas; None se ainda não há base
+    # hashes: row_hashes(df) já calculado (ex.: para reaproveitar no save)
+    def compare(self, df, hashes=None):
+        if not self.has_baseline:
+            return None
+
+        df = unique_rows(df)
+        current = row_hashes(df) if hashes is None else hashes[~hashes.index.duplicated()]
+        previous = self._previous_hashes()
+
+        # Uma única tabela hash sobre os row_id anteriores resolve as três listas
+        positions = previous.index.get_indexer(current.index)
+        found = positions >= 0
+        seen = np.zeros(len(previous), dtype=bool)
+        seen[positions[found]] = True
+        added = current.index[~found]
+        removed = previous.index[~seen]
+        modified = current.index[found][current.to_numpy()[found] != previous.to_numpy()[positions[found]]]
+
+        # Só as linhas removidas ou modificadas da versão anterior são lidas por completo
+        wanted = removed.append(modified)
+        if len(wanted):
+            old = self._read_rows(wanted.to_numpy()).set_index(DIFF_KEY, drop=False)
+        else:
+            old = df.iloc[:0].set_index(DIFF_KEY, drop=False)
+
+        rows = df.set_index(DIFF_KEY, drop=False)
+        new_modified = rows.loc[modified]
+        parts = [
+            rows.loc[added].assign(change='added', changed_columns=''),
+            old.loc[removed].assign(change='removed', changed_columns=''),
+            new_modified.assign(change='modified', changed_columns=changed_columns(new_modified, old.loc[modified])),
+        ]
+        report = pd.concat([part for part in parts if len(part)], ignore_index=True) if any(len(part) for part in parts) \
+            else df.iloc[:0].assign(change='', changed_columns='')
+        return report[['change', 'changed_columns'] + [column for column in df.columns]]
+
+    # Guarda o catálogo atual (com o hash de cada linha) como base da próxima comparação
+    def save(self, df, hashes=None):
+        os.makedirs(os.path.dirname(self.data_path) or '.', exist_ok=True)
+        df = unique_rows(df)
+        hashes = row_hashes(df) if hashes is None else hashes[~hashes.index.duplicated()]
+        baseline = df.assign(_row_hash=hashes.to_numpy()).sort_values(DIFF_KEY)
+        # Grupos pequenos e ordenados por row_id: a comparação lê só os grupos das linhas alteradas
+        baseline.to_parquet(self.data_path + '.tmp', index=False, row_group_size=DIFF_ROW_GROUP_SIZE)
+        with open(self.state_path + '.tmp', 'w') as state:
+            json.dump({'saved_at': time.time(), 'rows': len(df), 'hash_version': DIFF_HASH_VERSION}, state)
+        os.replace(self.data_path + '.tmp', self.data_path)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+
+catalog_diff = CatalogDiff()
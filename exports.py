@@ -0,0 +1,295 @@
+import gzip
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import pandas as pd
+
+# Formato do arquivo enviado ao Slack: csv, csv.gz, parquet ou xlsx
+EXPORT_FORMAT = os.getenv('EXPORT_FORMAT', 'csv.gz')
+# Tamanho a partir do qual o arquivo em construção passa da memória para o disco
+EXPORT_SPOOL_MAX_SIZE = int(os.getenv('EXPORT_SPOOL_MAX_SIZE', 8 * 1024 * 1024))
+# Limite de tamanho de arquivo do Slack; acima disso a exportação é dividida em partes
+SLACK_MAX_FILE_SIZE = int(os.getenv('SLACK_MAX_FILE_SIZE', 1024 * 1024 * 1024))
+
+# Processos que serializam os blocos fora do processo do bot (0 = na própria thread do job)
+SERIALIZE_PROCESSES = int(os.getenv('SERIALIZE_PROCESSES', '0'))
+
+# Limite de linhas de uma planilha do Excel (sem contar o cabeçalho)
+EXCEL_MAX_ROWS = 1048575
+# Linhas de cada bloco gravadas numa planilha de amostra para estimar o tamanho do .xlsx
+XLSX_SAMPLE_ROWS = int(os.getenv('XLSX_SAMPLE_ROWS', '500'))
+# Folga sobre a estimativa da amostra (que erra em até ~5% para cima ou para baixo)
+XLSX_SIZE_MARGIN = 1.1
+# Bytes de metadados por coluna em cada grupo de linhas do rodapé do parquet, sem as estatísticas
+PARQUET_COLUMN_METADATA_SIZE = 128
+
+# Bytes já escritos pelas exportações ainda não descartadas, somando todos os ExportFile do processo
+_inflight_bytes = 0
+_inflight_lock = threading.Lock()
+
+_serialize_pool = None
+_serialize_pool_pid = None
+_serialize_pool_lock = threading.Lock()
+
+
+# Pool de processos para serialização, recriado se o processo atual for um fork de outro
+def get_serialize_pool():
+    global _serialize_pool, _serialize_pool_pid
+    if SERIALIZE_PROCESSES <= 0:
+        return None
+    with _serialize_pool_lock:
+        if _serialize_pool is None or _serialize_pool_pid != os.getpid():
+            _serialize_pool = ProcessPoolExecutor(max_workers=SERIALIZE_PROCESSES)
+            _serialize_pool_pid = os.getpid()
+        return _serialize_pool
+
+
+# Gera os bytes de um bloco CSV; cada bloco comprimido é um membro gzip independente
+def csv_chunk_bytes(df, header, compress=False):
+    data = df.to_csv(index=False, header=header).encode('utf-8')
+    return gzip.compress(data) if compress else data
+
+
+def _track_bytes(delta):
+    global _inflight_bytes
+    with _inflight_lock:
+        _inflight_bytes += delta
+
+
+def inflight_bytes():
+    return _inflight_bytes
+
+
+# Escreve blocos de um DataFrame como CSV, opcionalmente comprimido com gzip
+class CsvChunkWriter:
+    max_rows = None
+    estimated_size = None
+
+    def __init__(self, fileobj, compress=False):
+        self.fileobj = fileobj
+        self.pool = get_serialize_pool()
+        self.compress = compress
+        if compress and self.pool is None:
+            self.stream = gzip.GzipFile(fileobj=fileobj, mode='wb', filename='')
+        else:
+            self.stream = fileobj
+        self.header = True
+
+    def write(self, df):
+        if self.pool is not None:
+            # to_csv e gzip seguram o GIL; num processo separado não travam os eventos do Slack
+            data = self.pool.submit(csv_chunk_bytes, df, self.header, self.compress).result()
+        else:
+            data = csv_chunk_bytes(df, self.header)
+        self.stream.write(data)
+        self.header = False
+
+    def close(self):
+        if self.stream is not self.fileobj:
+            self.stream.close()  # Grava o rodapé do gzip sem fechar o arquivo de destino
+
+
+# Bytes que um grupo de linhas acrescenta ao rodapé do parquet: metadados de cada coluna e o min/max
+# das estatísticas (nos textos, no máximo duas vezes o maior valor)
+def parquet_footer_growth(table):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    size = PARQUET_COLUMN_METADATA_SIZE * table.num_columns
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):
+            column = pa.chunked_array([chunk.dictionary for chunk in column.chunks], column.type.value_type)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type) or \
+                pa.types.is_binary(column.type) or pa.types.is_large_binary(column.type):
+            size += 2 * (pc.max(pc.binary_length(column)).as_py() or 0)
+        else:
+            size += 16
+    return size
+
+
+class ParquetChunkWriter:
+    max_rows = None
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.writer = None
+        self.schema = None
+        self.footer_size = 0
+
+    # O rodapé (esquema e metadados de cada grupo de linhas) só é gravado no close; entra na estimativa
+    @property
+    def estimated_size(self):
+        return self.fileobj.tell() + self.footer_size
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            # Colunas vazias no primeiro bloco viram texto para aceitar os blocos seguintes
+            self.schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema
+            ])
+            self.writer = pq.ParquetWriter(self.fileobj, self.schema, compression='snappy')
+            # Rodapé de um arquivo sem linhas: esquema do arrow e metadados do pandas
+            empty = io.BytesIO()
+            pq.write_table(self.schema.empty_table(), empty, compression='snappy')
+            self.footer_size = empty.tell()
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+        row_groups = max(1, -(-table.num_rows // (1024 * 1024)))
+        self.footer_size += row_groups * parquet_footer_growth(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+# Linhas de um DataFrame como tuplas aceitas pelo openpyxl
+def excel_rows(df):
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.tz_localize(None)  # O Excel não aceita fuso horário
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def xlsx_bytes(df):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in excel_rows(df):
+        sheet.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    return data.tell()
+
+
+# Tamanho de uma planilha vazia (estilos, metadados e estrutura do zip)
+@lru_cache(maxsize=None)
+def empty_xlsx_size():
+    return xlsx_bytes(pd.DataFrame())
+
+
+# Bytes que um bloco acrescenta ao .xlsx, medidos numa planilha com linhas espaçadas do bloco
+def estimate_xlsx_size(df, sample_rows=XLSX_SAMPLE_ROWS):
+    if df.empty:
+        return 0
+    sample = df.iloc[::max(1, len(df) // sample_rows)]
+    return int((xlsx_bytes(sample) - empty_xlsx_size()) * len(df) / len(sample) * XLSX_SIZE_MARGIN)
+
+
+# Planilha em modo write_only: as linhas não ficam todas em memória
+class XlsxChunkWriter:
+    max_rows = EXCEL_MAX_ROWS
+
+    def __init__(self, fileobj):
+        from openpyxl import Workbook
+
+        self.fileobj = fileobj
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.header = True
+        # Nada é gravado no arquivo antes do save(); o tamanho da parte é estimado bloco a bloco por amostragem
+        self.estimated_size = empty_xlsx_size()
+
+    def write(self, df):
+        self.estimated_size += estimate_xlsx_size(df)
+        if self.header:
+            self.sheet.append([str(column) for column in df.columns])
+            self.header = False
+        for row in excel_rows(df):
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.fileobj)
+
+
+WRITERS = {
+    'csv': lambda fileobj: CsvChunkWriter(fileobj),
+    'csv.gz': lambda fileobj: CsvChunkWriter(fileobj, compress=True),
+    'parquet': ParquetChunkWriter,
+    'xlsx': XlsxChunkWriter,
+}
+
+
+# Arquivo de exportação que abre uma nova parte quando a atual se aproxima do limite do Slack
+class ExportFile:
+    def __init__(self, export_format=EXPORT_FORMAT, max_part_size=SLACK_MAX_FILE_SIZE,
+                 spool_max_size=EXPORT_SPOOL_MAX_SIZE):
+        if export_format not in WRITERS:
+            raise ValueError(f"Unknown export format {export_format}")
+        self.export_format = export_format
+        self.max_part_size = max_part_size
+        self.spool_max_size = spool_max_size
+        self.parts = []
+        self._writer = None
+        self._part_rows = 0
+        self._last_chunk_size = 0
+        self._tracked = 0
+
+    def _part_full(self, rows):
+        if self._writer is None:
+            return True
+        if self._writer.max_rows is not None and self._part_rows + rows > self._writer.max_rows:
+            return True
+        # Deixa folga de um bloco para não passar do limite no próximo
+        return self._part_size() + self._last_chunk_size > self.max_part_size
+
+    # Bytes da parte atual (estimados quando o writer só grava no close, como o xlsx)
+    def _part_size(self):
+        if self._writer.estimated_size is not None:
+            return self._writer.estimated_size
+        return self.parts[-1].tell()
+
+    def _new_part(self):
+        if self._writer is not None:
+            self._writer.close()
+        part = tempfile.SpooledTemporaryFile(max_size=self.spool_max_size)
+        self.parts.append(part)
+        self._writer = WRITERS[self.export_format](part)
+        self._part_rows = 0
+
+    # Escreve um bloco e retorna quantos bytes a parte atual cresceu
+    def write(self, df):
+        if self._part_full(len(df)):
+            self._new_part()
+        start = self._part_size()
+        self._writer.write(df)
+        self._part_rows += len(df)
+        written = self._part_size() - start
+        self._last_chunk_size = max(self._last_chunk_size, written)
+        self._tracked += written
+        _track_bytes(written)
+        return written
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            # O fechamento grava o que o writer ainda segurava (rodapé do gzip, a planilha inteira do xlsx)
+            size = self.size
+            _track_bytes(size - self._tracked)
+            self._tracked = size
+
+    @property
+    def size(self):
+        return sum(part.seek(0, os.SEEK_END) for part in self.parts)
+
+    # Lista (nome do arquivo, arquivo) numerando as partes quando houver mais de uma
+    def files(self, basename):
+        if len(self.parts) == 1:
+            return [(f"{basename}.{self.export_format}", self.parts[0])]
+        return [(f"{basename}.part{i:02d}.{self.export_format}", part) for i, part in enumerate(self.parts, start=1)]
+
+    def cleanup(self):
+        self.close()
+        for part in self.parts:
+            part.close()
+        _track_bytes(-self._tracked)
+        self._tracked = 0
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+import pandas as pd
+
+# Modelo da URL da imagem de cada produto; aceita {sku}, {url_key} e {row_id}
+# ex.: https://cdn.example.com/media/catalog/product/{url_key}.jpg
+IMAGE_URL_TEMPLATE = os.getenv('IMAGE_URL_TEMPLATE', '')
+# Requisições simultâneas no total e por host
+IMAGE_CONCURRENCY = int(os.getenv('IMAGE_CONCURRENCY', '200'))
+IMAGE_CONCURRENCY_PER_HOST = int(os.getenv('IMAGE_CONCURRENCY_PER_HOST', '20'))
+IMAGE_TIMEOUT = float(os.getenv('IMAGE_TIMEOUT', '15'))
+# Resultados mais novos que isso não são verificados de novo; os mais velhos são revalidados
+# com If-None-Match / If-Modified-Since
+IMAGE_CACHE_TTL = float(os.getenv('IMAGE_CACHE_TTL', 24 * 3600))
+IMAGE_CACHE_PATH = os.getenv('IMAGE_CACHE_PATH', 'snapshots/images.sqlite')
+
+# ok: imagem encontrada; missing: 404/410; broken: outro erro HTTP ou conteúdo que não é imagem;
+# error: falha de conexão ou timeout (não entra no cache)
+OK, MISSING, BROKEN, ERROR = 'ok', 'missing', 'broken', 'error'
+
+
+# URL da imagem de cada produto; None quando falta algum campo usado no modelo
+def image_urls(df, template=IMAGE_URL_TEMPLATE):
+    fields = {name: df[name].astype(object).where(df[name].notna(), None).tolist()
+              for name in ('sku', 'url_key', 'row_id') if name in df.columns}
+    urls = []
+    for values in zip(*fields.values()):
+        row = dict(zip(fields, values))
+        try:
+            if any(row[name] in (None, '') for name in fields if '{' + name + '}' in template):
+                urls.append(None)
+                continue
+            urls.append(template.format(**{name: quote(str(value), safe='') for name, value in row.items()}))
+        except KeyError:
+            urls.append(None)
+    return urls
+
+
+def classify(status, content_type):
+    if status in (200, 206, 304):
+        if content_type and not content_type.startswith('image/') and status != 304:
+            return BROKEN
+        return OK
+    if status in (404, 410):
+        return MISSING
+    return BROKEN
+
+
+# Resultados por URL em SQLite: status, código HTTP, ETag, Last-Modified e horário da verificação
+class ImageCache:
+    def __init__(self, path=IMAGE_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS images (
+            url TEXT PRIMARY KEY, status TEXT, http_status INTEGER, etag TEXT, last_modified TEXT, checked_at REAL)""")
+        self._lock = threading.Lock()
+
+    def get_many(self, urls):
+        found = {}
+        urls = list(urls)
+        with self._lock:
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT url, status, http_status, etag, last_modified, checked_at FROM images "
+                    f"WHERE url IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((row[0], {'status': row[1], 'http_status': row[2], 'etag': row[3],
+                                       'last_modified': row[4], 'checked_at': row[5]}) for row in rows)
+        return found
+
+    def put_many(self, results):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)",
+                [(url, r['status'], r['http_status'], r['etag'], r['last_modified'], r['checked_at'])
+                 for url, r in results.items() if r['status'] != ERROR])
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class ImageScanner:
+    def __init__(self, cache_path=IMAGE_CACHE_PATH, concurrency=IMAGE_CONCURRENCY,
+                 per_host=IMAGE_CONCURRENCY_PER_HOST, timeout=IMAGE_TIMEOUT, ttl=IMAGE_CACHE_TTL):
+        self.cache_path = cache_path
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.ttl = ttl
+        self.stats = {}
+
+    # O timeout só começa a contar depois de a requisição ganhar uma vaga, no total e no host
+    async def _check_limited(self, session, url, cached, slots, host_slots):
+        async with host_slots[urlsplit(url).netloc], slots:
+            return await self._check(session, url, cached)
+
+    async def _check(self, session, url, cached):
+        headers = {}
+        if cached and cached['status'] == OK:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        try:
+            async with session.head(url, headers=headers, allow_redirects=True) as response:
+                status = response.status
+                content_type = response.headers.get('Content-Type', '')
+                etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if status in (403, 405, 501):
+                # Servidores que não aceitam HEAD: pede só o primeiro byte
+                async with session.get(url, headers=dict(headers, Range='bytes=0-0'), allow_redirects=True) as response:
+                    status = response.status
+                    content_type = response.headers.get('Content-Type', '')
+                    etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        except Exception as e:
+            return {'status': ERROR, 'http_status': None, 'etag': None, 'last_modified': None,
+                    'checked_at': time.time(), 'error': str(e) or type(e).__name__}
+
+        if status == 304 and cached:
+            self.stats['revalidated'] = self.stats.get('revalidated', 0) + 1
+            return dict(cached, checked_at=time.time())
+        return {'status': classify(status, content_type), 'http_status': status, 'etag': etag,
+                'last_modified': last_modified, 'checked_at': time.time()}
+
+    async def _scan(self, urls, cached):
+        import aiohttp
+
+        # Os semáforos limitam as requisições no total e por host, com os mesmos limites do conector: nenhuma
+        # requisição espera por uma conexão com o timeout já correndo. As conexões ficam abertas e são reaproveitadas
+        slots = asyncio.Semaphore(self.concurrency)
+        host_slots = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            results = await asyncio.gather(*(self._check_limited(session, url, cached.get(url), slots, host_slots)
+                                             for url in urls))
+        return dict(zip(urls, results))
+
+    # Relatório (row_id, sku, url, status, http_status, erro) dos produtos sem imagem válida
+    def scan(self, df, template=IMAGE_URL_TEMPLATE):
+        started_at = time.time()
+        self.stats = {}
+        urls = image_urls(df, template)
+        unique = sorted({url for url in urls if url})
+
+        cache = ImageCache(self.cache_path)
+        try:
+            cached = cache.get_many(unique)
+            now = time.time()
+            stale = [url for url in unique if url not in cached or now - cached[url]['checked_at'] > self.ttl]
+            results = asyncio.run(self._scan(stale, cached)) if stale else {}
+            cache.put_many(results)
+        finally:
+            cache.close()
+
+        results = {**cached, **results}
+        elapsed = time.time() - started_at
+        hosts = {urlsplit(url).netloc for url in stale}
+        self.stats.update({
+            'products': len(urls),
+            'urls': len(unique),
+            'fresh_from_cache': len(unique) - len(stale),
+            'checked': len(stale),
+            'hosts': len(hosts),
+            'errors': sum(results[url]['status'] == ERROR for url in stale),
+            'elapsed': round(elapsed, 2),
+            'urls_per_second': round(len(stale) / elapsed, 1) if elapsed else 0,
+        })
+
+        report = pd.DataFrame({
+            'row_id': df['row_id'].to_numpy() if 'row_id' in df.columns else range(len(df)),
+            'sku': df['sku'].to_numpy() if 'sku' in df.columns else '',
+            'url': urls,
+        })
+        report['status'] = [results[url]['status'] if url else MISSING for url in urls]
+        report['http_status'] = pd.array([results[url]['http_status'] if url else None for url in urls], dtype='Int64')
+        report['error'] = [results[url].get('error', '') if url else 'no image URL (missing sku/url_key)'
+                           for url in urls]
+        return report[report['status'] != OK].reset_index(drop=True)
+
+
+image_scanner = ImageScanner()
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from metrics import job_stages, log_job, JOB_WAIT_SECONDS, JOB_SECONDS, JOBS_IN_FLIGHT, JOBS_QUEUED
+
+# Número de threads que executam jobs em segundo plano
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '4'))
+
+
+# Converte "tipo=n,tipo=n" em {tipo: n}
+def parse_job_limits(value):
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            job_type, limit = item.split('=', 1)
+            limits[job_type.strip()] = int(limit)
+    return limits
+
+
+# Limite de jobs simultâneos por tipo, ex.: "generate_redshift_csv=1,count_to_ten=2"
+JOB_TYPE_LIMITS = parse_job_limits(os.getenv('JOB_TYPE_LIMITS', 'generate_redshift_csv=1,count_to_ten=2'))
+
+# Tipos de job que disputam o mesmo recurso; 'warehouse' = os que fazem uma consulta completa ao Redshift
+JOB_GROUPS = {
+    'warehouse': ('generate_redshift_csv', 'catalog_diff', 'missing_images', 'wrong_sentences', 'misspelled_words',
+                  'lookup_index'),
+}
+# Limite de jobs simultâneos por grupo, ex.: "warehouse=2"
+JOB_GROUP_LIMITS = parse_job_limits(os.getenv('JOB_GROUP_LIMITS', 'warehouse=2'))
+# Jobs aguardando na fila; acima disso novos pedidos são recusados
+JOB_MAX_QUEUE = int(os.getenv('JOB_MAX_QUEUE', '20'))
+
+
+class JobRejected(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_type, fn, key=None, channel=None, cleanup=None):
+        self.job_type = job_type
+        self.fn = fn
+        self.key = key
+        self.channel = channel
+        self.cleanup = cleanup
+        self.subscribers = []  # (on_done, on_error) de cada pedido atendido por este job
+        self.submitted_at = time.time()
+        self.started_at = None
+
+
+# Executor de jobs com limite por tipo, ordem FIFO por canal e deduplicação de jobs idênticos
+class JobExecutor:
+    def __init__(self, max_workers=JOB_MAX_WORKERS, limits=None, group_limits=None, max_queue=JOB_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.limits = dict(JOB_TYPE_LIMITS if limits is None else limits)
+        self.group_limits = dict(JOB_GROUP_LIMITS if group_limits is None else group_limits)
+        self.groups = {job_type: group for group, job_types in JOB_GROUPS.items() for job_type in job_types}
+        self.max_queue = max_queue
+        # Controle de admissão opcional: gate(job, running) -> False mantém o job na fila
+        self.gate = None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._inflight = {}  # (tipo, chave) -> Job ainda não concluído
+        self._busy_channels = set()
+        self._running = defaultdict(int)
+        self._counters = defaultdict(int)
+        self._latencies = defaultdict(lambda: deque(maxlen=100))  # tipo -> (espera, execução)
+
+    # Enfileira um job; retorna True se ele foi agregado a um job idêntico já em andamento
+    # Com a fila cheia levanta JobRejected (pedidos agregados continuam sendo aceitos)
+    def submit(self, job_type, fn, on_done=None, on_error=None, key=None, channel=None, cleanup=None):
+        with self._lock:
+            self._counters['submitted'] += 1
+            if key is not None and (job_type, key) in self._inflight:
+                self._inflight[(job_type, key)].subscribers.append((on_done, on_error))
+                self._counters['coalesced'] += 1
+                return True
+            if self.max_queue is not None and len(self._pending) >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise JobRejected(f"job queue is full ({len(self._pending)} waiting)")
+
+            job = Job(job_type, fn, key, channel, cleanup)
+            job.subscribers.append((on_done, on_error))
+            if key is not None:
+                self._inflight[(job_type, key)] = job
+            self._pending.append(job)
+            self._dispatch()
+            JOBS_QUEUED.set(len(self._pending))
+            return False
+
+    # Inicia os jobs pendentes que respeitam os limites (chamado com o lock adquirido)
+    def _dispatch(self):
+        blocked_channels = set()
+        for job in list(self._pending):
+            if sum(self._running.values()) >= self.max_workers:
+                break
+            limit = self.limits.get(job.job_type)
+            group = self.groups.get(job.job_type)
+            group_limit = self.group_limits.get(group)
+            if (job.channel in self._busy_channels or job.channel in blocked_channels
+                    or (limit is not None and self._running[job.job_type] >= limit)
+                    or (group_limit is not None and self._group_running(group) >= group_limit)
+                    or (self.gate is not None and not self.gate(job, self._running))):
+                # Jobs seguintes do mesmo canal esperam este, mantendo a ordem FIFO
+                if job.channel is not None:
+                    blocked_channels.add(job.channel)
+                continue
+
+            self._pending.remove(job)
+            self._running[job.job_type] += 1
+            if job.channel is not None:
+                self._busy_channels.add(job.channel)
+            job.started_at = time.time()
+            JOB_WAIT_SECONDS.observe(job.started_at - job.submitted_at, job_type=job.job_type)
+            JOBS_IN_FLIGHT.inc(job_type=job.job_type)
+            self._pool.submit(self._run, job)
+
+    def _group_running(self, group):
+        return sum(self._running[job_type] for job_type in JOB_GROUPS.get(group, ()))
+
+    # Posição (1 = próximo) do job pendente do tipo e da chave ou canal informados; 0 se já começou ou terminou
+    def position(self, job_type, key=None, channel=None):
+        with self._lock:
+            for position, job in enumerate(self._pending, start=1):
+                if job.job_type == job_type and (job.key == key if key is not None else job.channel == channel):
+                    return position
+        return 0
+
+    def _run(self, job):
+        with job_stages() as stages:
+            self._run_job(job, stages)
+
+    def _run_job(self, job, stages):
+        result, error = None, None
+        try:
+            result = job.fn()
+        except Exception as e:
+            error = e
+            print(f"Error in job {job.job_type}: {e}")
+
+        # Novos pedidos idênticos a partir daqui iniciam um job novo
+        with self._lock:
+            if job.key is not None:
+                self._inflight.pop((job.job_type, job.key), None)
+            subscribers = list(job.subscribers)
+
+        for on_done, on_error in subscribers:
+            try:
+                if error is None and on_done is not None:
+                    on_done(result)
+                elif error is not None and on_error is not None:
+                    on_error(error)
+            except Exception as e:
+                print(f"Error in job {job.job_type} callback: {e}")
+
+        if job.cleanup is not None and result is not None:
+            try:
+                job.cleanup(result)
+            except Exception as e:
+                print(f"Error in job {job.job_type} cleanup: {e}")
+
+        finished_at = time.time()
+        wait = job.started_at - job.submitted_at
+        duration = finished_at - job.started_at
+        outcome = 'failed' if error is not None else 'completed'
+        with self._lock:
+            self._running[job.job_type] -= 1
+            self._busy_channels.discard(job.channel)
+            self._counters[outcome] += 1
+            self._latencies[job.job_type].append((wait, duration))
+            self._dispatch()
+            depth = len(self._pending)
+        JOBS_IN_FLIGHT.dec(job_type=job.job_type)
+        JOBS_QUEUED.set(depth)
+        JOB_SECONDS.observe(duration, job_type=job.job_type, outcome=outcome)
+        print(f"Job {job.job_type} took {duration:.2f}s (waited {wait:.2f}s, "
+              f"{len(subscribers)} request(s), queue depth {depth})")
+        log_job(job_type=job.job_type, outcome=outcome, wait=round(wait, 3), duration=round(duration, 3),
+                requests=len(subscribers), queue_depth=depth, channel=job.channel,
+                stages={name: round(seconds, 3) for name, seconds in stages.items()},
+                error=str(error) if error is not None else None)
+
+    # Estado atual da fila para monitoramento
+    def stats(self):
+        with self._lock:
+            latencies = {}
+            for job_type, samples in self._latencies.items():
+                latencies[job_type] = {
+                    'avg_wait': sum(wait for wait, _ in samples) / len(samples),
+                    'avg_duration': sum(duration for _, duration in samples) / len(samples),
+                    'max_duration': max(duration for _, duration in samples),
+                }
+            return {
+                'queue_depth': len(self._pending),
+                'running': {job_type: n for job_type, n in self._running.items() if n},
+                'groups': {group: {'running': self._group_running(group), 'limit': self.group_limits.get(group)}
+                           for group in JOB_GROUPS},
+                'max_queue': self.max_queue,
+                'inflight_keys': len(self._inflight),
+                'counters': dict(self._counters),
+                'latency': latencies,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+job_executor = JobExecutor()
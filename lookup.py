@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from jobs import job_executor, JobRejected
+
+# Idade máxima (segundos) do índice em memória; depois disso a próxima busca dispara a reconstrução
+LOOKUP_INDEX_TTL = float(os.getenv('LOOKUP_INDEX_TTL', 3600))
+LOOKUP_MAX_RESULTS = int(os.getenv('LOOKUP_MAX_RESULTS', '10'))
+# Atributos mostrados quando a busca encontra um único produto
+LOOKUP_FIELDS = [column.strip() for column in os.getenv(
+    'LOOKUP_FIELDS', 'sku,manufacturer_sku,row_id,manufacturer_name,attribute_set_name,type_id,status,visibility,'
+                     'url_key,collection_name,lead_time,updated_at').split(',') if column.strip()]
+
+# Colunas com índice hash (valor exato, sem diferenciar maiúsculas) e coluna com índice de trigramas
+KEY_COLUMNS = ('row_id', 'sku', 'manufacturer_sku')
+NAME_COLUMN = 'name'
+NGRAM = 3
+
+
+def normalize(value):
+    return ' '.join(str(value).split()).lower()
+
+
+def _normalized(series):
+    values = series.astype(object).where(series.notna(), None).tolist()
+    return [normalize(value) if value is not None and str(value).strip() else None for value in values]
+
+
+# Valor normalizado -> posições das linhas com esse valor
+def _hash_index(series):
+    keys = pd.Series(_normalized(series), dtype=object)
+    return pd.Series(np.arange(len(keys))).groupby(keys.to_numpy(), dropna=True).indices
+
+
+# Trigrama -> posições (ordenadas) dos nomes que o contêm
+def _ngram_index(names):
+    postings = {}
+    for position, name in enumerate(names):
+        if not name:
+            continue
+        for gram in {name[i:i + NGRAM] for i in range(len(name) - NGRAM + 1)}:
+            postings.setdefault(gram, []).append(position)
+    return {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+
+
+# Índices de uma versão do catálogo; trocados de uma vez quando uma versão nova fica pronta
+class _Index:
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self.keys = {column: _hash_index(self.df[column]) for column in KEY_COLUMNS if column in self.df.columns}
+        self.names = _normalized(self.df[NAME_COLUMN]) if NAME_COLUMN in self.df.columns else [None] * len(self.df)
+        self.grams = _ngram_index(self.names)
+        # Primeiro trigrama de cada nome, para ordenar primeiro os nomes que começam com o trecho
+        self.prefixes = _ngram_index([name[:NGRAM] if name else None for name in self.names])
+        self.lengths = np.array([len(name) if name else 0 for name in self.names], dtype=np.int32)
+
+    # Posições dos nomes que contêm o trecho, já ordenadas: começam com o trecho, depois os mais curtos
+    def search_name(self, fragment):
+        empty = np.array([], dtype=np.int32)
+        if len(fragment) < NGRAM:
+            return empty
+        postings = []
+        for gram in {fragment[i:i + NGRAM] for i in range(len(fragment) - NGRAM + 1)}:
+            if gram not in self.grams:
+                return empty
+            postings.append(self.grams[gram])
+        # Interseção começando pela lista mais curta; a confirmação elimina trigramas fora de ordem
+        postings.sort(key=len)
+        candidates = postings[0]
+        for positions in postings[1:]:
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+            if not len(candidates):
+                return empty
+        if len(fragment) > NGRAM:
+            candidates = np.array([position for position in candidates if fragment in self.names[position]],
+                                  dtype=np.int32)
+
+        prefixed = np.isin(candidates, self.prefixes.get(fragment[:NGRAM], empty), assume_unique=True)
+        if len(fragment) > NGRAM:
+            prefixed[prefixed] = [self.names[position].startswith(fragment) for position in candidates[prefixed]]
+        return candidates[np.lexsort((self.lengths[candidates], ~prefixed))]
+
+
+# Catálogo em memória indexado por row_id, sku, manufacturer_sku e trechos do nome
+# loader() retorna o DataFrame do catálogo; version() identifica a versão da origem (ex.: mtime do snapshot)
+class CatalogIndex:
+    def __init__(self, loader, version=None, ttl=LOOKUP_INDEX_TTL):
+        self.loader = loader
+        self.version = version
+        self.ttl = ttl
+        self.loaded_at = None
+        self.loaded_version = None
+        self.stats = {}
+        self._index = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._index is not None
+
+    @property
+    def stale(self):
+        if not self.loaded or time.time() - self.loaded_at > self.ttl:
+            return True
+        return self.version is not None and self.version() != self.loaded_version
+
+    def build(self, df, version=None):
+        started_at = time.time()
+        index = _Index(df)
+        with self._lock:
+            self._index = index
+            self.loaded_at = time.time()
+            self.loaded_version = version
+        self.stats = {'products': len(index.df), 'ngrams': len(index.grams),
+                      'build_seconds': round(time.time() - started_at, 2)}
+        print(f"Lookup index: {len(index.df)} produtos em {self.stats['build_seconds']} segundos.")
+
+    def _refresh(self):
+        try:
+            # A versão é lida antes da carga: uma atualização durante a leitura dispara outra reconstrução
+            version = self.version() if self.version is not None else None
+            df = self.loader()
+            if df is not None and not df.empty:
+                self.build(df, version)
+        except Exception as e:
+            print(f"Error: {e}")
+        finally:
+            self._refreshing = False
+
+    # Reconstrói em segundo plano no executor de jobs (grupo warehouse: fora do modo snapshot a carga é uma
+    # consulta completa ao Redshift); as buscas continuam usando a versão anterior até a troca
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+        try:
+            job_executor.submit("lookup_index", self._refresh, key="lookup_index")
+        except JobRejected as e:
+            # Fila cheia: a próxima busca tenta de novo
+            print(f"Lookup index refresh skipped: {e}")
+            self._refreshing = False
+            return False
+        return True
+
+    # Produtos encontrados (no máximo limit) e o total de correspondências; None se o índice ainda não existe
+    # Correspondências exatas de row_id, sku e manufacturer_sku vêm antes das de nome
+    def search(self, query, limit=LOOKUP_MAX_RESULTS):
+        if self.stale:
+            self.refresh_async()
+        index = self._index
+        if index is None:
+            return None
+
+        fragment = normalize(query)
+        positions = []
+        for column in KEY_COLUMNS:
+            if column in index.keys:
+                positions.extend(index.keys[column].get(fragment, ()))
+        exact = np.array(list(dict.fromkeys(positions)), dtype=np.int32)
+        by_name = index.search_name(fragment)
+        positions = np.concatenate([exact, by_name[~np.isin(by_name, exact)]])
+        return index.df.iloc[positions[:limit]], len(positions)
@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+from metrics import registry
+
+# Intervalo mínimo (segundos) entre dois menus no mesmo canal e para a mesma pessoa no mesmo canal
+MENU_CHANNEL_WINDOW = float(os.getenv('MENU_CHANNEL_WINDOW', '30'))
+MENU_USER_WINDOW = float(os.getenv('MENU_USER_WINDOW', '300'))
+# Acima disso as entradas vencidas são descartadas
+MENU_MAX_ENTRIES = 10000
+
+MENU_EVENTS = registry.counter('slackbot_menu_events_total', 'Message events by menu outcome (posted, debounced).')
+
+
+# Decide, sem nenhuma chamada à API, se uma mensagem deve receber o menu de botões
+# O horário é reservado antes do envio: as mensagens de uma rajada que chegam enquanto o
+# primeiro menu ainda está sendo enviado também são descartadas
+class MenuDebouncer:
+    def __init__(self, channel_window=MENU_CHANNEL_WINDOW, user_window=MENU_USER_WINDOW):
+        self.channel_window = channel_window
+        self.user_window = user_window
+        self._channels = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for entries, window in ((self._channels, self.channel_window), (self._users, self.user_window)):
+            if len(entries) > MENU_MAX_ENTRIES:
+                for key in [key for key, posted_at in entries.items() if now - posted_at > window]:
+                    del entries[key]
+
+    def claim(self, channel_id, user_id=None):
+        now = time.monotonic()
+        user_key = (channel_id, user_id)
+        with self._lock:
+            if (now - self._channels.get(channel_id, float('-inf')) < self.channel_window
+                    or now - self._users.get(user_key, float('-inf')) < self.user_window):
+                MENU_EVENTS.inc(outcome='debounced')
+                return False
+            self._channels[channel_id] = now
+            self._users[user_key] = now
+            self._prune(now)
+        MENU_EVENTS.inc(outcome='posted')
+        return True
+
+    # Libera o canal quando o envio falha, para que a próxima mensagem tente de novo
+    def release(self, channel_id, user_id=None):
+        with self._lock:
+            self._channels.pop(channel_id, None)
+            self._users.pop((channel_id, user_id), None)
+
+
+menu_debouncer = MenuDebouncer()
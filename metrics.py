@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Grava uma linha JSON por job concluído (com o tempo de cada etapa)
+METRICS_JSON_LOGS = os.getenv('METRICS_JSON_LOGS', '0') == '1'
+
+# Limites (segundos) dos buckets dos histogramas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    # Lista de (sufixo, labels, valor) para a exposição no formato Prometheus
+    def samples(self):
+        with self._lock:
+            return [('', labels, value) for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total) in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append(('_bucket', labels + (('le', _format_value(bound)),), count))
+                samples.append(('_sum', labels, total))
+                samples.append(('_count', labels, counts[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, documentation, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name, documentation):
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    # Estado atual de todas as métricas em estruturas simples (podem ir por uma fila entre processos)
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [{'name': metric.name, 'type': metric.type, 'help': metric.documentation,
+                 'samples': metric.samples()} for metric in metrics]
+
+
+# Acrescenta labels fixos (ex.: worker="0") às amostras coletadas
+def with_labels(families, **labels):
+    extra = tuple(sorted(labels.items()))
+    return [dict(family, samples=[(suffix, tuple(sample_labels) + extra, value)
+                                  for suffix, sample_labels, value in family['samples']])
+            for family in families]
+
+
+# Formato de texto do Prometheus; famílias repetidas (de vários workers) são agrupadas
+def render(families):
+    grouped = {}
+    for family in families:
+        if family['name'] not in grouped:
+            grouped[family['name']] = dict(family, samples=[])
+        grouped[family['name']]['samples'].extend(family['samples'])
+
+    lines = []
+    for family in grouped.values():
+        lines.append(f"# HELP {family['name']} {family['help']}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        for suffix, labels, value in family['samples']:
+            lines.append(f"{family['name']}{suffix}{_format_labels(tuple(labels))} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram('slackbot_stage_duration_seconds', 'Time spent in each export stage.')
+STAGE_ROWS = registry.counter('slackbot_stage_rows_total', 'Rows processed by each export stage.')
+STAGE_BYTES = registry.counter('slackbot_stage_bytes_total', 'Bytes produced or sent by each export stage.')
+SLACK_CALLS = registry.counter('slackbot_slack_api_calls_total', 'Slack Web API calls by method and status.')
+SLACK_SECONDS = registry.histogram('slackbot_slack_api_duration_seconds', 'Slack Web API call latency, retries included.')
+SLACK_RATE_LIMITED = registry.counter('slackbot_slack_rate_limited_total', 'HTTP 429 responses from the Slack Web API.')
+JOB_WAIT_SECONDS = registry.histogram('slackbot_job_queue_wait_seconds', 'Time jobs spent queued before running.')
+JOB_SECONDS = registry.histogram('slackbot_job_duration_seconds', 'Job run time by type and outcome.')
+JOBS_IN_FLIGHT = registry.gauge('slackbot_jobs_in_flight', 'Jobs currently running by type.')
+JOBS_QUEUED = registry.gauge('slackbot_jobs_queued', 'Jobs waiting for a free worker.')
+
+_job_context = threading.local()
+
+
+# Mede uma etapa (connect, execute, fetch, rename, serialize, upload...) e soma o tempo ao job atual
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = getattr(_job_context, 'stages', None)
+        if stages is not None:
+            stages[name] = stages.get(name, 0) + elapsed
+
+
+def count_stage(name, rows=0, nbytes=0):
+    if rows:
+        STAGE_ROWS.inc(rows, stage=name)
+    if nbytes:
+        STAGE_BYTES.inc(nbytes, stage=name)
+
+
+# Acumula o tempo das etapas executadas nesta thread enquanto o job roda
+@contextmanager
+def job_stages():
+    _job_context.stages = {}
+    try:
+        yield _job_context.stages
+    finally:
+        _job_context.stages = None
+
+
+def log_job(**fields):
+    if METRICS_JSON_LOGS:
+        print(json.dumps(dict(fields, event='job', ts=time.time()), default=str), flush=True)
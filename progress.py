@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from slack_sdk.errors import SlackApiError
+
+# Intervalo mínimo entre dois chat_update da mesma mensagem (segundos)
+PROGRESS_UPDATE_INTERVAL = float(os.getenv('PROGRESS_UPDATE_INTERVAL', '2'))
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+# Mensagem de progresso que agrega eventos e envia no máximo um chat_update por intervalo
+class ProgressMessage:
+    def __init__(self, client, channel, title, interval=PROGRESS_UPDATE_INTERVAL):
+        self.client = client
+        self.channel = channel
+        self.title = title
+        self.interval = interval
+        self.ts = None
+        self.status = "running"
+        self.stages = {}  # nome -> {'rows', 'bytes', 'started_at', 'finished_at'}
+        self.current = None
+        self.started_at = time.time()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        response = self.client.chat_postMessage(channel=self.channel, text=self.render())
+        self.ts = response['ts']
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    # Registra um evento; pode ser chamado em qualquer frequência
+    def update(self, stage, rows=0, nbytes=0):
+        now = time.time()
+        with self._lock:
+            if stage != self.current:
+                if self.current is not None:
+                    self.stages[self.current]['finished_at'] = now
+                self.stages.setdefault(stage, {'rows': 0, 'bytes': 0, 'started_at': now, 'finished_at': None})
+                self.stages[stage]['finished_at'] = None
+                self.current = stage
+            self.stages[stage]['rows'] += rows
+            self.stages[stage]['bytes'] += nbytes
+            self._dirty = True
+
+    def __call__(self, stage, rows=0, nbytes=0):
+        self.update(stage, rows, nbytes)
+
+    # Envia sempre o estado final, mesmo dentro do intervalo
+    def finish(self, status="done"):
+        if self._finished.is_set():
+            return
+        with self._lock:
+            if self.current is not None:
+                self.stages[self.current]['finished_at'] = time.time()
+            self.status = status
+            self._dirty = True
+        self._finished.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._flush()
+
+    def render(self):
+        lines = [f"*{self.title}* — {self.status} ({time.time() - self.started_at:.1f}s)"]
+        for name, stage in self.stages.items():
+            elapsed = (stage['finished_at'] or time.time()) - stage['started_at']
+            details = []
+            if stage['rows']:
+                details.append(f"{stage['rows']:,} rows")
+            if stage['bytes']:
+                details.append(format_bytes(stage['bytes']))
+            details.append(f"{elapsed:.1f}s")
+            mark = ":white_check_mark:" if stage['finished_at'] else ":hourglass_flowing_sand:"
+            lines.append(f"{mark} {name}: {', '.join(details)}")
+        return "\n".join(lines)
+
+    def _flush(self):
+        with self._lock:
+            if not self._dirty or self.ts is None:
+                return
+            text = self.render()
+            self._dirty = False
+        try:
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except SlackApiError as e:
+            print(f"Error updating progress: {e}")
+
+    def _flush_loop(self):
+        while not self._finished.wait(self.interval):
+            self._flush()
+
+
+# Envolve um arquivo e informa os bytes lidos (ex.: durante o upload)
+class ProgressReader:
+    def __init__(self, fileobj, progress, stage):
+        self.fileobj = fileobj
+        self.progress = progress
+        self.stage = stage
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        if data:
+            self.progress(self.stage, nbytes=len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
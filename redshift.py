@@ -3,6 +3,14 @@ import pandas as pd
 import time
 from dotenv import load_dotenv
 import os
+import uuid
+import json
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from metrics import stage, count_stage
 
 # Função para conectar ao Redshift
 load_dotenv()  # Carrega as variáveis de ambiente do arquivo .env
@@ -13,12 +21,23 @@ dbname = os.getenv('REDSHIFT_DBNAME')
 user = os.getenv('REDSHIFT_USER')
 password = os.getenv('REDSHIFT_PASSWORD')
 
+# Número de linhas buscadas por vez nas exportações em streaming
+CHUNK_SIZE = int(os.getenv('REDSHIFT_CHUNK_SIZE', '10000'))
+
+# Configuração do pool de conexões
+POOL_MIN_SIZE = int(os.getenv('REDSHIFT_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('REDSHIFT_POOL_MAX_SIZE', '5'))
+POOL_MAX_IDLE = float(os.getenv('REDSHIFT_POOL_MAX_IDLE', '300'))  # segundos
+POOL_MAX_AGE = float(os.getenv('REDSHIFT_POOL_MAX_AGE', '3600'))  # segundos
+POOL_TIMEOUT = float(os.getenv('REDSHIFT_POOL_TIMEOUT', '30'))  # espera máxima por uma conexão livre
+
 
 # Função para conectar ao Redshift usando variáveis de ambiente
 def connect_to_redshift(host, port, dbname, user, password):
     conn_string = f"dbname='{dbname}' user='{user}' host='{host}' password='{password}' port='{port}'"
     try:
-        conn = psycopg2.connect(conn_string)
+        with stage('connect'):
+            conn = psycopg2.connect(conn_string)
         print("Connected to Redshift")
         return conn
     except Exception as e:
@@ -26,15 +45,206 @@ def connect_to_redshift(host, port, dbname, user, password):
         return None
 
 
+# Pool de conexões reutilizáveis com limite de sessões simultâneas
+class ConnectionPool:
+    def __init__(self, connect, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 max_idle=POOL_MAX_IDLE, max_age=POOL_MAX_AGE, timeout=POOL_TIMEOUT):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.timeout = timeout
+        self._idle = deque()  # (conn, criada_em, devolvida_em)
+        self._created = {}  # id(conn) -> criada_em
+        self._opening = 0  # conexões sendo abertas fora do lock
+        self._condition = threading.Condition()
+
+    @property
+    def size(self):
+        return len(self._created) + self._opening
+
+    # Abre uma conexão nova em uma vaga já reservada
+    def _open(self):
+        conn = None
+        try:
+            conn = self.connect()
+        finally:
+            with self._condition:
+                self._opening -= 1
+                if conn is not None:
+                    self._created[id(conn)] = time.time()
+                self._condition.notify()
+        return conn
+
+    def _discard(self, conn):
+        with self._condition:
+            self._created.pop(id(conn), None)
+            self._condition.notify()
+        try:
+            close_connection(conn)
+        except Exception as e:
+            print(f"Error: {e}")
+
+    def _expired(self, created_at, released_at):
+        now = time.time()
+        return now - released_at > self.max_idle or now - created_at > self.max_age
+
+    # Verifica se a conexão ainda responde antes de entregá-la
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    # Abre conexões até atingir o tamanho mínimo
+    def warm(self):
+        while True:
+            with self._condition:
+                if self.size >= self.min_size:
+                    return
+                self._opening += 1
+            conn = self._open()
+            if conn is None:
+                return
+            self.putconn(conn)
+
+    # timeout=0 retorna None na hora se não houver vaga livre
+    def getconn(self, timeout=None):
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            with self._condition:
+                if self._idle:
+                    conn, created_at, released_at = self._idle.pop()
+                elif self.size < self.max_size:
+                    self._opening += 1
+                    conn = None
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        if timeout != 0:
+                            print("Error: timed out waiting for a Redshift connection")
+                        return None
+                    self._condition.wait(remaining)
+                    continue
+
+            if conn is None:
+                return self._open()
+            if self._expired(created_at, released_at) or not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if conn is None:
+            return
+        created_at = self._created.get(id(conn))
+        if created_at is None or conn.closed or time.time() - created_at > self.max_age:
+            discard = True
+        if not discard:
+            try:
+                conn.rollback()  # descarta a transação aberta pelas leituras
+            except Exception:
+                discard = True
+        if discard:
+            self._discard(conn)
+            return
+        with self._condition:
+            self._idle.append((conn, created_at, time.time()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._condition:
+            idle = [conn for conn, _, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Retorna o pool de conexões do processo, criando-o na primeira chamada
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(lambda: connect_to_redshift(host, port, dbname, user, password))
+        return _pool
+
+
+# Pré-aquece o pool na inicialização do bot
+def warm_pool():
+    pool = get_pool()
+    pool.warm()
+    print(f"Redshift pool warmed with {pool.size} connection(s)")
+
+
+_query_errors = threading.local()
+
+
+# Dentro do bloco, query_to_dataframe propaga os erros da thread atual em vez de devolver um DataFrame vazio
+# (numa extração em partes, uma parte vazia por erro passaria por catálogo incompleto)
+@contextmanager
+def raise_query_errors():
+    previous = getattr(_query_errors, 'enabled', False)
+    _query_errors.enabled = True
+    try:
+        yield
+    finally:
+        _query_errors.enabled = previous
+
+
 # Função para converter uma query em DataFrame
 def query_to_dataframe(conn, query):
     try:
-        return pd.read_sql(query, conn)
+        with stage('execute'):
+            return pd.read_sql(query, conn)
     except Exception as e:
+        if getattr(_query_errors, 'enabled', False):
+            raise
         print(f"Error: {e}")
         return pd.DataFrame()
 
 
+# Função para ler uma query em blocos com um cursor nomeado (server-side)
+def iter_query_chunks(conn, query, chunk_size=CHUNK_SIZE):
+    cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+    cursor.itersize = chunk_size
+    try:
+        with stage('execute'):
+            cursor.execute(query)
+        first = True
+        while True:
+            with stage('fetch'):
+                rows = cursor.fetchmany(chunk_size)
+                if not rows and not first:
+                    break
+                columns = [column.name for column in cursor.description]
+                chunk = pd.DataFrame.from_records(rows, columns=columns)
+            count_stage('fetch', rows=len(rows))
+            yield chunk
+            if not rows:
+                break
+            first = False
+    finally:
+        cursor.close()
+
+
 # Função para fechar a conexão
 def close_connection(conn):
     if conn is not None:
@@ -60,7 +270,7 @@ def save_dataframe_to_csv(df, filename):
         raise RuntimeError(f"Failed to save DataFrame to CSV: {e}")
 
 
-def add_attribute_join(table, attribute, join_type="LEFT JOIN", custom_conditions=""):
+def add_attribute_join(table, attribute, join_type="LEFT JOIN", custom_conditions="", alias=None, attribute_ids=None):
     if table.endswith('_var'):
         prefix = 'pav'
     elif table.endswith('_int'):
@@ -74,6 +284,20 @@ def add_attribute_join(table, attribute, join_type="LEFT JOIN", custom_condition
     if custom_conditions:
         join_conditions += custom_conditions
 
+    alias = alias or attribute
+
+    # Com o catálogo de atributos carregado, usa os ids literais em vez do JOIN por nome
+    if attribute_ids is not None:
+        ids = ', '.join(str(attribute_id) for attribute_id in attribute_ids.get(attribute, [])) or 'NULL'
+        return f"""
+    {join_type} (
+        SELECT {prefix}.value, {prefix}.product_id
+        FROM magento.{table} {prefix}
+        WHERE {prefix}.attribute_id IN ({ids})
+        {join_conditions}
+    ) {alias} ON {alias}.product_id = p.row_id
+    """
+
     return f"""
     {join_type} (
         SELECT {prefix}.value, {prefix}.product_id
@@ -81,234 +305,794 @@ def add_attribute_join(table, attribute, join_type="LEFT JOIN", custom_condition
         JOIN magento.attribute_product ap ON {prefix}.attribute_id = ap.id
         AND ap.name = '{attribute}'
         {join_conditions}
-    ) {attribute} ON {attribute}.product_id = p.row_id
+    ) {alias} ON {alias}.product_id = p.row_id
     """
 
 
-def rename_dataframe_columns(df, conn):
-    # Busca o mapeamento de nomes de colunas
-    mapping_query = "SELECT name, label FROM magento.attribute_product"
-    df_mapping = query_to_dataframe(conn, mapping_query)
+# Atributos EAV adicionais da consulta do catálogo (tabela, atributo)
+ADDITIONAL_ATTRIBUTES = [
+    ("product_attribute_int", "hide_from_product_view"),
+    ("product_attribute_var", "manufacturer_sku"),
+    ("product_attribute_txt", "category_ids"),
+    ("product_attribute_txt", "applications"),
+    ("product_attribute_txt", "abrasion_wear_resistance"),
+    ("product_attribute_var", "acoustics"),
+    ("product_attribute_var", "ada"),
+    ("product_attribute_var", "antimicrobial_testing"),
+    ("product_attribute_var", "backing_input"),
+    ("product_attribute_var", "thickness_pile_height_carpet"),
+    ("product_attribute_txt", "classification"),
+    ("product_attribute_txt", "collection_name"),
+    ("product_attribute_txt", "construction"),
+    ("product_attribute_var", "content_test_attribute"),
+    ("product_attribute_txt", "custom_capabilities"),
+    ("product_attribute_txt", "description"),
+    # Note: Appears twice in Excel, adjust if needed
+    ("product_attribute_txt", "designer_name"),
+    ("product_attribute_var", "edge_end_detail"),
+    ("product_attribute_var", "emissions"),
+    ("product_attribute_var", "finish_treatment"),
+    ("product_attribute_txt", "flammability"),
+    ("product_attribute_var", "grout_width"),
+    ("product_attribute_var", "hanging_information"),
+    ("product_attribute_var", "hardness_result"),
+    ("product_attribute_var", "hide_configuration"),
+    ("product_attribute_var", "installation"),
+    ("product_attribute_var", "installation_direction"),
+    ("product_attribute_var", "lead_time"),
+    ("product_attribute_txt", "leed"),
+    ("product_attribute_var", "length"),
+    ("product_attribute_var", "lightfastness_mdp"),
+    ("product_attribute_txt", "maintenance_maya"),
+    ("product_attribute_txt", "manufacturer_notes"),
+    ("product_attribute_var", "min_max_units"),
+    ("product_attribute_var", "percentage_of_opacity"),
+    ("product_attribute_var", "order_increments"),
+    ("product_attribute_var", "thickness"),
+    ("product_attribute_var", "pattern_repeat_width"),
+    ("product_attribute_var", "performance"),
+    ("product_attribute_var", "pile_face_weight_carpet"),
+    ("product_attribute_txt", "product_details"),
+    ("product_attribute_var", "recommended_grout"),
+    ("product_attribute_var", "series_name"),
+    ("product_attribute_txt", "size_notes"),
+    ("product_attribute_var", "slip_resistance"),
+    ("product_attribute_var", "stain_resistance"),
+    ("product_attribute_int", "state_of_origin"),
+    ("product_attribute_var", "surface_pile_density"),
+    ("product_attribute_var", "surface_texture_mdp"),
+    ("product_attribute_var", "tile_sheet_dimensions"),
+    ("product_attribute_var", "total_weight"),
+    ("product_attribute_var", "warranty"),
+    ("product_attribute_var", "water_absorption_result"),
+    ("product_attribute_var", "wear_layer_thickness"),
+    ("product_attribute_var", "weather_resistance_result"),
+    ("product_attribute_var", "width"),
+    ("product_attribute_var", "wood_grade"),
+    ("product_attribute_var", "yarn_tuft_details"),
+    ("product_attribute_var", "year_of_introduction")
+]
+
+# Atributos EAV que já fazem parte da consulta base
+BASE_ATTRIBUTES = [
+    ("product_attribute_var", "name"),
+    ("product_attribute_var", "url_key"),
+    ("product_attribute_int", "status"),
+    ("product_attribute_int", "visibility"),
+]
+
+# Ordem das colunas retornadas por main()
+CATALOG_COLUMNS = [
+    'id', 'row_id', 'sku', 'attribute_set_id', 'type_id', 'created_at', 'updated_at',
+    'attribute_set_name', 'visibility', 'status', 'name', 'manufacturer_id', 'manufacturer_name',
+    'url_key', 'created_at_local', 'updated_at_local', 'manufacturer_sku', 'hide_from_product_view',
+] + [
+    attribute for _, attribute in ADDITIONAL_ATTRIBUTES
+    if attribute not in ('hide_from_product_view', 'manufacturer_sku', 'category_ids')
+] + ['category_ids']
+
+# Tabela EAV de cada atributo conhecido
+ATTRIBUTE_BACKEND_TABLES = {attribute: table for table, attribute in BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES}
+
+# Tempo de vida do catálogo de atributos em memória (segundos)
+ATTRIBUTE_CATALOG_TTL = float(os.getenv('ATTRIBUTE_CATALOG_TTL', '3600'))
+
+# Representação compacta do catálogo em memória (tipos por tabela EAV, '' guardado como nulo) na cópia local
+# e nas verificações do bot; main() só devolve o frame compacto com compact=True
+COMPACT_FRAMES = os.getenv('COMPACT_CATALOG_FRAMES', '1') == '1'
+# Colunas de texto viram category quando têm no máximo esta fração de valores distintos
+CATEGORY_MAX_RATIO = float(os.getenv('CATEGORY_MAX_RATIO', '0.5'))
+
+# Colunas da tabela de produtos com tipo fixo
+CATEGORY_COLUMNS = ('type_id', 'attribute_set_name', 'manufacturer_name')
+STRING_COLUMNS = ('sku',)
+
+# Fabricantes que não entram na exportação
+EXCLUDED_MANUFACTURERS = (50461, 50462, 50459, 50460, 38379)
+
+ATTRIBUTE_TABLES = ('product_attribute_var', 'product_attribute_int', 'product_attribute_txt')
+
+# Extração paralela: número de partições (1 = consulta única) e critério ('row_id' ou 'manufacturer')
+EXTRACTION_PARTITIONS = int(os.getenv('REDSHIFT_EXTRACTION_PARTITIONS', '1'))
+PARTITION_BY = os.getenv('REDSHIFT_PARTITION_BY', 'row_id')
+
+# Modo de extração: 'joins' (uma subconsulta por atributo), 'pivot' (uma leitura por tabela EAV)
+# ou 'snapshot' (cópia local atualizada apenas com os produtos alterados)
+EXTRACTION_MODE = os.getenv('REDSHIFT_EXTRACTION_MODE', 'joins')
+
+# Diretório da cópia local do catálogo
+SNAPSHOT_DIR = os.getenv('CATALOG_SNAPSHOT_DIR', 'snapshots')
+
+
+# Catálogo em memória de magento.attribute_product (id, nome, label e tabela EAV)
+class AttributeCatalog:
+    def __init__(self, ttl=ATTRIBUTE_CATALOG_TTL, pool=None):
+        self.ttl = ttl
+        self.pool = pool
+        self.attributes = {}  # id -> {'id', 'name', 'label', 'table'}
+        self.loaded_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.loaded_at is not None
+
+    @property
+    def stale(self):
+        return not self.loaded or time.time() - self.loaded_at > self.ttl
+
+    def load(self, conn):
+        df_attributes = query_to_dataframe(conn, "SELECT id, name, label FROM magento.attribute_product")
+        if df_attributes.empty:
+            return False  # Mantém o conteúdo anterior se a leitura falhar
+
+        attributes = {
+            attribute_id: {
+                'id': attribute_id,
+                'name': name,
+                'label': label if pd.notna(label) else None,
+                'table': ATTRIBUTE_BACKEND_TABLES.get(name),
+            }
+            for attribute_id, name, label in zip(df_attributes['id'], df_attributes['name'], df_attributes['label'])
+        }
+        with self._lock:
+            self.attributes = attributes
+            self.loaded_at = time.time()
+        return True
+
+    def _refresh(self):
+        pool = self.pool or get_pool()
+        try:
+            with pool.connection() as conn:
+                if conn is not None:
+                    self.load(conn)
+        except Exception as e:
+            print(f"Error: {e}")
+        finally:
+            self._refreshing = False
 
-    # Cria um dicionário para mapear nomes antigos para novos
-    name_mapping = {row['name']: row['label'] for index, row in df_mapping.iterrows() if row['label']}
+    # Retorna o catálogo; carrega na primeira vez e atualiza em segundo plano quando expira
+    def get(self, conn=None):
+        if not self.loaded:
+            if conn is not None:
+                self.load(conn)
+            else:
+                self._refreshing = True
+                self._refresh()
+        elif self.stale and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, daemon=True).start()
+        return self
 
+    def invalidate(self):
+        with self._lock:
+            self.attributes = {}
+            self.loaded_at = None
+
+    # Mapeamento nome -> label para renomear colunas
+    def label_mapping(self):
+        return {attribute['name']: attribute['label'] for attribute in self.attributes.values() if attribute['label']}
+
+    # Mapeamento id -> nome dos atributos pedidos
+    def attribute_ids(self, names):
+        names = set(names)
+        return {attribute_id: attribute['name'] for attribute_id, attribute in self.attributes.items()
+                if attribute['name'] in names}
+
+    # Mapeamento nome -> lista de ids, ou None se o catálogo não estiver carregado
+    def ids_by_name(self):
+        if not self.loaded:
+            return None
+        ids = {}
+        for attribute_id, attribute in self.attributes.items():
+            ids.setdefault(attribute['name'], []).append(attribute_id)
+        return ids
+
+
+attribute_catalog = AttributeCatalog()
+
+
+def get_column_mapping(conn):
+    # Busca o mapeamento de nomes de colunas no catálogo de atributos
+    return attribute_catalog.get(conn).label_mapping()
+
+
+def rename_dataframe_columns(df, conn):
     # Renomeia as colunas no DataFrame
-    df = df.rename(columns=name_mapping)
+    df = df.rename(columns=get_column_mapping(conn))
     return df
 
 
-def main():
-    conn = connect_to_redshift(host, port, dbname, user, password)
+def build_catalog_query(limit=50, attribute_ids=None, conditions=""):
+    base_query = """
+      SELECT
+        p.id,
+        p.row_id,
+        p.sku,
+        p.attribute_set_id,
+        p.type_id,
+        p.created_at,
+        p.updated_at,
+        ats.name AS attribute_set_name,
+        COALESCE(visibility.value, 0) AS visibility,  -- Ajustado para inteiro
+        COALESCE(status.value, 0) AS status,  -- Ajustado para inteiro
+        COALESCE(an.value, '') AS name,
+        COALESCE(pm.manufacturer_id, 0) AS manufacturer_id,  -- Ajustado para inteiro
+        COALESCE(pm.name, '') AS manufacturer_name,
+        COALESCE(url.value, '') AS url_key,
+        convert_timezone('US/Eastern', p.created_at) AS created_at_local,
+        convert_timezone('US/Eastern', p.updated_at) AS updated_at_local,
+        COALESCE(manufacturer_sku.value, '') AS manufacturer_sku,  -- Presumido como texto
+        COALESCE(hide_from_product_view.value, 0) AS hide_from_product_view,
+        COALESCE(applications.value, '') AS applications,
+        COALESCE(abrasion_wear_resistance.value, '') AS abrasion_wear_resistance,
+        COALESCE(acoustics.value, '') AS acoustics,
+        COALESCE(ada.value, '') AS ada,
+        COALESCE(antimicrobial_testing.value, '') AS antimicrobial_testing,
+        COALESCE(backing_input.value, '') AS backing_input,
+        COALESCE(thickness_pile_height_carpet.value, '') AS thickness_pile_height_carpet,
+        COALESCE(classification.value, '') AS classification,
+        COALESCE(collection_name.value, '') AS collection_name,
+        COALESCE(construction.value, '') AS construction,
+        COALESCE(content_test_attribute.value, '') AS content_test_attribute,
+        COALESCE(custom_capabilities.value, '') AS custom_capabilities,
+        COALESCE(description.value, '') AS description,
+        COALESCE(designer_name.value, '') AS designer_name,
+        COALESCE(edge_end_detail.value, '') AS edge_end_detail,
+        COALESCE(emissions.value, '') AS emissions,
+        COALESCE(finish_treatment.value, '') AS finish_treatment,
+        COALESCE(flammability.value, '') AS flammability,
+        COALESCE(grout_width.value, '') AS grout_width,
+        COALESCE(hanging_information.value, '') AS hanging_information,
+        COALESCE(hardness_result.value, '') AS hardness_result,
+        COALESCE(hide_configuration.value, '') AS hide_configuration,
+        COALESCE(installation.value, '') AS installation,
+        COALESCE(installation_direction.value, '') AS installation_direction,
+        COALESCE(lead_time.value, '') AS lead_time,
+        COALESCE(leed.value, '') AS leed,
+        COALESCE(length.value, '') AS length,
+        COALESCE(lightfastness_mdp.value, '') AS lightfastness_mdp,
+        COALESCE(maintenance_maya.value, '') AS maintenance_maya,
+        COALESCE(manufacturer_notes.value, '') AS manufacturer_notes,
+        COALESCE(min_max_units.value, '') AS min_max_units,
+        COALESCE(percentage_of_opacity.value, '') AS percentage_of_opacity,
+        COALESCE(order_increments.value, '') AS order_increments,
+        COALESCE(thickness.value, '') AS thickness,
+        COALESCE(pattern_repeat_width.value, '') AS pattern_repeat_width,
+        COALESCE(performance.value, '') AS performance,
+        COALESCE(pile_face_weight_carpet.value, '') AS pile_face_weight_carpet,
+        COALESCE(product_details.value, '') AS product_details,
+        COALESCE(recommended_grout.value, '') AS recommended_grout,
+        COALESCE(series_name.value, '') AS series_name,
+        COALESCE(size_notes.value, '') AS size_notes,
+        COALESCE(slip_resistance.value, '') AS slip_resistance,
+        COALESCE(stain_resistance.value, '') AS stain_resistance,
+        COALESCE(state_of_origin.value, 0) AS state_of_origin,
+        COALESCE(surface_pile_density.value, '') AS surface_pile_density,
+        COALESCE(surface_texture_mdp.value, '') AS surface_texture_mdp,
+        COALESCE(tile_sheet_dimensions.value, '') AS tile_sheet_dimensions,
+        COALESCE(total_weight.value, '') AS total_weight,
+        COALESCE(warranty.value, '') AS warranty,
+        COALESCE(water_absorption_result.value, '') AS water_absorption_result,
+        COALESCE(wear_layer_thickness.value, '') AS wear_layer_thickness,
+        COALESCE(weather_resistance_result.value, '') AS weather_resistance_result,
+        COALESCE(width.value, '') AS width,
+        COALESCE(wood_grade.value, '') AS wood_grade,
+        COALESCE(yarn_tuft_details.value, '') AS yarn_tuft_details,
+        COALESCE(year_of_introduction.value, '') AS year_of_introduction,
+        COALESCE(category_ids.value, '') AS category_ids
+    FROM magento.product_basic p
+    JOIN magento.attribute_set ats ON ats.id = p.attribute_set_id
+    LEFT JOIN (
+        SELECT m.manufacturer_id, m.name, cpei.row_id
+        FROM mbdw.catalog_product_entity_int cpei
+        JOIN magento.manufacturer_listing m ON m.manufacturer_id = cpei.value
+        AND cpei.store_id = 0
+        AND cpei._sdc_deleted_at__string is null
+        AND cpei._sdc_deleted_at__inst is null
+    ) pm ON pm.row_id = p.row_id
+    """
+
+    base_joins = [
+        add_attribute_join("product_attribute_var", "name", alias="an", attribute_ids=attribute_ids),
+        add_attribute_join("product_attribute_var", "url_key", alias="url", attribute_ids=attribute_ids),
+        add_attribute_join("product_attribute_int", "status", attribute_ids=attribute_ids),
+        add_attribute_join("product_attribute_int", "visibility", attribute_ids=attribute_ids),
+    ]
+
+    # Adicione JOINS adicionais conforme necessário
+    additional_joins = base_joins + [
+        add_attribute_join(table, attribute, attribute_ids=attribute_ids) for table, attribute in ADDITIONAL_ATTRIBUTES
+    ]
+
+    # Combine base_query with additional_joins
+    excluded = ', '.join(str(manufacturer_id) for manufacturer_id in EXCLUDED_MANUFACTURERS)
+    full_query = base_query + ' ' + ' '.join(additional_joins) + f"""
+        WHERE hide_from_product_view.value = 0
+        AND visibility.value = 2
+        AND pm.manufacturer_id NOT IN ({excluded})
+        AND p._sdc_deleted_at__string is null
+        AND p._sdc_deleted_at__inst is null
+        {conditions}
+    """
+    if limit is not None:
+        full_query += f"LIMIT {int(limit)}"
+    return full_query + ";"
+
+
+# Valor usado no COALESCE de cada tabela EAV
+def attribute_default(table):
+    return 0 if table.endswith('_int') else ''
+
+
+# Resolve os ids dos atributos pelo catálogo, em vez de um JOIN por atributo
+def resolve_attribute_ids(conn, names):
+    return attribute_catalog.get(conn).attribute_ids(names)
+
+
+def _attribute_id_list(attribute_ids, name):
+    ids = [str(attribute_id) for attribute_id, attribute in attribute_ids.items() if attribute == name]
+    return ', '.join(ids) or 'NULL'
+
+
+def build_product_query(attribute_ids, limit=50, conditions=""):
+    excluded = ', '.join(str(manufacturer_id) for manufacturer_id in EXCLUDED_MANUFACTURERS)
+    query = f"""
+      SELECT
+        p.id,
+        p.row_id,
+        p.sku,
+        p.attribute_set_id,
+        p.type_id,
+        p.created_at,
+        p.updated_at,
+        ats.name AS attribute_set_name,
+        COALESCE(pm.manufacturer_id, 0) AS manufacturer_id,
+        COALESCE(pm.name, '') AS manufacturer_name,
+        convert_timezone('US/Eastern', p.created_at) AS created_at_local,
+        convert_timezone('US/Eastern', p.updated_at) AS updated_at_local
+    FROM magento.product_basic p
+    JOIN magento.attribute_set ats ON ats.id = p.attribute_set_id
+    LEFT JOIN (
+        SELECT m.manufacturer_id, m.name, cpei.row_id
+        FROM mbdw.catalog_product_entity_int cpei
+        JOIN magento.manufacturer_listing m ON m.manufacturer_id = cpei.value
+        AND cpei.store_id = 0
+        AND cpei._sdc_deleted_at__string is null
+        AND cpei._sdc_deleted_at__inst is null
+    ) pm ON pm.row_id = p.row_id
+    WHERE pm.manufacturer_id NOT IN ({excluded})
+    AND p._sdc_deleted_at__string is null
+    AND p._sdc_deleted_at__inst is null
+    AND p.row_id IN (
+        SELECT pai.product_id FROM magento.product_attribute_int pai
+        WHERE pai.attribute_id IN ({_attribute_id_list(attribute_ids, 'hide_from_product_view')})
+        AND pai.store_id = 0 AND pai.value = 0
+    )
+    AND p.row_id IN (
+        SELECT pai.product_id FROM magento.product_attribute_int pai
+        WHERE pai.attribute_id IN ({_attribute_id_list(attribute_ids, 'visibility')})
+        AND pai.store_id = 0 AND pai.value = 2
+    )
+    {conditions}
+    """
+    if limit is not None:
+        query += f"LIMIT {int(limit)}"
+    return query + ";"
+
+
+# Lê uma tabela EAV uma única vez para todos os atributos pedidos
+def fetch_attribute_values(conn, table, attribute_ids, product_ids=None, conditions=""):
+    if not attribute_ids or (product_ids is not None and len(product_ids) == 0):
+        return pd.DataFrame(columns=['product_id', 'attribute_id', 'value'])
+
+    ids = ', '.join(str(attribute_id) for attribute_id in attribute_ids)
+    query = f"""
+        SELECT product_id, attribute_id, value
+        FROM magento.{table}
+        WHERE store_id = 0
+        AND attribute_id IN ({ids})
+        {conditions}
+    """
+    if product_ids is not None:
+        query += f"AND product_id IN ({', '.join(str(product_id) for product_id in product_ids)})"
+    return query_to_dataframe(conn, query)
+
+
+# Converte as linhas (produto, atributo, valor) em uma coluna por atributo
+def pivot_attribute_values(values, attribute_ids):
+    values = values.assign(attribute=values['attribute_id'].map(attribute_ids))
+    values = values.drop_duplicates(['product_id', 'attribute'], keep='last')
+    return values.pivot(index='product_id', columns='attribute', values='value')
+
+
+# Converte o catálogo para tipos compactos: _int -> inteiro anulável, _var -> category
+# (ou texto Arrow se houver muitos valores distintos), _txt -> texto Arrow; '' vira nulo
+def compact_catalog_frame(df, category_max_ratio=CATEGORY_MAX_RATIO):
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        table = ATTRIBUTE_BACKEND_TABLES.get(column)
+        if column in CATEGORY_COLUMNS:
+            table = 'product_attribute_var'
+        elif column in STRING_COLUMNS:
+            table = 'product_attribute_txt'
+
+        if table is None or isinstance(series.dtype, pd.CategoricalDtype):
+            columns[column] = series
+        elif table.endswith('_int'):
+            columns[column] = series.astype('Int64')
+        else:
+            series = series.mask(series == '').astype('string[pyarrow]')
+            if table.endswith('_var') and series.nunique() <= category_max_ratio * len(series):
+                series = series.astype('category')
+            columns[column] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+# Volta os nulos das colunas de texto compactas para '' (formato da consulta original)
+def restore_empty_strings(df):
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(object).where(series.notna(), '')
+        elif isinstance(series.dtype, pd.StringDtype):
+            series = series.fillna('')
+        columns[column] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+# Extração em passo único: uma leitura por tabela EAV e pivot no cliente
+def extract_catalog_pivot(conn, limit=50):
+    attributes = BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES
+    attribute_ids = resolve_attribute_ids(conn, [attribute for _, attribute in attributes])
+
+    df = query_to_dataframe(conn, build_product_query(attribute_ids, limit))
+    if df.empty:
+        return df.reindex(columns=CATALOG_COLUMNS)
+
+    # Com LIMIT, lê apenas os valores dos produtos selecionados
+    product_ids = df['row_id'].tolist() if limit is not None else None
+    return fill_attribute_columns(conn, df, attribute_ids, product_ids)
+
+
+# Completa o DataFrame de produtos com uma coluna por atributo EAV
+def fill_attribute_columns(conn, df, attribute_ids, product_ids=None, conditions=""):
+    attributes = BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES
+    for table in ATTRIBUTE_TABLES:
+        names = {attribute for attribute_table, attribute in attributes if attribute_table == table}
+        table_ids = {attribute_id: name for attribute_id, name in attribute_ids.items() if name in names}
+        values = fetch_attribute_values(conn, table, table_ids, product_ids, conditions)
+        if not values.empty:
+            df = df.join(pivot_attribute_values(values, table_ids), on='row_id')
+
+    # Aplica os mesmos defaults do COALESCE da consulta original
+    for table, attribute in attributes:
+        default = attribute_default(table)
+        if attribute not in df.columns:
+            df[attribute] = default
+        df[attribute] = df[attribute].fillna(default)
+        if table.endswith('_int'):
+            df[attribute] = df[attribute].astype('int64')
+
+    return df[CATALOG_COLUMNS]
+
+
+# Divide os produtos em partições; cada uma tem um filtro para a consulta de produtos
+# e, quando possível, um filtro equivalente para as tabelas EAV
+def partition_filters(conn, partitions, partition_by=PARTITION_BY):
+    if partition_by == 'manufacturer':
+        return [(f"AND MOD(pm.manufacturer_id, {partitions}) = {i}", None) for i in range(partitions)]
+
+    bounds = query_to_dataframe(conn, "SELECT MIN(row_id) AS low, MAX(row_id) AS high FROM magento.product_basic")
+    if bounds.empty or pd.isna(bounds['low'].iloc[0]):
+        return [("", None)]
+
+    low, high = int(bounds['low'].iloc[0]), int(bounds['high'].iloc[0])
+    step = (high - low) // partitions + 1
+    filters = []
+    for i in range(partitions):
+        start, end = low + i * step, low + (i + 1) * step
+        filters.append((f"AND p.row_id >= {start} AND p.row_id < {end}",
+                        f"AND product_id >= {start} AND product_id < {end}"))
+    return filters
+
+
+# Extrai uma partição com a conexão informada
+def extract_partition(conn, extraction_mode, limit, product_filter, attribute_filter):
+    if extraction_mode == 'pivot':
+        attribute_ids = resolve_attribute_ids(conn, [attribute for _, attribute in BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES])
+        df = query_to_dataframe(conn, build_product_query(attribute_ids, limit, product_filter))
+        if df.empty:
+            return df.reindex(columns=CATALOG_COLUMNS)
+        if attribute_filter is None or limit is not None:
+            return fill_attribute_columns(conn, df, attribute_ids, df['row_id'].tolist())
+        return fill_attribute_columns(conn, df, attribute_ids, conditions=attribute_filter)
+
+    attribute_ids = attribute_catalog.get(conn).ids_by_name()
+    return query_to_dataframe(conn, build_catalog_query(limit, attribute_ids, product_filter))
+
+
+# Extração paralela: cada partição roda em sua própria sessão e o resultado é concatenado na ordem das partições
+def extract_catalog_partitioned(conn, extraction_mode=EXTRACTION_MODE, limit=50, partitions=EXTRACTION_PARTITIONS,
+                                partition_by=PARTITION_BY):
+    with raise_query_errors():
+        attribute_catalog.get(conn)  # Carrega o catálogo antes de abrir as demais sessões
+        filters = partition_filters(conn, partitions, partition_by)
+
+    # Sessões extras só das vagas livres do pool, sem esperar: com o pool ocupado por outros jobs, as partições
+    # que sobram rodam em sequência nas sessões já obtidas (no mínimo a do chamador) em vez de esgotar o timeout
+    pool = get_pool()
+    sessions = [conn]
+    while len(sessions) < len(filters):
+        extra_conn = pool.getconn(timeout=0)
+        if extra_conn is None:
+            break
+        sessions.append(extra_conn)
+
+    pending = deque(enumerate(filters))
+    frames = [None] * len(filters)
+    failed = set()
+
+    def run_partitions(session):
+        while True:
+            try:
+                index, (product_filter, attribute_filter) = pending.popleft()
+            except IndexError:
+                return
+            try:
+                with raise_query_errors():
+                    frames[index] = extract_partition(session, extraction_mode, limit, product_filter, attribute_filter)
+            except Exception:
+                failed.add(id(session))
+                pending.clear()  # As outras sessões param depois da partição atual
+                raise
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+            for future in [executor.submit(run_partitions, session) for session in sessions]:
+                future.result()
+    finally:
+        # A conexão do chamador volta ao pool pelo próprio chamador
+        for session in sessions[1:]:
+            pool.putconn(session, discard=id(session) in failed)
+
+    df = pd.concat(frames, ignore_index=True)
+    return df.head(limit) if limit is not None else df
+
+
+# Cópia local do catálogo em Parquet, atualizada incrementalmente pelo updated_at
+class CatalogSnapshot:
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.data_path = os.path.join(directory, 'catalog.parquet')
+        self.state_path = os.path.join(directory, 'catalog.json')
+        self.df = None
+        self.watermark = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if os.path.exists(self.data_path) and os.path.exists(self.state_path):
+            self.df = pd.read_parquet(self.data_path)
+            with open(self.state_path) as state:
+                self.watermark = json.load(state).get('watermark')
+            if self.watermark == 'NaT':
+                self.watermark = None  # Cópias antigas gravavam o watermark de uma tabela vazia como 'NaT'
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.data_path) or '.', exist_ok=True)
+        # Grava em arquivos temporários e troca, para não deixar uma cópia pela metade
+        self.df.to_parquet(self.data_path + '.tmp', index=False)
+        with open(self.state_path + '.tmp', 'w') as state:
+            json.dump({'watermark': self.watermark, 'rows': len(self.df)}, state)
+        os.replace(self.data_path + '.tmp', self.data_path)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    # Lê os produtos alterados desde o watermark (ou o catálogo inteiro na primeira vez)
+    def _fetch_delta(self, conn, attribute_ids):
+        if self.df is None or self.watermark is None:
+            conditions = ""
+            changed = None
+        else:
+            conditions = f"AND p.updated_at > '{self.watermark}'"
+            changed = query_to_dataframe(conn, f"SELECT p.row_id FROM magento.product_basic p WHERE p.updated_at > '{self.watermark}'")
+            if 'row_id' not in changed.columns:
+                return None, None
+
+        delta = query_to_dataframe(conn, build_product_query(attribute_ids, None, conditions))
+        if 'row_id' not in delta.columns:
+            return None, None
+        if delta.empty:
+            return delta.reindex(columns=CATALOG_COLUMNS), changed
+
+        product_ids = delta['row_id'].tolist() if changed is not None else None
+        return fill_attribute_columns(conn, delta, attribute_ids, product_ids), changed
+
+    def refresh(self, conn):
+        with self._lock:
+            if self.df is None:
+                self.load()
+
+            # O novo watermark é lido antes do delta para não perder alterações feitas durante a leitura
+            high = query_to_dataframe(conn, "SELECT MAX(p.updated_at) AS watermark FROM magento.product_basic p")
+            if high.empty:
+                return self.df
+
+            attribute_ids = resolve_attribute_ids(conn, [attribute for _, attribute in BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES])
+            delta, changed = self._fetch_delta(conn, attribute_ids)
+            # Produtos removidos (soft delete) saem da cópia como saem das extrações com joins e pivot,
+            # mesmo sem mudar o updated_at
+            deleted = query_to_dataframe(conn, """
+                SELECT p.row_id
+                FROM magento.product_basic p
+                WHERE p._sdc_deleted_at__string IS NOT NULL
+                OR p._sdc_deleted_at__inst IS NOT NULL
+            """)
+            if delta is None or 'row_id' not in deleted.columns:
+                return self.df  # Mantém a cópia e o watermark se alguma leitura falhar
+
+            if changed is None:
+                df = delta
+            else:
+                # Produtos alterados saem da cópia e voltam apenas se ainda passam nos filtros
+                df = pd.concat([self.df[~self.df['row_id'].isin(changed['row_id'])], delta], ignore_index=True)
+            df = df[~df['row_id'].isin(deleted['row_id'])].reset_index(drop=True)
+
+            print(f"Snapshot: {len(delta)} produtos atualizados, {len(df)} no total.")
+            self.df = df[CATALOG_COLUMNS]
+            if COMPACT_FRAMES:
+                self.df = compact_catalog_frame(self.df)
+            # Tabela vazia: MAX() nulo; sem watermark a próxima atualização relê tudo
+            watermark = high['watermark'].iloc[0]
+            self.watermark = None if pd.isna(watermark) else str(watermark)
+            self.save()
+            return self.df
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+# Identifica a consulta do catálogo (texto do SQL, modo e limite) para reaproveitar exportações já geradas
+def catalog_fingerprint(extraction_mode=EXTRACTION_MODE, limit=None):
+    definition = json.dumps([extraction_mode, limit, build_catalog_query(limit)])
+    return hashlib.sha256(definition.encode('utf-8')).hexdigest()[:16]
+
+
+# Gera o catálogo em blocos de no máximo chunk_size produtos
+def iter_catalog_chunks(conn, extraction_mode=EXTRACTION_MODE, limit=None, chunk_size=CHUNK_SIZE):
+    if extraction_mode == 'snapshot':
+        df = catalog_snapshot.refresh(conn)
+        if df is None:
+            return
+        if limit is not None:
+            df = df.head(limit)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    elif extraction_mode == 'pivot':
+        attribute_ids = resolve_attribute_ids(conn, [attribute for _, attribute in BASE_ATTRIBUTES + ADDITIONAL_ATTRIBUTES])
+        for chunk in iter_query_chunks(conn, build_product_query(attribute_ids, limit), chunk_size):
+            if chunk.empty:
+                yield chunk.reindex(columns=CATALOG_COLUMNS)
+            else:
+                yield fill_attribute_columns(conn, chunk, attribute_ids, chunk['row_id'].tolist())
+    else:
+        attribute_ids = attribute_catalog.get(conn).ids_by_name()
+        yield from iter_query_chunks(conn, build_catalog_query(limit, attribute_ids), chunk_size)
+
+
+# Exporta o catálogo bloco a bloco, sem carregar o resultado inteiro
+# write_chunk recebe cada bloco já renomeado e retorna quantos bytes escreveu
+# progress, se informado, recebe (etapa, rows=..., nbytes=...) a cada bloco
+def export_catalog(write_chunk, extraction_mode=EXTRACTION_MODE, limit=None, chunk_size=CHUNK_SIZE, progress=None):
+    pool = get_pool()
+    conn = pool.getconn()
     start_time = time.time()
 
-    if conn is not None:
-        # Construa sua consulta SQL base
-        base_query = """
-          SELECT
-            p.id,
-            p.row_id,
-            p.sku,
-            p.attribute_set_id,
-            p.type_id,
-            p.created_at,
-            p.updated_at,
-            ats.name AS attribute_set_name,
-            COALESCE(visibility.value, 0) AS visibility,  -- Ajustado para inteiro
-            COALESCE(status.value, 0) AS status,  -- Ajustado para inteiro
-            COALESCE(an.value, '') AS name,
-            COALESCE(pm.manufacturer_id, 0) AS manufacturer_id,  -- Ajustado para inteiro
-            COALESCE(pm.name, '') AS manufacturer_name,
-            COALESCE(url.value, '') AS url_key,
-            convert_timezone('US/Eastern', p.created_at) AS created_at_local,
-            convert_timezone('US/Eastern', p.updated_at) AS updated_at_local,
-            COALESCE(manufacturer_sku.value, '') AS manufacturer_sku,  -- Presumido como texto
-            COALESCE(hide_from_product_view.value, 0) AS hide_from_product_view,
-            COALESCE(applications.value, '') AS applications,
-            COALESCE(abrasion_wear_resistance.value, '') AS abrasion_wear_resistance,
-            COALESCE(acoustics.value, '') AS acoustics,
-            COALESCE(ada.value, '') AS ada,
-            COALESCE(antimicrobial_testing.value, '') AS antimicrobial_testing,
-            COALESCE(backing_input.value, '') AS backing_input,
-            COALESCE(thickness_pile_height_carpet.value, '') AS thickness_pile_height_carpet,
-            COALESCE(classification.value, '') AS classification,
-            COALESCE(collection_name.value, '') AS collection_name,
-            COALESCE(construction.value, '') AS construction,
-            COALESCE(content_test_attribute.value, '') AS content_test_attribute,
-            COALESCE(custom_capabilities.value, '') AS custom_capabilities,
-            COALESCE(description.value, '') AS description,
-            COALESCE(designer_name.value, '') AS designer_name,
-            COALESCE(edge_end_detail.value, '') AS edge_end_detail,
-            COALESCE(emissions.value, '') AS emissions,
-            COALESCE(finish_treatment.value, '') AS finish_treatment,
-            COALESCE(flammability.value, '') AS flammability,
-            COALESCE(grout_width.value, '') AS grout_width,
-            COALESCE(hanging_information.value, '') AS hanging_information,
-            COALESCE(hardness_result.value, '') AS hardness_result,
-            COALESCE(hide_configuration.value, '') AS hide_configuration,
-            COALESCE(installation.value, '') AS installation,
-            COALESCE(installation_direction.value, '') AS installation_direction,
-            COALESCE(lead_time.value, '') AS lead_time,
-            COALESCE(leed.value, '') AS leed,
-            COALESCE(length.value, '') AS length,
-            COALESCE(lightfastness_mdp.value, '') AS lightfastness_mdp,
-            COALESCE(maintenance_maya.value, '') AS maintenance_maya,
-            COALESCE(manufacturer_notes.value, '') AS manufacturer_notes,
-            COALESCE(min_max_units.value, '') AS min_max_units,
-            COALESCE(percentage_of_opacity.value, '') AS percentage_of_opacity,
-            COALESCE(order_increments.value, '') AS order_increments,
-            COALESCE(thickness.value, '') AS thickness,
-            COALESCE(pattern_repeat_width.value, '') AS pattern_repeat_width,
-            COALESCE(performance.value, '') AS performance,
-            COALESCE(pile_face_weight_carpet.value, '') AS pile_face_weight_carpet,
-            COALESCE(product_details.value, '') AS product_details,
-            COALESCE(recommended_grout.value, '') AS recommended_grout,
-            COALESCE(series_name.value, '') AS series_name,
-            COALESCE(size_notes.value, '') AS size_notes,
-            COALESCE(slip_resistance.value, '') AS slip_resistance,
-            COALESCE(stain_resistance.value, '') AS stain_resistance,
-            COALESCE(state_of_origin.value, 0) AS state_of_origin,
-            COALESCE(surface_pile_density.value, '') AS surface_pile_density,
-            COALESCE(surface_texture_mdp.value, '') AS surface_texture_mdp,
-            COALESCE(tile_sheet_dimensions.value, '') AS tile_sheet_dimensions,
-            COALESCE(total_weight.value, '') AS total_weight,
-            COALESCE(warranty.value, '') AS warranty,
-            COALESCE(water_absorption_result.value, '') AS water_absorption_result,
-            COALESCE(wear_layer_thickness.value, '') AS wear_layer_thickness,
-            COALESCE(weather_resistance_result.value, '') AS weather_resistance_result,
-            COALESCE(width.value, '') AS width,
-            COALESCE(wood_grade.value, '') AS wood_grade,
-            COALESCE(yarn_tuft_details.value, '') AS yarn_tuft_details,
-            COALESCE(year_of_introduction.value, '') AS year_of_introduction,
-            COALESCE(category_ids.value, '') AS category_ids
-        FROM magento.product_basic p
-        JOIN magento.attribute_set ats ON ats.id = p.attribute_set_id
-        LEFT JOIN (
-            SELECT pav.value, pav.product_id
-            FROM magento.product_attribute_var pav
-            JOIN magento.attribute_product ap ON pav.attribute_id = ap.id
-            AND ap.name = 'name'
-            AND pav.store_id = 0
-        ) an ON an.product_id = p.row_id
-        LEFT JOIN (
-            SELECT m.manufacturer_id, m.name, cpei.row_id
-            FROM mbdw.catalog_product_entity_int cpei
-            JOIN magento.manufacturer_listing m ON m.manufacturer_id = cpei.value
-            AND cpei.store_id = 0
-            AND cpei._sdc_deleted_at__string is null
-            AND cpei._sdc_deleted_at__inst is null
-        ) pm ON pm.row_id = p.row_id
-        LEFT JOIN (
-            SELECT pav.value, pav.product_id
-            FROM magento.product_attribute_var pav
-            JOIN magento.attribute_product ap ON pav.attribute_id = ap.id
-            AND ap.name = 'url_key'
-            AND pav.store_id = 0
-        ) url ON url.product_id = p.row_id
-        LEFT JOIN (
-            SELECT pai.value, pai.product_id
-            FROM magento.product_attribute_int pai
-            JOIN magento.attribute_product ap ON pai.attribute_id = ap.id
-            AND ap.name = 'status'
-            AND pai.store_id = 0
-        ) status ON status.product_id = p.row_id
-        LEFT JOIN (
-            SELECT pai.value, pai.product_id
-            FROM magento.product_attribute_int pai
-            JOIN magento.attribute_product ap ON pai.attribute_id = ap.id
-            AND ap.name = 'visibility'
-            AND pai.store_id = 0
-        ) visibility ON visibility.product_id = p.row_id
-        """
-
-        # Adicione JOINS adicionais conforme necessário
-        additional_joins = [
-            add_attribute_join("product_attribute_int", "hide_from_product_view"),
-            add_attribute_join("product_attribute_var", "manufacturer_sku"),
-            add_attribute_join("product_attribute_txt", "category_ids"),
-            add_attribute_join("product_attribute_txt", "applications"),
-            add_attribute_join("product_attribute_txt", "abrasion_wear_resistance"),
-            add_attribute_join("product_attribute_var", "acoustics"),
-            add_attribute_join("product_attribute_var", "ada"),
-            add_attribute_join("product_attribute_var", "antimicrobial_testing"),
-            add_attribute_join("product_attribute_var", "backing_input"),
-            add_attribute_join("product_attribute_var", "thickness_pile_height_carpet"),
-            add_attribute_join("product_attribute_txt", "classification"),
-            add_attribute_join("product_attribute_txt", "collection_name"),
-            add_attribute_join("product_attribute_txt", "construction"),
-            add_attribute_join("product_attribute_var", "content_test_attribute"),
-            add_attribute_join("product_attribute_txt", "custom_capabilities"),
-            add_attribute_join("product_attribute_txt", "description"),
-            # Note: Appears twice in Excel, adjust if needed
-            add_attribute_join("product_attribute_txt", "designer_name"),
-            add_attribute_join("product_attribute_var", "edge_end_detail"),
-            add_attribute_join("product_attribute_var", "emissions"),
-            add_attribute_join("product_attribute_var", "finish_treatment"),
-            add_attribute_join("product_attribute_txt", "flammability"),
-            add_attribute_join("product_attribute_var", "grout_width"),
-            add_attribute_join("product_attribute_var", "hanging_information"),
-            add_attribute_join("product_attribute_var", "hardness_result"),
-            add_attribute_join("product_attribute_var", "hide_configuration"),
-            add_attribute_join("product_attribute_var", "installation"),
-            add_attribute_join("product_attribute_var", "installation_direction"),
-            add_attribute_join("product_attribute_var", "lead_time"),
-            add_attribute_join("product_attribute_txt", "leed"),
-            add_attribute_join("product_attribute_var", "length"),
-            add_attribute_join("product_attribute_var", "lightfastness_mdp"),
-            add_attribute_join("product_attribute_txt", "maintenance_maya"),
-            add_attribute_join("product_attribute_txt", "manufacturer_notes"),
-            add_attribute_join("product_attribute_var", "min_max_units"),
-            add_attribute_join("product_attribute_var", "percentage_of_opacity"),
-            add_attribute_join("product_attribute_var", "order_increments"),
-            add_attribute_join("product_attribute_var", "thickness"),
-            add_attribute_join("product_attribute_var", "pattern_repeat_width"),
-            add_attribute_join("product_attribute_var", "performance"),
-            add_attribute_join("product_attribute_var", "pile_face_weight_carpet"),
-            add_attribute_join("product_attribute_txt", "product_details"),
-            add_attribute_join("product_attribute_var", "recommended_grout"),
-            add_attribute_join("product_attribute_var", "series_name"),
-            add_attribute_join("product_attribute_txt", "size_notes"),
-            add_attribute_join("product_attribute_var", "slip_resistance"),
-            add_attribute_join("product_attribute_var", "stain_resistance"),
-            add_attribute_join("product_attribute_int", "state_of_origin"),
-            add_attribute_join("product_attribute_var", "surface_pile_density"),
-            add_attribute_join("product_attribute_var", "surface_texture_mdp"),
-            add_attribute_join("product_attribute_var", "tile_sheet_dimensions"),
-            add_attribute_join("product_attribute_var", "total_weight"),
-            add_attribute_join("product_attribute_var", "warranty"),
-            add_attribute_join("product_attribute_var", "water_absorption_result"),
-            add_attribute_join("product_attribute_var", "wear_layer_thickness"),
-            add_attribute_join("product_attribute_var", "weather_resistance_result"),
-            add_attribute_join("product_attribute_var", "width"),
-            add_attribute_join("product_attribute_var", "wood_grade"),
-            add_attribute_join("product_attribute_var", "yarn_tuft_details"),
-            add_attribute_join("product_attribute_var", "year_of_introduction")
-        ]
-
-        # Combine base_query with additional_joins
-        full_query = base_query + ' ' + ' '.join(additional_joins) + """
-            WHERE hide_from_product_view.value = 0
-            AND visibility.value = 2
-            AND pm.manufacturer_id NOT IN (50461, 50462, 50459, 50460, 38379)
-            LIMIT 50;
-        """
+    if conn is None:
+        return None  # Retorna None se a conexão falhar
+
+    try:
+        name_mapping = get_column_mapping(conn)
+        rows = 0
+        if progress is not None:
+            progress('query')
+        for chunk in iter_catalog_chunks(conn, extraction_mode, limit, chunk_size):
+            with stage('rename'):
+                chunk = restore_empty_strings(chunk).rename(columns=name_mapping)
+            with stage('serialize'):
+                nbytes = write_chunk(chunk) or 0
+            count_stage('serialize', rows=len(chunk), nbytes=nbytes)
+            rows += len(chunk)
+            if progress is not None:
+                progress('export', rows=len(chunk), nbytes=nbytes)
+    finally:
+        # Devolve a conexão ao pool
+        pool.putconn(conn)
+
+    duration = time.time() - start_time
+    print(f"Exportação de {rows} linhas levou {duration} segundos.")
+    return rows
 
+
+# Exporta o catálogo em CSV para um arquivo binário
+def export_catalog_csv(output, extraction_mode=EXTRACTION_MODE, limit=None, chunk_size=CHUNK_SIZE, progress=None):
+    header = [True]
+
+    def write_chunk(chunk):
+        data = chunk.to_csv(index=False, header=header[0]).encode('utf-8')
+        header[0] = False
+        output.write(data)
+        return len(data)
+
+    return export_catalog(write_chunk, extraction_mode, limit, chunk_size, progress)
+
+
+# compact=True devolve o frame compacto (nulos e categorias); o padrão mantém o formato da consulta original,
+# com '' nos textos vazios, mesmo quando a cópia local do catálogo está compacta
+def main(extraction_mode=EXTRACTION_MODE, limit=50, compact=False, partitions=EXTRACTION_PARTITIONS, rename=True):
+    pool = get_pool()
+    conn = pool.getconn()
+    start_time = time.time()
+
+    if conn is None:
+        return None  # Retorna None se a conexão falhar
+
+    try:
         # Execute a query
-        df = query_to_dataframe(conn, full_query)
+        if extraction_mode == 'snapshot':
+            df = catalog_snapshot.refresh(conn)
+            if df is None:
+                df = pd.DataFrame()
+            elif limit is not None:
+                df = df.head(limit)
+        elif partitions > 1:
+            df = extract_catalog_partitioned(conn, extraction_mode, limit, partitions)
+        elif extraction_mode == 'pivot':
+            df = extract_catalog_pivot(conn, limit)
+        else:
+            attribute_ids = attribute_catalog.get(conn).ids_by_name()
+            df = query_to_dataframe(conn, build_catalog_query(limit, attribute_ids))
 
-        # Renomeia as colunas do DataFrame
-        df = rename_dataframe_columns(df, conn)
+        df = compact_catalog_frame(df) if compact else restore_empty_strings(df)
 
-        # Fecha a conexão
-        close_connection(conn)
+        # Renomeia as colunas do DataFrame (rename=False mantém os nomes dos atributos)
+        if rename:
+            with stage('rename'):
+                df = rename_dataframe_columns(df, conn)
+    except Exception:
+        # A conexão pode ter ficado num estado inválido; o pool abre outra no lugar
+        pool.putconn(conn, discard=True)
+        raise
 
-        end_time = time.time()
-        duration = end_time - start_time
-        print(f"O processo todo levou {duration} segundos.")
+    # Devolve a conexão ao pool
+    pool.putconn(conn)
 
-        return df  # Retorna o DataFrame diretamente
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"O processo todo levou {duration} segundos.")
 
-    return None  # Retorna None se a conexão falhar
+    return df  # Retorna o DataFrame diretamente
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+# Agenda no formato do cron ("minuto hora dia mês dia-da-semana", horário local), ex.:
+# "*/30 * * * *" a cada 30 minutos, "0 2-5 * * *" de hora em hora na madrugada; vazio desativa
+EXPORT_SCHEDULE = os.getenv('EXPORT_SCHEDULE', '')
+
+# Dia da semana aceita 0-7 (0 e 7 são domingo), como no cron
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+# Espera até tentar de novo quando não dá para calcular a próxima execução
+_RETRY_INTERVAL = 3600
+# Horizonte da busca pela próxima execução (cobre "29 de fevereiro" numa segunda-feira)
+_MAX_SEARCH_YEARS = 30
+
+
+# Converte um campo do cron ("*", "*/n", "a-b", "a-b/n" e listas com vírgula) no conjunto de valores
+def _parse_field(field, low, high):
+    values = set()
+    for item in field.split(','):
+        step = 1
+        if '/' in item:
+            item, step = item.split('/', 1)
+            step = int(step)
+        if item == '*':
+            start, end = low, high
+        elif '-' in item:
+            start, end = (int(value) for value in item.split('-', 1))
+        else:
+            start = end = int(item)
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field {field!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, _FIELD_RANGES))
+        self.weekdays = {weekday % 7 for weekday in self.weekdays}
+        # Como no cron: com dia do mês e dia da semana restritos, basta casar um dos dois
+        # ("0 0 1 * 1" roda no dia 1 e em toda segunda); com um deles em "*", valem os dois
+        self.day_or_weekday = not fields[2].startswith('*') and not fields[4].startswith('*')
+
+    def _day_matches(self, local):
+        day = local.tm_mday in self.days
+        weekday = (local.tm_wday + 1) % 7 in self.weekdays
+        return day or weekday if self.day_or_weekday else day and weekday
+
+    def matches(self, t):
+        local = time.localtime(t)
+        return (local.tm_min in self.minutes and local.tm_hour in self.hours and local.tm_mon in self.months
+                and self._day_matches(local))
+
+    # Próximo minuto (epoch) depois de t que casa com a agenda; pula dias e horas inteiros que não casam
+    def next_after(self, t):
+        candidate = (int(t) // 60 + 1) * 60
+        limit = t + _MAX_SEARCH_YEARS * 366 * 24 * 3600
+        while candidate <= limit:
+            local = time.localtime(candidate)
+            if local.tm_mon not in self.months or not self._day_matches(local):
+                following = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+            elif local.tm_hour not in self.hours:
+                following = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, local.tm_hour + 1, 0, 0, 0, 0, -1))
+            elif local.tm_min not in self.minutes:
+                following = candidate + 60
+            else:
+                return candidate
+            # Mudanças de horário de verão podem devolver um horário repetido; sempre avança
+            candidate = max(int(following), candidate + 60)
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+# Executa fn em uma thread de fundo nos horários da agenda
+class Scheduler:
+    def __init__(self, schedule, fn, name='scheduler'):
+        self.schedule = CronSchedule(schedule) if isinstance(schedule, str) else schedule
+        self.fn = fn
+        self.name = name
+        self.next_run = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                self.next_run = self.schedule.next_after(time.time())
+            except Exception as e:
+                # Sem próxima execução a thread não pode morrer em silêncio: registra e tenta de novo mais tarde
+                print(f"Error in {self.name}: {e}")
+                self.next_run = None
+                if self._stopping.wait(_RETRY_INTERVAL):
+                    break
+                continue
+            if self._stopping.wait(max(self.next_run - time.time(), 0)):
+                break
+            try:
+                self.fn()
+            except Exception as e:
+                print(f"Error in {self.name}: {e}")
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from metrics import stage
+
+# Campos de descrição verificados pelo botão "Incorrect sentences"
+SENTENCE_COLUMNS = [column.strip() for column in os.getenv(
+    'SENTENCE_COLUMNS', 'description,product_details').split(',') if column.strip()]
+# Backend do modelo: 'openai' (API compatível com /chat/completions, inclusive um servidor falso local)
+SENTENCE_BACKEND = os.getenv('SENTENCE_BACKEND', 'openai')
+SENTENCE_API_BASE = os.getenv('SENTENCE_API_BASE', 'https://api.openai.com/v1')
+SENTENCE_MODEL = os.getenv('SENTENCE_MODEL', 'gpt-3.5-turbo')
+# Frases por requisição, limite de caracteres por requisição e requisições simultâneas
+SENTENCE_BATCH_SIZE = int(os.getenv('SENTENCE_BATCH_SIZE', '40'))
+SENTENCE_BATCH_CHARS = int(os.getenv('SENTENCE_BATCH_CHARS', '8000'))
+SENTENCE_CONCURRENCY = int(os.getenv('SENTENCE_CONCURRENCY', '4'))
+SENTENCE_MAX_RETRIES = int(os.getenv('SENTENCE_MAX_RETRIES', '5'))
+SENTENCE_TIMEOUT = float(os.getenv('SENTENCE_TIMEOUT', '60'))
+# Veredictos por hash da frase normalizada
+SENTENCE_CACHE_PATH = os.getenv('SENTENCE_CACHE_PATH', 'snapshots/sentences.sqlite')
+
+MIN_SENTENCE_LENGTH = 20
+MAX_SENTENCE_LENGTH = 600
+
+SYSTEM_PROMPT = (
+    "You review sentences from a product catalog for grammar, wording and punctuation errors. "
+    "You receive a JSON array of objects with an id and a sentence. Reply only with a JSON array "
+    "containing one object per input, in any order: {\"id\": <id>, \"ok\": true} when the sentence is "
+    "correct, or {\"id\": <id>, \"ok\": false, \"correction\": \"<corrected sentence>\"} when it is not. "
+    "Do not flag product names, codes, measurements or brand-specific spelling."
+)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__(f"rate limited (retry after {retry_after})")
+        self.retry_after = retry_after
+
+
+# Backend compatível com a API de chat da OpenAI; base_url pode apontar para um servidor falso local
+class ChatCompletionBackend:
+    def __init__(self, api_key=None, model=SENTENCE_MODEL, base_url=SENTENCE_API_BASE, timeout=SENTENCE_TIMEOUT):
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    # Envia as mensagens e retorna (texto da resposta, tokens usados)
+    def complete(self, messages):
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps({'model': self.model, 'messages': messages, 'temperature': 0}).encode('utf-8'),
+            method='POST',
+            headers={'Content-Type': 'application/json', 'Authorization': f"Bearer {self.api_key}"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                retry_after = e.headers.get('Retry-After')
+                raise RateLimited(float(retry_after) if retry_after else None)
+            raise
+        return body['choices'][0]['message']['content'], body.get('usage', {}).get('total_tokens', 0)
+
+
+BACKENDS = {
+    'openai': ChatCompletionBackend,
+}
+
+
+def get_backend(name=SENTENCE_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sentence backend {name}")
+    return BACKENDS[name]()
+
+
+def normalize_sentence(sentence):
+    return re.sub(r'\s+', ' ', sentence).strip().lower()
+
+
+def sentence_key(sentence):
+    return hashlib.sha1(normalize_sentence(sentence).encode('utf-8')).hexdigest()
+
+
+# Frases de cada texto em formato longo (linha, coluna, frase), separadas de uma vez para o catálogo todo
+def catalog_sentences(df, columns=SENTENCE_COLUMNS):
+    frames = []
+    for column in columns:
+        if column not in df.columns:
+            continue
+        texts = df[column].astype(object).where(df[column].notna(), '').astype(str).reset_index(drop=True)
+        sentences = (texts.str.replace(r'<[^>]+>', ' ', regex=True)
+                     .str.replace(r'&nbsp;', ' ', regex=False)
+                     .str.replace(r'\s+', ' ', regex=True)
+                     .str.split(r'(?<=[.!?])\s+(?=[A-Z0-9])', regex=True)
+                     .explode()
+                     .dropna()
+                     .str.strip())
+        sentences = sentences[sentences.str.len().between(MIN_SENTENCE_LENGTH, MAX_SENTENCE_LENGTH)]
+        frames.append(pd.DataFrame({'row': sentences.index, 'column': column, 'sentence': sentences.to_numpy()}))
+    if not frames:
+        return pd.DataFrame({'row': [], 'column': [], 'sentence': [], 'key': []})
+    sentences = pd.concat(frames, ignore_index=True)
+    sentences['key'] = [sentence_key(sentence) for sentence in sentences['sentence']]
+    return sentences
+
+
+# Veredictos em SQLite: gravados à medida que cada lote termina, lidos em blocos
+class VerdictCache:
+    def __init__(self, path=SENTENCE_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, ok INTEGER, correction TEXT)")
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, ok, correction FROM verdicts WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((key, (bool(ok), correction)) for key, ok, correction in rows)
+        return found
+
+    def put_many(self, verdicts):
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?)",
+                                   [(key, int(ok), correction) for key, (ok, correction) in verdicts.items()])
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+# Agrupa as frases em lotes por quantidade e por tamanho total
+def make_batches(sentences, batch_size=SENTENCE_BATCH_SIZE, batch_chars=SENTENCE_BATCH_CHARS):
+    batch, chars = [], 0
+    for key, sentence in sentences:
+        if batch and (len(batch) >= batch_size or chars + len(sentence) > batch_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append((key, sentence))
+        chars += len(sentence)
+    if batch:
+        yield batch
+
+
+# Veredictos por chave da frase; itens malformados ou com id desconhecido são ignorados e as frases
+# sem veredicto ficam de fora (não vão para o cache e são enviadas de novo na próxima verificação)
+def parse_verdicts(content, batch):
+    match = re.search(r'\[.*\]', content, re.S)
+    items = json.loads(match.group(0) if match else content)
+    if not isinstance(items, list):
+        raise ValueError(f"expected a JSON array of verdicts, got {type(items).__name__}")
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item['id'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(batch):
+            key, sentence = batch[index]
+            correction = item.get('correction') if not item.get('ok', True) else None
+            # Uma "correção" igual à frase original não é um erro
+            ok = bool(item.get('ok', True)) or normalize_sentence(correction or '') == normalize_sentence(sentence)
+            verdicts[key] = (ok, None if ok else correction)
+    return verdicts
+
+
+class SentenceChecker:
+    def __init__(self, backend=None, cache_path=SENTENCE_CACHE_PATH, batch_size=SENTENCE_BATCH_SIZE,
+                 concurrency=SENTENCE_CONCURRENCY, max_retries=SENTENCE_MAX_RETRIES):
+        self.backend = backend
+        self.cache_path = cache_path
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    # Uma requisição por lote; 429 e falhas temporárias voltam com espera exponencial e jitter
+    def _check_batch(self, backend, batch):
+        messages = [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {'role': 'user', 'content': json.dumps([{'id': i, 'sentence': sentence}
+                                                    for i, (_, sentence) in enumerate(batch)])},
+        ]
+        for attempt in range(self.max_retries + 1):
+            try:
+                with stage('llm_request'):
+                    content, tokens = backend.complete(messages)
+                self._count('requests')
+                self._count('tokens', tokens)
+                return parse_verdicts(content, batch)
+            except RateLimited as e:
+                self._count('rate_limited')
+                delay = e.retry_after if e.retry_after is not None else min(2 ** attempt, 60)
+            except (urllib.error.URLError, TimeoutError, ValueError, KeyError) as e:
+                self._count('errors')
+                print(f"Error checking sentences: {e}")
+                delay = min(2 ** attempt, 60)
+            if attempt < self.max_retries:
+                self._count('retries')
+                time.sleep(delay + random.uniform(0, delay / 2))
+        self._count('failed_batches')
+        return {}
+
+    # Relatório (row_id, sku, coluna, frase, correção) das frases que o modelo marcou como incorretas
+    def check(self, df, columns=SENTENCE_COLUMNS):
+        started_at = time.time()
+        self.stats = {}
+        sentences = catalog_sentences(df, columns)
+        unique = sentences.drop_duplicates('key')
+
+        cache = VerdictCache(self.cache_path)
+        try:
+            verdicts = cache.get_many(unique['key'])
+            pending = unique[~unique['key'].isin(verdicts.keys())]
+            backend = self.backend or get_backend()
+
+            def run(batch):
+                found = self._check_batch(backend, batch)
+                if found:
+                    cache.put_many(found)
+                return found
+
+            batches = list(make_batches(zip(pending['key'], pending['sentence']), self.batch_size))
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                for found in pool.map(run, batches):
+                    verdicts.update(found)
+        finally:
+            cache.close()
+
+        elapsed = time.time() - started_at
+        checked = sum(key in verdicts for key in pending['key'])
+        self.stats.update({
+            'sentences': len(sentences),
+            'unique_sentences': len(unique),
+            'cache_hits': len(unique) - len(pending),
+            'cache_hit_rate': round((len(unique) - len(pending)) / len(unique), 3) if len(unique) else 1.0,
+            'checked': checked,
+            'unchecked': len(pending) - checked,
+            'batches': len(batches),
+            'elapsed': round(elapsed, 2),
+            'sentences_per_second': round(checked / elapsed, 1) if elapsed else 0,
+        })
+
+        flagged = sentences[np.array([not verdicts.get(key, (True, None))[0] for key in sentences['key']], dtype=bool)]
+        rows = flagged['row'].to_numpy(dtype=int)
+        return pd.DataFrame({
+            'row_id': df['row_id'].to_numpy()[rows] if 'row_id' in df.columns else rows,
+            'sku': df['sku'].to_numpy()[rows] if 'sku' in df.columns else '',
+            'attribute': flagged['column'].to_numpy(),
+            'sentence': flagged['sentence'].to_numpy(),
+            'correction': [verdicts[key][1] for key in flagged['key']],
+        })
+
+
+sentence_checker = SentenceChecker()
@@ -0,0 +1,272 @@
+import asyncio
+import os
+import ssl
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry import ConnectionErrorRetryHandler, RateLimitErrorRetryHandler
+from slack_sdk.http_retry.builtin_async_handlers import AsyncConnectionErrorRetryHandler, AsyncRateLimitErrorRetryHandler
+from slack_sdk.web.async_client import AsyncWebClient
+from progress import ProgressReader
+from metrics import stage, count_stage, SLACK_CALLS, SLACK_SECONDS, SLACK_RATE_LIMITED
+
+# URL base da Web API (pode apontar para um servidor falso local nos testes)
+SLACK_API_URL = os.getenv('SLACK_API_URL', WebClient.BASE_URL)
+# Número de novas tentativas após um 429
+SLACK_MAX_RETRIES = int(os.getenv('SLACK_MAX_RETRIES', '3'))
+# Número de partes de uma exportação enviadas ao mesmo tempo
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '3'))
+
+# Taxa (chamadas por segundo) e rajada permitida para cada tier da API do Slack
+TIER_LIMITS = {
+    1: (1 / 60, 1),
+    2: (20 / 60, 3),
+    3: (50 / 60, 5),
+    4: (100 / 60, 10),
+    'post': (1.0, 3),  # chat.postMessage: ~1 mensagem por segundo por canal
+}
+
+METHOD_TIERS = {
+    'chat.postMessage': 'post',
+    'chat.update': 3,
+    'chat.delete': 3,
+    'conversations.history': 3,
+    'conversations.info': 3,
+    'files.upload': 2,
+    'files.getUploadURLExternal': 4,
+    'files.completeUploadExternal': 4,
+    'users.info': 4,
+    'auth.test': 4,
+}
+DEFAULT_TIER = 3
+
+
+# Balde de tokens: libera `rate` chamadas por segundo com rajadas de até `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # Consome um token se houver; senão retorna quantos segundos esperar
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+    # Espera até haver um token livre; rajadas ficam na fila em vez de falhar
+    def acquire(self):
+        wait = self.try_acquire()
+        while wait:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+    async def acquire_async(self):
+        wait = self.try_acquire()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.try_acquire()
+
+    # Bloqueia o balde após um 429 pelo tempo do Retry-After
+    def pause(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+# Um balde por método (e por canal no caso do chat.postMessage)
+class RateLimiter:
+    def __init__(self, tier_limits=None):
+        self.tier_limits = tier_limits or TIER_LIMITS
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, api_method, channel=None):
+        tier = METHOD_TIERS.get(api_method, DEFAULT_TIER)
+        key = (api_method, channel if tier == 'post' else None)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(*self.tier_limits[tier])
+            return self._buckets[key]
+
+    def acquire(self, api_method, channel=None):
+        self.bucket(api_method, channel).acquire()
+
+    async def acquire_async(self, api_method, channel=None):
+        await self.bucket(api_method, channel).acquire_async()
+
+    def pause(self, api_method, seconds):
+        with self._lock:
+            buckets = [bucket for (method, _), bucket in self._buckets.items() if method == api_method]
+        for bucket in buckets:
+            bucket.pause(seconds)
+
+
+# Status de uma chamada que falhou: código de erro do Slack (ex.: ratelimited) ou o HTTP
+def slack_error_status(error):
+    response = error.response
+    if response is not None and isinstance(response.data, dict) and response.data.get('error'):
+        return response.data['error']
+    return str(response.status_code) if response is not None else 'error'
+
+
+# Respeita o Retry-After do 429 e segura as demais chamadas do mesmo método
+class PausingRateLimitRetryHandler(RateLimitErrorRetryHandler):
+    def __init__(self, limiter, max_retry_count=SLACK_MAX_RETRIES):
+        super().__init__(max_retry_count=max_retry_count)
+        self.limiter = limiter
+
+    def prepare_for_next_attempt(self, *, state, request, response=None, error=None):
+        if response is not None:
+            retry_after = next((values[0] for name, values in response.headers.items()
+                                if name.lower() == 'retry-after'), 1)
+            api_method = request.url.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+            print(f"Slack rate limited {api_method}, retrying in {retry_after}s")
+            SLACK_RATE_LIMITED.inc(method=api_method)
+            self.limiter.pause(api_method, int(retry_after))
+        super().prepare_for_next_attempt(state=state, request=request, response=response, error=error)
+
+
+# WebClient compartilhado pelo processo, com limite de taxa por tier e novas tentativas em 429
+class SlackClient(WebClient):
+    def __init__(self, token=None, base_url=SLACK_API_URL, limiter=None, **kwargs):
+        self.limiter = limiter or RateLimiter()
+        kwargs.setdefault('retry_handlers', [
+            ConnectionErrorRetryHandler(),
+            PausingRateLimitRetryHandler(self.limiter),
+        ])
+        # Um único contexto SSL para todas as chamadas
+        kwargs.setdefault('ssl', ssl.create_default_context())
+        super().__init__(token=token, base_url=base_url, **kwargs)
+
+    def api_call(self, api_method, **kwargs):
+        payload = kwargs.get('json') or kwargs.get('data') or kwargs.get('params') or {}
+        channel = payload.get('channel') if isinstance(payload, dict) else None
+        self.limiter.acquire(api_method, channel)
+        with SLACK_SECONDS.time(method=api_method):
+            try:
+                response = super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                SLACK_CALLS.inc(method=api_method, status=slack_error_status(e))
+                raise
+        SLACK_CALLS.inc(method=api_method, status='ok')
+        return response
+
+
+class AsyncPausingRateLimitRetryHandler(AsyncRateLimitErrorRetryHandler):
+    def __init__(self, limiter, max_retry_count=SLACK_MAX_RETRIES):
+        super().__init__(max_retry_count=max_retry_count)
+        self.limiter = limiter
+
+    async def prepare_for_next_attempt_async(self, *, state, request, response=None, error=None):
+        if response is not None:
+            retry_after = next((values[0] for name, values in response.headers.items()
+                                if name.lower() == 'retry-after'), 1)
+            api_method = request.url.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+            print(f"Slack rate limited {api_method}, retrying in {retry_after}s")
+            SLACK_RATE_LIMITED.inc(method=api_method)
+            self.limiter.pause(api_method, int(retry_after))
+        await super().prepare_for_next_attempt_async(state=state, request=request, response=response, error=error)
+
+
+# Versão assíncrona (aiohttp) do cliente, dividindo os mesmos limites de taxa com o cliente síncrono
+class AsyncSlackClient(AsyncWebClient):
+    def __init__(self, token=None, base_url=SLACK_API_URL, limiter=None, **kwargs):
+        self.limiter = limiter or RateLimiter()
+        kwargs.setdefault('retry_handlers', [
+            AsyncConnectionErrorRetryHandler(),
+            AsyncPausingRateLimitRetryHandler(self.limiter),
+        ])
+        kwargs.setdefault('ssl', ssl.create_default_context())
+        super().__init__(token=token, base_url=base_url, **kwargs)
+
+    async def api_call(self, api_method, **kwargs):
+        payload = kwargs.get('json') or kwargs.get('data') or kwargs.get('params') or {}
+        channel = payload.get('channel') if isinstance(payload, dict) else None
+        await self.limiter.acquire_async(api_method, channel)
+        with SLACK_SECONDS.time(method=api_method):
+            try:
+                response = await super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                SLACK_CALLS.inc(method=api_method, status=slack_error_status(e))
+                raise
+        SLACK_CALLS.inc(method=api_method, status='ok')
+        return response
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+# Retorna o cliente do Slack do processo, criando-o na primeira chamada
+def get_slack_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SlackClient(token=os.environ.get('SLACK_BOT_TOKEN'))
+        return _client
+
+
+def get_async_slack_client():
+    global _async_client
+    limiter = get_slack_client().limiter
+    with _client_lock:
+        if _async_client is None:
+            _async_client = AsyncSlackClient(token=os.environ.get('SLACK_BOT_TOKEN'), limiter=limiter)
+        return _async_client
+
+
+# Envia um arquivo para o Slack em streaming, sem carregar o conteúdo inteiro em memória
+def upload_file_stream(client, channel_id, fileobj, filename, title, progress=None):
+    fileobj.seek(0, os.SEEK_END)
+    length = fileobj.tell()
+    fileobj.seek(0)
+
+    response = client.files_getUploadURLExternal(filename=filename, length=length)
+    request = urllib.request.Request(
+        response['upload_url'],
+        data=ProgressReader(fileobj, progress, 'upload') if progress is not None else fileobj,
+        method='POST',
+        headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(length)}
+    )
+    with stage('upload'):
+        with urllib.request.urlopen(request):
+            pass
+    count_stage('upload', nbytes=length)
+
+    client.files_completeUploadExternal(
+        files=[{"id": response['file_id'], "title": title}],
+        channel_id=channel_id
+    )
+
+
+# Envia vários arquivos (ex.: partes de uma exportação) em paralelo
+def upload_files(client, channel_id, files, title, progress=None, concurrency=UPLOAD_CONCURRENCY):
+    if len(files) == 1:
+        filename, fileobj = files[0]
+        upload_file_stream(client, channel_id, fileobj, filename, title, progress)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(upload_file_stream, client, channel_id, fileobj, filename,
+                        f"{title} ({i}/{len(files)})", progress)
+            for i, (filename, fileobj) in enumerate(files, start=1)
+        ]
+        for future in futures:
+            future.result()
@@ -0,0 +1,255 @@
+import hashlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Atributos de texto verificados pelo botão "Misspelled words"
+SPELLCHECK_COLUMNS = [column.strip() for column in os.getenv(
+    'SPELLCHECK_COLUMNS', 'name,description,product_details,manufacturer_notes,size_notes').split(',') if column.strip()]
+# Dicionário de frequências opcional ("palavra contagem" por linha, como os do SymSpell)
+SPELLCHECK_DICTIONARY = os.getenv('SPELLCHECK_DICTIONARY', '')
+# Palavras do próprio catálogo que aparecem pelo menos isso tudo de vezes contam como corretas
+SPELLCHECK_MIN_COUNT = int(os.getenv('SPELLCHECK_MIN_COUNT', '5'))
+SPELLCHECK_MAX_EDIT_DISTANCE = int(os.getenv('SPELLCHECK_MAX_EDIT_DISTANCE', '2'))
+SPELLCHECK_PREFIX_LENGTH = int(os.getenv('SPELLCHECK_PREFIX_LENGTH', '7'))
+# Resultados por hash do texto, para não verificar de novo produtos que não mudaram
+SPELLCHECK_CACHE_PATH = os.getenv('SPELLCHECK_CACHE_PATH', 'snapshots/spellcheck.parquet')
+# Fração de textos novos acima da qual o vocabulário do catálogo é recontado
+SPELLCHECK_REBUILD_RATIO = 0.2
+
+# Palavras só com letras (aceita apóstrofo interno); números e códigos ficam de fora
+TOKEN_PATTERN = r"[a-z]+(?:'[a-z]+)?"
+MIN_WORD_LENGTH = 4
+# Muda quando as regras de sugestão mudam; o cache de outra versão é descartado
+SPELLCHECK_VERSION = 2
+# Terminações de plural e flexão verbal: "tiles" não é erro de "tile"
+INFLECTION_SUFFIXES = ('s', 'es', 'd', 'ed', 'ing')
+
+
+# Distância de Damerau-Levenshtein (transposições adjacentes), interrompida acima de max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+# Corretor no estilo SymSpell: índice de deleções pré-calculado para cada palavra do vocabulário
+class SymSpell:
+    def __init__(self, max_edit_distance=SPELLCHECK_MAX_EDIT_DISTANCE, prefix_length=SPELLCHECK_PREFIX_LENGTH):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words = {}
+        self.deletes = {}
+
+    def _edits(self, word):
+        edits = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier if len(candidate) > 1
+                        for i in range(len(candidate))}
+            edits |= frontier
+        return edits
+
+    def add_words(self, counts):
+        for word, count in counts.items():
+            if word in self.words:
+                self.words[word] += count
+                continue
+            self.words[word] = count
+            for delete in self._edits(word[:self.prefix_length]):
+                self.deletes.setdefault(delete, []).append(word)
+
+    # Melhor sugestão (menor distância, depois maior frequência) ou None
+    def lookup(self, word):
+        if word in self.words:
+            return None
+        best, best_distance, best_count = None, self.max_edit_distance + 1, 0
+        seen = set()
+        for delete in self._edits(word[:self.prefix_length]):
+            for candidate in self.deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if abs(len(candidate) - len(word)) > self.max_edit_distance:
+                    continue
+                distance = edit_distance(word, candidate, min(best_distance, self.max_edit_distance))
+                count = self.words[candidate]
+                if distance < best_distance or (distance == best_distance and count > best_count):
+                    best, best_distance, best_count = candidate, distance, count
+        return best if best_distance <= self.max_edit_distance else None
+
+
+# True quando uma palavra é a outra com uma terminação de plural/flexão (tile/tiles, box/boxes,
+# paint/painted, tile/tiling, shelf/shelves, battery/batteries)
+def is_inflection(word, suggestion):
+    short, long = sorted((word, suggestion), key=len)
+    for suffix in INFLECTION_SUFFIXES:
+        if not long.endswith(suffix):
+            continue
+        stem = long[:-len(suffix)]
+        if stem in (short, short.rstrip('e')):
+            return True
+        if suffix in ('es', 'ed') and stem.endswith('i') and short.endswith('y') and stem[:-1] == short[:-1]:
+            return True
+        if suffix == 'es' and stem.endswith('v') and short[-1] == 'f' and stem[:-1] == short[:-1]:
+            return True
+        if suffix in ('ed', 'ing') and len(stem) > 1 and stem[-1] == stem[-2] and stem[:-1] == short:
+            return True
+    return False
+
+
+_dictionary_cache = {}
+_dictionary_lock = threading.Lock()
+
+
+# Lê o dicionário de frequências uma vez por versão do arquivo
+def load_dictionary(path=SPELLCHECK_DICTIONARY):
+    if not path or not os.path.exists(path):
+        return {}, ''
+    mtime = os.path.getmtime(path)
+    with _dictionary_lock:
+        cached = _dictionary_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        counts = {}
+        digest = hashlib.sha256()
+        with open(path, encoding='utf-8') as dictionary:
+            for line in dictionary:
+                digest.update(line.encode('utf-8'))
+                parts = line.split()
+                if parts:
+                    counts[parts[0].lower()] = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+        _dictionary_cache[path] = (mtime, counts, digest.hexdigest()[:16])
+        return counts, _dictionary_cache[path][2]
+
+
+# Textos do catálogo em formato longo: (linha, coluna, texto, hash do texto)
+def catalog_texts(df, columns=SPELLCHECK_COLUMNS):
+    frames = []
+    for column in columns:
+        if column not in df.columns:
+            continue
+        texts = df[column].astype(object).where(df[column].notna(), '').astype(str).to_numpy(dtype=object)
+        rows = np.flatnonzero(pd.Series(texts).str.strip().to_numpy() != '')
+        frames.append(pd.DataFrame({'row': rows, 'column': column, 'text': texts[rows]}))
+    if not frames:
+        return pd.DataFrame({'row': [], 'column': [], 'text': [], 'text_hash': np.array([], dtype=np.uint64)})
+    texts = pd.concat(frames, ignore_index=True)
+    texts['text_hash'] = pd.util.hash_array(texts['text'].to_numpy(dtype=object), categorize=False)
+    return texts
+
+
+# Palavras de cada texto (uma linha por ocorrência), tokenizadas de uma vez para o catálogo todo
+def tokenize(texts):
+    words = (texts.str.replace(r'<[^>]+>', ' ', regex=True)
+             .str.replace(r'&[a-z]+;', ' ', regex=True)
+             .str.lower()
+             .str.findall(TOKEN_PATTERN)
+             .explode()
+             .dropna())
+    return words[words.str.len() >= MIN_WORD_LENGTH]
+
+
+class SpellChecker:
+    def __init__(self, cache_path=SPELLCHECK_CACHE_PATH, dictionary_path=SPELLCHECK_DICTIONARY,
+                 min_count=SPELLCHECK_MIN_COUNT):
+        self.cache_path = cache_path
+        self.dictionary_path = dictionary_path
+        self.min_count = min_count
+        self.stats = {}
+        self._engine = None
+        self._engine_version = None
+
+    def _load_cache(self, dictionary_version):
+        # Índice uint64 também quando vazio: misturar com int64 viraria float e perderia os hashes
+        empty = pd.Series(dtype=object, index=pd.Index([], dtype=np.uint64))
+        if not os.path.exists(self.cache_path):
+            return empty
+        cache = pd.read_parquet(self.cache_path)
+        # Outro dicionário dá outros resultados: descarta o cache
+        if cache.empty or (cache['dictionary'] != dictionary_version).any():
+            return empty
+        return pd.Series(cache['issues'].to_numpy(), index=cache['text_hash'].to_numpy())
+
+    def _save_cache(self, cache, dictionary_version):
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        pd.DataFrame({'text_hash': cache.index.to_numpy(dtype=np.uint64), 'issues': cache.to_numpy(),
+                      'dictionary': dictionary_version}).to_parquet(self.cache_path + '.tmp', index=False)
+        os.replace(self.cache_path + '.tmp', self.cache_path)
+
+    def _build_engine(self, words, dictionary):
+        # Vocabulário: dicionário informado + palavras frequentes do próprio catálogo
+        corpus_counts = words.value_counts()
+        engine = SymSpell()
+        engine.add_words(dictionary)
+        engine.add_words(corpus_counts[corpus_counts >= self.min_count].to_dict())
+        return engine
+
+    # Relatório (row_id, sku, coluna, palavra, sugestão) das palavras com provável erro de grafia
+    def check(self, df, columns=SPELLCHECK_COLUMNS):
+        dictionary, dictionary_version = load_dictionary(self.dictionary_path)
+        dictionary_version = f"{SPELLCHECK_VERSION}:{dictionary_version}"
+        texts = catalog_texts(df, columns)
+        cache = self._load_cache(dictionary_version)
+        unique_texts = texts.drop_duplicates('text_hash')
+        pending = unique_texts[~unique_texts['text_hash'].isin(cache.index)]
+
+        if len(pending):
+            # Poucos textos novos: reaproveita o vocabulário da última verificação completa
+            if (self._engine is None or self._engine_version != dictionary_version
+                    or len(pending) > SPELLCHECK_REBUILD_RATIO * len(unique_texts)):
+                words = tokenize(unique_texts.set_index('text_hash')['text'])
+                self._engine = self._build_engine(words, dictionary)
+                self._engine_version = dictionary_version
+                pending_words = words[words.index.isin(pending['text_hash'])]
+            else:
+                pending_words = tokenize(pending.set_index('text_hash')['text'])
+            engine = self._engine
+            # Cada palavra desconhecida é consultada uma única vez, não uma vez por produto
+            suggestions = {word: engine.lookup(word) for word in pending_words.unique() if word not in engine.words}
+            suggestions = {word: suggestion for word, suggestion in suggestions.items()
+                           if suggestion and not is_inflection(word, suggestion)}
+            flagged = pending_words[pending_words.isin(suggestions.keys())]
+            # Cache: "palavra<TAB>sugestão" por linha para cada texto ('' = nenhum problema)
+            # object: com flagged vazio o map devolve float64, que não soma com as strings do pandas 3
+            issues = (flagged.astype(object) + '\t' + flagged.map(suggestions).astype(object)).groupby(level=0).agg(
+                lambda found: '\n'.join(sorted(set(found))))
+            results = pd.Series(issues.reindex(pending['text_hash'].to_numpy()).fillna('').to_numpy(),
+                                index=pending['text_hash'].to_numpy(), dtype=object)
+            cache = pd.concat([cache, results])
+            self._save_cache(cache, dictionary_version)
+            self.stats.update({'vocabulary': len(engine.words), 'lookups': len(suggestions)})
+
+        self.stats.update({'texts': len(texts), 'unique_texts': len(unique_texts), 'checked': len(pending)})
+
+        texts['issues'] = cache.reindex(texts['text_hash'].to_numpy()).fillna('').to_numpy()
+        texts = texts[texts['issues'] != '']
+        found = texts.assign(issue=texts['issues'].str.split('\n')).explode('issue')
+        pairs = found['issue'].str.split('\t', n=1, expand=True) if len(found) else pd.DataFrame({0: [], 1: []})
+        rows = found['row'].to_numpy(dtype=int)
+        return pd.DataFrame({
+            'row_id': df['row_id'].to_numpy()[rows] if 'row_id' in df.columns else rows,
+            'sku': df['sku'].to_numpy()[rows] if 'sku' in df.columns else '',
+            'attribute': found['column'].to_numpy(),
+            'word': pairs[0].to_numpy(),
+            'suggestion': pairs[1].to_numpy(),
+        })
+
+
+spell_checker = SpellChecker()
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+# Intervalo entre os sinais de vida enviados por cada worker (segundos)
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv('WORKER_HEARTBEAT_INTERVAL', '5'))
+# Espera antes de reiniciar um worker que caiu; dobra a cada queda seguida até o máximo
+WORKER_RESTART_DELAY = float(os.getenv('WORKER_RESTART_DELAY', '1'))
+WORKER_MAX_RESTART_DELAY = float(os.getenv('WORKER_MAX_RESTART_DELAY', '60'))
+
+# Um worker que fica de pé por mais que isso volta ao atraso inicial de reinício
+WORKER_STABLE_AFTER = 60
+# Como os workers são criados: 'spawn' ou 'forkserver'. Sem 'fork': o processo principal já roda o Flask e a
+# thread do monitor, e um fork com outras threads ativas pode herdar locks presos (logging, stdout, importação)
+WORKER_START_METHOD = os.getenv('WORKER_START_METHOD', 'spawn')
+
+
+class WorkerProcess:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.restarts = 0
+        self.restart_delay = WORKER_RESTART_DELAY
+        self.restart_at = None
+        self.started_at = None
+        self.last_heartbeat = None
+        self.exitcode = None
+        self.report = {}
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+# Roda dentro do processo filho: envia sinais de vida em segundo plano e executa o worker
+def _worker_main(target, index, status_queue, report, interval):
+    def heartbeat():
+        while True:
+            try:
+                status_queue.put((index, os.getpid(), time.time(), report() if report else {}))
+            except Exception as e:
+                print(f"Worker {index} heartbeat failed: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    target(index)
+
+
+# Soma as estatísticas de jobs de vários workers
+def merge_job_stats(stats_list):
+    merged = {'queue_depth': 0, 'running': {}, 'inflight_keys': 0, 'counters': {}}
+    for stats in stats_list:
+        merged['queue_depth'] += stats.get('queue_depth', 0)
+        merged['inflight_keys'] += stats.get('inflight_keys', 0)
+        for field in ('running', 'counters'):
+            for name, n in stats.get(field, {}).items():
+                merged[field][name] = merged[field].get(name, 0) + n
+    return merged
+
+
+# Mantém N processos worker de pé, reiniciando os que caírem, e agrega a saúde de todos
+class Supervisor:
+    # target e report precisam ser funções de nível de módulo: o worker as importa de novo ao iniciar
+    def __init__(self, target, workers, report=None, heartbeat_interval=WORKER_HEARTBEAT_INTERVAL,
+                 start_method=WORKER_START_METHOD):
+        if start_method not in ('spawn', 'forkserver'):
+            raise ValueError(f"Unsupported worker start method {start_method}")
+        self.target = target
+        self.report = report
+        self.heartbeat_interval = heartbeat_interval
+        self._context = multiprocessing.get_context(start_method)
+        self._status = self._context.Queue()
+        self._workers = [WorkerProcess(index) for index in range(workers)]
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        for worker in self._workers:
+            self._spawn(worker)
+        self._thread = threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+        return self
+
+    def _spawn(self, worker):
+        # Não é daemon: cada worker pode abrir seu próprio pool de processos
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.target, worker.index, self._status, self.report, self.heartbeat_interval),
+            name=f"bot-worker-{worker.index}"
+        )
+        process.start()
+        with self._lock:
+            worker.process = process
+            worker.started_at = time.time()
+            worker.last_heartbeat = None
+            worker.restart_at = None
+        print(f"Started worker {worker.index} (pid {process.pid})")
+
+    def _monitor(self):
+        while not self._stopping.is_set():
+            try:
+                index, pid, sent_at, report = self._status.get(timeout=1)
+                with self._lock:
+                    worker = self._workers[index]
+                    if worker.process is not None and worker.process.pid == pid:
+                        worker.last_heartbeat = sent_at
+                        worker.report = report
+            except queue.Empty:
+                pass
+            self._check_workers()
+
+    def _check_workers(self):
+        now = time.time()
+        for worker in self._workers:
+            if self._stopping.is_set() or worker.alive:
+                continue
+            if worker.restart_at is None:
+                if now - worker.started_at > WORKER_STABLE_AFTER:
+                    worker.restart_delay = WORKER_RESTART_DELAY
+                worker.exitcode = worker.process.exitcode
+                worker.restart_at = now + worker.restart_delay
+                print(f"Worker {worker.index} exited with code {worker.exitcode}, "
+                      f"restarting in {worker.restart_delay:.0f}s")
+                worker.restart_delay = min(worker.restart_delay * 2, WORKER_MAX_RESTART_DELAY)
+            elif now >= worker.restart_at:
+                worker.restarts += 1
+                self._spawn(worker)
+
+    # Saúde agregada: 'ok' só se todos os workers estão vivos e enviaram sinal de vida recente
+    def health(self):
+        now = time.time()
+        with self._lock:
+            workers = []
+            for worker in self._workers:
+                fresh = (worker.last_heartbeat is not None
+                         and now - worker.last_heartbeat < 3 * self.heartbeat_interval)
+                workers.append({
+                    'index': worker.index,
+                    'pid': worker.process.pid if worker.process is not None else None,
+                    'alive': worker.alive,
+                    'healthy': worker.alive and fresh,
+                    'restarts': worker.restarts,
+                    'last_exitcode': worker.exitcode,
+                    'uptime': now - worker.started_at if worker.alive else 0,
+                    'last_heartbeat': now - worker.last_heartbeat if worker.last_heartbeat else None,
+                    'jobs': worker.report.get('jobs', {}),
+                    'admission': worker.report.get('admission', {}),
+                })
+        healthy = sum(worker['healthy'] for worker in workers)
+        return {
+            'status': 'ok' if healthy == len(workers) else ('degraded' if healthy else 'down'),
+            'workers': workers,
+            'jobs': merge_job_stats(worker['jobs'] for worker in workers),
+        }
+
+    # Último relatório enviado por cada worker, por índice
+    def reports(self):
+        with self._lock:
+            return {worker.index: worker.report for worker in self._workers}
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        for worker in self._workers:
+            if worker.alive:
+                worker.process.terminate()
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout)
@@ -0,0 +1,25 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_slack import FakeSlackServer
+from fake_completions import FakeCompletionServer
+
+
+@pytest.fixture
+def fake_slack():
+    server = FakeSlackServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fake_completions():
+    server = FakeCompletionServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Revisor padrão: marca as frases com "teh" e devolve a frase corrigida
+def review_teh(sentence):
+    return sentence.replace('teh', 'the') if 'teh' in sentence else None
+
+
+# Servidor local que imita /chat/completions da OpenAI; cada requisição recebe a resposta do revisor,
+# a não ser que uma resposta especial tenha sido enfileirada (429, texto malformado, veredictos parciais)
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        batch = json.loads(request['messages'][-1]['content'])
+        mode = server.take_mode()
+        server.record([item['sentence'] for item in batch], mode)
+
+        if mode == 'rate_limited':
+            self._reply({'error': {'message': 'Rate limit reached'}}, 429, {'Retry-After': '0'})
+            return
+        verdicts = []
+        for item in batch:
+            correction = server.reviewer(item['sentence'])
+            verdicts.append({'id': item['id'], 'ok': True} if correction is None
+                            else {'id': item['id'], 'ok': False, 'correction': correction})
+        if mode == 'malformed':
+            content = "Sorry, I can't help with that."
+        elif mode == 'partial':
+            content = json.dumps(verdicts[:len(verdicts) // 2])
+        elif mode == 'garbage':
+            content = "Here you go:\n```json\n" + json.dumps(
+                ['ok', {'ok': True}, {'id': 'x', 'ok': False}, {'id': 999, 'ok': False}] + verdicts) + "\n```"
+        else:
+            content = json.dumps(verdicts)
+        self._reply({'choices': [{'message': {'role': 'assistant', 'content': content}}],
+                     'usage': {'total_tokens': 10 * len(batch)}})
+
+
+class FakeCompletionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, reviewer=review_teh):
+        super().__init__(('127.0.0.1', 0), FakeCompletionHandler)
+        self.reviewer = reviewer
+        self.batches = []  # (frases do lote, modo da resposta)
+        self._modes = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    # As próximas requisições recebem as respostas especiais, na ordem
+    def respond_with(self, *modes):
+        with self._lock:
+            self._modes.extend(modes)
+
+    def take_mode(self):
+        with self._lock:
+            return self._modes.pop(0) if self._modes else 'ok'
+
+    def record(self, sentences, mode):
+        with self._lock:
+            self.batches.append((sentences, mode))
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-completions', daemon=True).start()
+        return self
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Servidor local que imita a Web API do Slack, com latência e respostas 429 injetadas
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self, body):
+        if 'json' in self.headers.get('Content-Type', ''):
+            return json.loads(body or b'{}')
+        params = dict(urllib.parse.parse_qsl(body.decode('utf-8', 'replace')))
+        params.update(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        return params
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if server.latency:
+            time.sleep(server.latency)
+        path = urllib.parse.urlsplit(self.path).path
+
+        if path.startswith('/upload/'):
+            server.record('upload', None, 200, len(body))
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'OK')
+            return
+
+        method = path.rsplit('/', 1)[-1]
+        params = self._params(body)
+        channel = params.get('channel') or params.get('channel_id')
+        retry_after = server.take_rate_limit(method)
+        if retry_after is not None:
+            server.record(method, channel, 429, len(body))
+            self._reply({'ok': False, 'error': 'ratelimited'}, 429, {'Retry-After': str(retry_after)})
+            return
+        server.record(method, channel, 200, len(body))
+
+        if method == 'auth.test':
+            self._reply({'ok': True, 'url': 'https://test.slack.com/', 'team': 'test', 'user': 'bot',
+                         'team_id': 'TTEST', 'user_id': 'UBOT', 'bot_id': 'BBOT'})
+        elif method in ('chat.postMessage', 'chat.update'):
+            ts = params.get('ts') or f"{time.time():.6f}"
+            self._reply({'ok': True, 'channel': channel, 'ts': ts, 'message': {'text': params.get('text'), 'ts': ts}})
+        elif method == 'files.getUploadURLExternal':
+            file_id = f"F{len(server.calls)}"
+            self._reply({'ok': True, 'file_id': file_id,
+                         'upload_url': f"http://127.0.0.1:{server.server_address[1]}/upload/{file_id}"})
+        else:
+            self._reply({'ok': True})
+
+
+class FakeSlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), FakeSlackHandler)
+        self.latency = latency
+        self.calls = []  # {'method', 'channel', 'status', 'bytes', 't'}
+        self._rate_limits = {}  # método -> lista de Retry-After ainda a devolver
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/"
+
+    def record(self, method, channel, status, nbytes):
+        with self._lock:
+            self.calls.append({'method': method, 'channel': channel, 'status': status, 'bytes': nbytes,
+                               't': time.monotonic()})
+
+    # As próximas `times` chamadas ao método recebem 429 com o Retry-After informado
+    def rate_limit(self, method, times=1, retry_after=1):
+        with self._lock:
+            self._rate_limits.setdefault(method, []).extend([retry_after] * times)
+
+    def take_rate_limit(self, method):
+        with self._lock:
+            pending = self._rate_limits.get(method)
+            return pending.pop(0) if pending else None
+
+    def calls_to(self, method, status=None):
+        with self._lock:
+            return [call for call in self.calls if call['method'] == method
+                    and (status is None or call['status'] == status)]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-slack', daemon=True).start()
+        return self
@@ -0,0 +1,108 @@
+import json
+import pandas as pd
+from diffs import CatalogDiff, DIFF_HASH_VERSION, row_hashes
+
+
+def catalog(**overrides):
+    df = pd.DataFrame({
+        'row_id': [1, 2, 3, 4],
+        'sku': ['A', 'B', 'C', 'D'],
+        'name': ['Tile', 'Sink', None, 'Lamp'],
+        'price': [10.0, 20.0, 30.0, 40.0],
+        'updated_at': ['t0'] * 4,
+    })
+    for column, values in overrides.items():
+        df[column] = values
+    return df
+
+
+def changes(report):
+    return {(row.change, row.row_id): row.changed_columns for row in report.itertuples()}
+
+
+def test_first_compare_has_no_baseline(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    assert diff.compare(catalog()) is None
+    diff.save(catalog())
+    assert diff.has_baseline
+    assert diff.baseline_info()['hash_version'] == DIFF_HASH_VERSION
+
+
+def test_classifies_added_removed_and_modified(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    diff.save(catalog())
+    current = catalog(price=[10.0, 25.0, 30.0, 40.0], name=['Tile', 'Sink', None, 'Desk lamp'],
+                      updated_at=['t1'] * 4)
+    current = pd.concat([current[current['row_id'] != 1],
+                         pd.DataFrame({'row_id': [5], 'sku': ['E'], 'name': ['Rug'], 'price': [50.0],
+                                       'updated_at': ['t1']})], ignore_index=True)
+
+    report = diff.compare(current)
+
+    assert changes(report) == {('added', 5): '', ('removed', 1): '', ('modified', 2): 'price',
+                               ('modified', 4): 'name'}
+    # A linha removida vem da base, com os valores antigos
+    assert report.loc[report['change'] == 'removed', 'sku'].tolist() == ['A']
+
+
+def test_lists_every_changed_column(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    diff.save(catalog())
+    report = diff.compare(catalog(name=['Tile', 'Sink', None, 'Desk lamp'], price=[10.0, 20.0, 30.0, 45.0]))
+    assert changes(report) == {('modified', 4): 'name, price'}
+
+
+def test_values_moved_between_columns_are_a_change(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    df = catalog(color=['red', 'blue', 'red', 'green'], finish=['blue', 'red', 'blue', 'matte'])
+    diff.save(df)
+    report = diff.compare(df.assign(color=['blue', 'blue', 'red', 'green'], finish=['red', 'red', 'blue', 'matte']))
+    assert changes(report) == {('modified', 1): 'color, finish'}
+
+
+def test_same_values_with_another_dtype_are_unchanged(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    diff.save(catalog(stock=[1, 2, 3, 4], color=['red', 'red', 'blue', None]))
+    current = catalog(stock=[1.0, 2.0, 3.0, 4.0], color=pd.Categorical(['red', 'red', 'blue', None]))
+    assert diff.compare(current).empty
+
+
+def test_unchanged_catalog_and_ignored_columns(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    diff.save(catalog())
+    report = diff.compare(catalog(updated_at=['t1'] * 4))
+    assert report.empty
+    assert list(report.columns[:2]) == ['change', 'changed_columns']
+
+
+def test_null_and_empty_string_are_different(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    diff.save(catalog())
+    report = diff.compare(catalog(name=['Tile', 'Sink', '', 'Lamp']))
+    assert changes(report) == {('modified', 3): 'name'}
+
+
+def test_duplicate_row_ids_keep_the_first_row(tmp_path):
+    diff = CatalogDiff(str(tmp_path))
+    duplicated = pd.concat([catalog(), catalog().iloc[[1]].assign(price=99.0)], ignore_index=True)
+    diff.save(duplicated)
+
+    current = pd.concat([catalog(), catalog().iloc[[0]].assign(price=99.0)], ignore_index=True)
+    hashes = row_hashes(current)
+    assert diff.compare(current).empty
+    assert diff.compare(current, hashes).empty
+    diff.save(current, hashes)
+    assert diff.baseline_info()['rows'] == 4
+
+
+def test_duplicate_row_ids_in_an_old_baseline(tmp_path):
+    # Base gravada antes da deduplicação, com row_id repetido e hashes de outra versão
+    diff = CatalogDiff(str(tmp_path))
+    old = pd.concat([catalog(), catalog().iloc[[2]]], ignore_index=True)
+    old.assign(_row_hash=0).to_parquet(diff.data_path, index=False)
+    with open(diff.state_path, 'w') as state:
+        json.dump({'saved_at': 0, 'rows': len(old)}, state)
+
+    report = diff.compare(catalog(price=[10.0, 20.0, 31.0, 40.0]))
+
+    assert changes(report) == {('modified', 3): 'price'}
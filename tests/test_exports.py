@@ -0,0 +1,62 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from exports import ExportFile, inflight_bytes
+
+MAX_PART_SIZE = 1000000
+
+
+def chunks(rows=60000, chunk_size=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'row_id': np.arange(rows),
+        'sku': [f"SKU{i:07d}" for i in range(rows)],
+        'name': [f"Porcelain tile {rng.integers(10 ** 6)} {'x' * int(rng.integers(40))}" for _ in range(rows)],
+        'brand': rng.choice(['Acme', 'Portobello', 'Eliane', 'Deca'], rows),
+        'price': rng.random(rows) * 100,
+        'stock': rng.integers(0, 10, rows),
+    })
+    return [df.iloc[start:start + chunk_size] for start in range(0, rows, chunk_size)]
+
+
+def read_part(export_format, part):
+    part.seek(0)
+    data = io.BytesIO(part.read())
+    if export_format == 'parquet':
+        return pd.read_parquet(data)
+    if export_format == 'xlsx':
+        return pd.read_excel(data)
+    return pd.read_csv(data, compression='gzip' if export_format == 'csv.gz' else None)
+
+
+@pytest.mark.parametrize('export_format, rows', [('csv', 60000), ('csv.gz', 150000), ('parquet', 150000),
+                                                 ('xlsx', 40000)])
+def test_parts_stay_under_the_limit(export_format, rows):
+    export_file = ExportFile(export_format, max_part_size=MAX_PART_SIZE)
+    before = inflight_bytes()
+    try:
+        for chunk in chunks(rows):
+            export_file.write(chunk)
+        export_file.close()
+
+        sizes = [part.seek(0, io.SEEK_END) for part in export_file.parts]
+        assert len(sizes) > 1
+        assert max(sizes) <= MAX_PART_SIZE
+        # As partes, exceto a última, aproveitam boa parte do limite
+        assert min(sizes[:-1]) > MAX_PART_SIZE / 2
+        assert inflight_bytes() - before == export_file.size
+        assert sum(len(read_part(export_format, part)) for part in export_file.parts) == rows
+    finally:
+        export_file.cleanup()
+    assert inflight_bytes() == before
+
+
+def test_part_names():
+    export_file = ExportFile('csv', max_part_size=MAX_PART_SIZE)
+    try:
+        export_file.write(chunks(10, 10)[0])
+        export_file.close()
+        assert [name for name, _ in export_file.files('export')] == ['export.csv']
+    finally:
+        export_file.cleanup()
@@ -0,0 +1,131 @@
+import threading
+import time
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from images import ImageScanner, image_urls, classify, OK, MISSING, BROKEN, ERROR
+
+
+# Servidor de imagens local: /img/* imagem, /missing/* 404, /html/* página HTML, /slow/* lento,
+# /nohead/* recusa HEAD (405) e responde ao GET com Range
+class ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, content_type='image/jpeg', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        path = unquote(self.path)
+        self.server.requests.append(('HEAD', path, self.headers.get('If-None-Match')))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        kind = path.split('/')[1]
+        if kind == 'img':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self._respond(304)
+            else:
+                self._respond(200, headers={'ETag': '"v1"'})
+        elif kind == 'missing':
+            self._respond(404, 'text/html')
+        elif kind == 'html':
+            self._respond(200, 'text/html')
+        elif kind == 'slow':
+            time.sleep(2)
+            self._respond(200)
+        elif kind == 'nohead':
+            self._respond(405, 'text/plain')
+        else:
+            self._respond(500, 'text/plain')
+
+    def do_GET(self):
+        self.server.requests.append(('GET', unquote(self.path), self.headers.get('Range')))
+        self._respond(206)
+
+
+@pytest.fixture
+def image_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.latency = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def catalog(paths):
+    return pd.DataFrame({'row_id': range(1, len(paths) + 1), 'sku': [f"SKU{i}" for i in range(len(paths))],
+                         'url_key': paths})
+
+
+def template(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/{{url_key}}"
+
+
+def test_image_urls_skips_rows_without_the_template_fields():
+    df = pd.DataFrame({'row_id': [1, 2], 'sku': ['A 1', None], 'url_key': ['a', 'b']})
+    assert image_urls(df, 'https://cdn/{sku}.jpg') == ['https://cdn/A%201.jpg', None]
+
+
+def test_classify():
+    assert classify(200, 'image/png') == OK
+    assert classify(200, 'text/html') == BROKEN
+    assert classify(304, '') == OK
+    assert classify(404, 'text/html') == MISSING
+    assert classify(500, 'text/plain') == BROKEN
+
+
+def test_scan_classifies_responses(image_server, tmp_path):
+    scanner = ImageScanner(cache_path=str(tmp_path / 'images.sqlite'), timeout=1)
+    paths = ['img/a.jpg', 'missing/b.jpg', 'html/c.jpg', 'slow/d.jpg', 'nohead/e.jpg']
+
+    report = scanner.scan(catalog(paths), template(image_server))
+
+    statuses = dict(zip(report['url'].map(unquote).str.split('/').str[3], report['status']))
+    assert statuses == {'missing': MISSING, 'html': BROKEN, 'slow': ERROR}
+    assert ('GET', '/nohead/e.jpg', 'bytes=0-0') in image_server.requests
+    assert scanner.stats['errors'] == 1
+
+
+def test_rescan_uses_cache_and_revalidates(image_server, tmp_path):
+    cache_path = str(tmp_path / 'images.sqlite')
+    df = catalog(['img/a.jpg', 'missing/b.jpg', 'slow/c.jpg'])
+    ImageScanner(cache_path=cache_path, timeout=1).scan(df, template(image_server))
+
+    # Dentro do TTL nada é verificado de novo, exceto o erro (que não vai para o cache)
+    image_server.requests.clear()
+    scanner = ImageScanner(cache_path=cache_path, timeout=1)
+    scanner.scan(df, template(image_server))
+    assert [path for _, path, _ in image_server.requests] == ['/slow/c.jpg']
+    assert scanner.stats['fresh_from_cache'] == 2
+
+    # Depois do TTL a imagem é revalidada com If-None-Match e o 304 mantém o resultado
+    image_server.requests.clear()
+    scanner = ImageScanner(cache_path=cache_path, timeout=1, ttl=0)
+    report = scanner.scan(catalog(['img/a.jpg']), template(image_server))
+    assert report.empty
+    assert image_server.requests == [('HEAD', '/img/a.jpg', '"v1"')]
+    assert scanner.stats['revalidated'] == 1
+
+
+def test_many_urls_on_one_host_do_not_time_out_waiting_for_a_slot(image_server, tmp_path):
+    # 1000 URLs a 20 ms, 10 por vez no host: ~2 s no total, bem acima do timeout de 1 s por requisição
+    image_server.latency = 0.02
+    scanner = ImageScanner(cache_path=str(tmp_path / 'images.sqlite'), concurrency=50, per_host=10, timeout=1)
+
+    report = scanner.scan(catalog([f"img/{i}.jpg" for i in range(1000)]), template(image_server))
+
+    assert report.empty
+    assert scanner.stats['errors'] == 0
+    assert scanner.stats['checked'] == 1000
+    assert scanner.stats['elapsed'] > 1
@@ -0,0 +1,115 @@
+import threading
+import time
+import pytest
+from jobs import JobExecutor, JobRejected
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor(max_workers=4, limits={}, group_limits={}, max_queue=None)
+    yield executor
+    executor.shutdown()
+
+
+# Job que registra o início e só termina quando o teste libera
+class Blocking:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.log.append(self.name)
+        self.started.set()
+        assert self.release.wait(5)
+        return self.name
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_identical_jobs_run_once_and_notify_every_request(executor):
+    log, results = [], []
+    job = Blocking('export', log)
+
+    assert executor.submit('generate_redshift_csv', job, results.append, key='csv') is False
+    assert job.started.wait(5)
+    assert executor.submit('generate_redshift_csv', job, results.append, key='csv') is True
+    job.release.set()
+    wait_until(lambda: len(results) == 2)
+
+    assert log == ['export']
+    assert results == ['export', 'export']
+    assert executor.stats()['counters']['coalesced'] == 1
+    # Terminado o job, a mesma chave inicia um job novo
+    assert executor.submit('generate_redshift_csv', lambda: 'again', results.append, key='csv') is False
+    wait_until(lambda: len(results) == 3)
+
+
+def test_jobs_from_the_same_channel_run_in_order(executor):
+    log = []
+    first, second, other = Blocking('first', log), Blocking('second', log), Blocking('other', log)
+
+    executor.submit('count_to_ten', first, channel='C1')
+    executor.submit('count_to_ten', second, channel='C1')
+    executor.submit('count_to_ten', other, channel='C2')
+    assert first.started.wait(5) and other.started.wait(5)
+
+    # O segundo pedido do canal espera o primeiro, mesmo com threads livres; o outro canal não espera
+    assert not second.started.wait(0.2)
+    assert executor.position('count_to_ten', channel='C1') == 1
+    first.release.set()
+    assert second.started.wait(5)
+    assert log == ['first', 'other', 'second']
+    second.release.set()
+    other.release.set()
+
+
+def test_group_limit_is_shared_by_job_types():
+    executor = JobExecutor(max_workers=4, limits={}, group_limits={'warehouse': 1}, max_queue=None)
+    log = []
+    export, diff = Blocking('export', log), Blocking('diff', log)
+    try:
+        executor.submit('generate_redshift_csv', export)
+        executor.submit('catalog_diff', diff)
+        executor.submit('count_to_ten', lambda: log.append('count'))
+        assert export.started.wait(5)
+        wait_until(lambda: 'count' in log)
+
+        assert not diff.started.wait(0.2)
+        assert executor.stats()['groups']['warehouse'] == {'running': 1, 'limit': 1}
+        export.release.set()
+        assert diff.started.wait(5)
+        diff.release.set()
+    finally:
+        export.release.set()
+        diff.release.set()
+        executor.shutdown()
+
+
+def test_full_queue_rejects_new_jobs_but_accepts_coalesced_ones():
+    executor = JobExecutor(max_workers=1, limits={}, group_limits={}, max_queue=1)
+    log, results = [], []
+    running, waiting = Blocking('running', log), Blocking('waiting', log)
+    try:
+        executor.submit('count_to_ten', running)
+        assert running.started.wait(5)
+        executor.submit('generate_redshift_csv', waiting, results.append, key='csv')
+
+        with pytest.raises(JobRejected):
+            executor.submit('count_to_ten', lambda: None)
+        assert executor.submit('generate_redshift_csv', waiting, results.append, key='csv') is True
+        assert executor.stats()['counters']['rejected'] == 1
+        running.release.set()
+        waiting.release.set()
+        wait_until(lambda: len(results) == 2)
+        assert results == ['waiting', 'waiting']
+    finally:
+        running.release.set()
+        waiting.release.set()
+        executor.shutdown()
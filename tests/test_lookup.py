@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+import lookup
+from lookup import CatalogIndex, _Index
+
+
+def catalog():
+    return pd.DataFrame({
+        'row_id': [1, 2, 3, 4, 5, 6],
+        'sku': ['TL-100', 'TL-200', 'SK-300', 'LP-400', 'TL-500', 'RG-600'],
+        'manufacturer_sku': ['M1', 'M2', None, 'tl-200', 'M5', 'M6'],
+        'name': ['Porcelain Floor Tile', 'Wall Tile  Matte', 'Kitchen Sink', 'Floor Lamp', 'Tile Spacers', None],
+    })
+
+
+def names(index, fragment):
+    return [index.names[position] for position in index.search_name(fragment)]
+
+
+def test_search_name_matches_fragments_starting_with_the_prefix_first():
+    index = _Index(catalog())
+    assert names(index, 'tile') == ['tile spacers', 'wall tile matte', 'porcelain floor tile']
+    assert names(index, 'floor') == ['floor lamp', 'porcelain floor tile']
+    assert names(index, 'til') == ['tile spacers', 'wall tile matte', 'porcelain floor tile']
+
+
+def test_search_name_confirms_the_whole_fragment():
+    index = _Index(catalog())
+    # Todos os trigramas de "tile floor" existem no índice, mas não nessa ordem em nenhum nome
+    assert names(index, 'tile floor') == []
+    assert names(index, 'ti') == []
+    assert names(index, 'xyz') == []
+
+
+@pytest.fixture
+def index():
+    index = CatalogIndex(catalog, ttl=3600)
+    index.build(catalog())
+    return index
+
+
+def test_exact_keys_come_before_name_matches(index):
+    found, total = index.search('  TL-200 ')
+    # sku de um produto e manufacturer_sku de outro
+    assert found['row_id'].tolist() == [2, 4]
+    assert total == 2
+
+    found, total = index.search('Tile', limit=2)
+    assert found['row_id'].tolist() == [5, 2]
+    assert total == 3
+
+    found, _ = index.search('1')
+    assert found['row_id'].tolist() == [1]
+
+
+def test_stale_index_is_rebuilt_in_the_background(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(lookup.job_executor, 'submit', lambda job_type, fn, key=None: submitted.append(fn))
+    version = ['v1']
+    index = CatalogIndex(catalog, version=lambda: version[0], ttl=3600)
+
+    # Ainda sem índice: a busca não tem resultado e dispara uma única reconstrução
+    assert index.search('tile') is None
+    assert index.search('tile') is None
+    assert len(submitted) == 1
+    submitted.pop()()
+    assert index.loaded and not index.stale
+
+    version[0] = 'v2'
+    found, _ = index.search('sink')
+    assert found['row_id'].tolist() == [3]
+    assert len(submitted) == 1
@@ -0,0 +1,279 @@
+import json
+import threading
+import time
+import pandas as pd
+import pytest
+from redshift import ConnectionPool
+
+
+# Conexão falsa no lugar do psycopg2: conta os SELECT 1 e rollbacks e pode ser "derrubada"
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = 0
+        self.broken = False
+        self.pings = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError('server closed the connection unexpectedly')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise ConnectionError('server closed the connection unexpectedly')
+        self.conn.pings += 1
+
+
+class Connector:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.opened) + 1)
+        self.opened.append(conn)
+        return conn
+
+
+@pytest.fixture
+def connector():
+    return Connector()
+
+
+def make_pool(connector, **kwargs):
+    options = dict(min_size=1, max_size=2, max_idle=300, max_age=3600, timeout=1)
+    options.update(kwargs)
+    return ConnectionPool(connector, **options)
+
+
+def test_checkout_and_return_reuses_the_connection(connector):
+    pool = make_pool(connector)
+
+    with pool.connection() as first:
+        assert pool.size == 1
+    with pool.connection() as second:
+        pass
+
+    assert second is first
+    assert len(connector.opened) == 1
+    # Devolvida com rollback e verificada com SELECT 1 antes de ser entregue de novo
+    assert first.rollbacks >= 2
+    assert first.pings == 1
+
+
+def test_warm_opens_the_minimum(connector):
+    pool = make_pool(connector, min_size=2, max_size=3)
+    pool.warm()
+    assert pool.size == 2
+    assert len(connector.opened) == 2
+
+
+def test_getconn_without_timeout_returns_none_when_exhausted(connector, capsys):
+    pool = make_pool(connector)
+    held = [pool.getconn(), pool.getconn()]
+
+    started_at = time.monotonic()
+    assert pool.getconn(timeout=0) is None
+    assert time.monotonic() - started_at < 0.1
+    assert 'timed out' not in capsys.readouterr().out
+
+    for conn in held:
+        pool.putconn(conn)
+    assert pool.getconn(timeout=0) in held
+
+
+def test_getconn_waits_for_a_returned_connection(connector):
+    pool = make_pool(connector, max_size=1)
+    conn = pool.getconn()
+    threading.Timer(0.2, pool.putconn, args=(conn,)).start()
+
+    started_at = time.monotonic()
+    assert pool.getconn(timeout=2) is conn
+    assert time.monotonic() - started_at >= 0.15
+
+
+def test_getconn_times_out(connector):
+    pool = make_pool(connector, max_size=1)
+    pool.getconn()
+    started_at = time.monotonic()
+    assert pool.getconn(timeout=0.2) is None
+    assert time.monotonic() - started_at >= 0.15
+
+
+def test_broken_connection_is_dropped_on_return(connector):
+    pool = make_pool(connector)
+
+    with pytest.raises(ConnectionError):
+        with pool.connection() as conn:
+            conn.broken = True
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT * FROM catalog')
+
+    assert conn.closed
+    assert pool.size == 0
+    with pool.connection() as replacement:
+        assert replacement is not conn
+    assert len(connector.opened) == 2
+
+
+def test_connection_broken_while_idle_is_not_handed_out(connector):
+    pool = make_pool(connector)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    replacement = pool.getconn()
+
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.size == 1
+
+
+def test_putconn_discard_frees_the_slot(connector):
+    pool = make_pool(connector, max_size=1)
+    conn = pool.getconn()
+    pool.putconn(conn, discard=True)
+
+    assert conn.closed
+    replacement = pool.getconn(timeout=0)
+    assert replacement is not None and replacement is not conn
+
+
+def test_expired_connection_is_replaced(connector):
+    pool = make_pool(connector, max_idle=0.05)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    time.sleep(0.1)
+
+    assert pool.getconn() is not conn
+    assert conn.closed
+
+
+@pytest.fixture
+def partitioned(connector, monkeypatch):
+    import redshift
+
+    pool = make_pool(connector, max_size=3)
+    monkeypatch.setattr(redshift, 'get_pool', lambda: pool)
+    monkeypatch.setattr(redshift.attribute_catalog, 'get', lambda conn: None)
+    monkeypatch.setattr(redshift, 'partition_filters', lambda conn, partitions, partition_by: [
+        (f"part {i}", None) for i in range(partitions)])
+    monkeypatch.setattr(redshift, 'extract_partition', lambda conn, mode, limit, product_filter, attribute_filter:
+                        redshift.query_to_dataframe(conn, product_filter))
+    failing = set()
+
+    def read_sql(query, conn):
+        if query in failing:
+            failing.add(conn)
+            raise ConnectionError(f"{query}: server closed the connection unexpectedly")
+        return pd.DataFrame({'row_id': [int(query.split()[1])]})
+
+    monkeypatch.setattr(pd, 'read_sql', read_sql)
+    return pool, failing
+
+
+def test_partitioned_extraction_concatenates_in_order(partitioned):
+    from redshift import extract_catalog_partitioned
+
+    pool, _ = partitioned
+    conn = pool.getconn()
+    df = extract_catalog_partitioned(conn, 'joins', limit=None, partitions=4)
+
+    assert df['row_id'].tolist() == [0, 1, 2, 3]
+    assert pool.size == 3  # as sessões extras voltaram ao pool
+
+
+def test_failed_partition_raises_instead_of_returning_a_partial_catalog(partitioned):
+    from redshift import extract_catalog_partitioned, query_to_dataframe
+
+    pool, failing = partitioned
+    failing.add('part 2')
+    conn = pool.getconn()
+
+    with pytest.raises(ConnectionError):
+        extract_catalog_partitioned(conn, 'joins', limit=None, partitions=4)
+
+    # Uma sessão extra que falhou é descartada; a do chamador volta pelo próprio chamador
+    failed_session = next(item for item in failing if isinstance(item, FakeConnection))
+    assert failed_session is conn or failed_session.closed
+    # Fora da extração em partes o erro continua virando um DataFrame vazio
+    assert query_to_dataframe(conn, 'part 2').empty
+
+
+def test_snapshot_of_an_empty_table_has_no_watermark(tmp_path, monkeypatch):
+    import redshift
+
+    def query(conn, sql):
+        if 'MAX(p.updated_at)' in sql:
+            return pd.DataFrame({'watermark': pd.Series([pd.NaT], dtype='datetime64[ns]')})
+        return pd.DataFrame({'row_id': pd.Series([], dtype='int64')})
+
+    monkeypatch.setattr(redshift, 'query_to_dataframe', query)
+    monkeypatch.setattr(redshift, 'resolve_attribute_ids', lambda conn, names: {})
+    snapshot = redshift.CatalogSnapshot(str(tmp_path))
+
+    df = snapshot.refresh(conn=None)
+
+    assert df.empty
+    assert snapshot.watermark is None
+    with open(snapshot.state_path) as state:
+        assert json.load(state)['watermark'] is None
+
+
+def test_snapshot_ignores_a_stored_nat_watermark(tmp_path):
+    import redshift
+
+    snapshot = redshift.CatalogSnapshot(str(tmp_path))
+    pd.DataFrame({'row_id': []}).to_parquet(snapshot.data_path)
+    with open(snapshot.state_path, 'w') as state:
+        json.dump({'watermark': 'NaT', 'rows': 0}, state)
+
+    snapshot.load()
+
+    assert snapshot.watermark is None
+
+
+def test_catalog_queries_skip_soft_deleted_products():
+    from redshift import build_catalog_query, build_product_query
+
+    for query in (build_catalog_query(None, {}), build_product_query({}, None)):
+        assert 'p._sdc_deleted_at__string is null' in query
+        assert 'p._sdc_deleted_at__inst is null' in query
+
+
+def test_main_returns_the_original_format_unless_compact_is_asked(connector, monkeypatch):
+    import redshift
+
+    pool = make_pool(connector)
+    monkeypatch.setattr(redshift, 'get_pool', lambda: pool)
+    original = pd.DataFrame({'row_id': [1, 2], 'sku': ['A', 'B'], 'name': ['Tile', ''], 'color': ['', 'Red'],
+                             'status': [1, 1]})
+    # A cópia local guarda o catálogo compacto: '' vira nulo e textos repetidos viram category
+    compact = redshift.compact_catalog_frame(original)
+    monkeypatch.setattr(redshift.catalog_snapshot, 'refresh', lambda conn: compact)
+
+    df = redshift.main(extraction_mode='snapshot', limit=None, rename=False)
+    assert df['name'].tolist() == ['Tile', '']
+    assert df['color'].tolist() == ['', 'Red']
+    assert not any(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes)
+
+    df = redshift.main(extraction_mode='snapshot', limit=None, compact=True, rename=False)
+    assert df['name'].isna().tolist() == [False, True]
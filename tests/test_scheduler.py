@@ -0,0 +1,103 @@
+import calendar
+import threading
+import time
+import pytest
+import scheduler
+from scheduler import CronSchedule, Scheduler, _parse_field
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def epoch(*fields):
+    return calendar.timegm(fields + (0,) * (6 - len(fields)))
+
+
+@pytest.mark.parametrize('field, expected', [
+    ('*', set(range(0, 24))),
+    ('*/6', {0, 6, 12, 18}),
+    ('2-5', {2, 3, 4, 5}),
+    ('1-10/4', {1, 5, 9}),
+    ('0,12,20-21', {0, 12, 20, 21}),
+    ('7', {7}),
+])
+def test_parse_field(field, expected):
+    assert _parse_field(field, 0, 23) == expected
+
+
+@pytest.mark.parametrize('field', ['24', '5-2', '*/0', 'a', '1-', ''])
+def test_parse_field_rejects_invalid_values(field):
+    with pytest.raises(ValueError):
+        _parse_field(field, 0, 23)
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '0 0 * * * *', '60 * * * *', '0 0 0 * *', '0 0 * 13 *',
+                                        '0 0 * * 8'])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_next_after_steps_and_ranges():
+    schedule = CronSchedule('*/30 2-5 * * *')
+    assert schedule.next_after(epoch(2024, 1, 1, 2, 0)) == epoch(2024, 1, 1, 2, 30)
+    assert schedule.next_after(epoch(2024, 1, 1, 5, 30)) == epoch(2024, 1, 2, 2, 0)
+    # O minuto seguinte, nunca o próprio t
+    assert CronSchedule('* * * * *').next_after(epoch(2024, 1, 1, 0, 0) + 59) == epoch(2024, 1, 1, 0, 1)
+
+
+def test_day_of_month_or_day_of_week_when_both_are_restricted():
+    schedule = CronSchedule('0 0 1 * 1')
+    # 2024-01-01 é segunda; depois dela, a próxima segunda (dia 8) vem antes do dia 1 de fevereiro
+    assert schedule.next_after(epoch(2024, 1, 1, 0, 0)) == epoch(2024, 1, 8)
+    assert schedule.next_after(epoch(2024, 1, 29, 0, 0)) == epoch(2024, 2, 1)
+    assert schedule.matches(epoch(2024, 2, 1))  # quinta-feira, mas dia 1
+    assert schedule.matches(epoch(2024, 2, 5))  # segunda-feira
+
+
+def test_day_and_weekday_when_one_of_them_is_a_star():
+    # Só segundas, qualquer dia do mês
+    assert CronSchedule('0 0 * * 1').next_after(epoch(2024, 1, 2)) == epoch(2024, 1, 8)
+    # Só dia 13, qualquer dia da semana
+    assert CronSchedule('0 0 13 * *').next_after(epoch(2024, 1, 2)) == epoch(2024, 1, 13)
+
+
+def test_sunday_is_zero_or_seven():
+    # 2024-01-07 é domingo
+    assert CronSchedule('30 6 * * 7').next_after(epoch(2024, 1, 1)) == epoch(2024, 1, 7, 6, 30)
+    assert CronSchedule('30 6 * * 0').next_after(epoch(2024, 1, 1)) == epoch(2024, 1, 7, 6, 30)
+
+
+def test_next_after_finds_rare_dates_quickly():
+    started_at = time.monotonic()
+    assert CronSchedule('0 12 29 2 *').next_after(epoch(2024, 3, 1)) == epoch(2028, 2, 29, 12, 0)
+    assert time.monotonic() - started_at < 0.5
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 31 2 *').next_after(epoch(2024, 1, 1))
+
+
+def test_loop_survives_a_schedule_that_cannot_compute_the_next_run(monkeypatch, capsys):
+    monkeypatch.setattr(scheduler, '_RETRY_INTERVAL', 0.05)
+    runs = threading.Event()
+
+    class FlakySchedule:
+        calls = 0
+
+        def next_after(self, t):
+            self.calls += 1
+            if self.calls == 1:
+                raise ValueError('clock went away')
+            return t
+
+    job = Scheduler(FlakySchedule(), runs.set, name='test-scheduler').start()
+    try:
+        assert runs.wait(2)
+    finally:
+        job.stop()
+    assert 'Error in test-scheduler: clock went away' in capsys.readouterr().out
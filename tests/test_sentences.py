@@ -0,0 +1,127 @@
+import json
+import pandas as pd
+import pytest
+import sentences
+from sentences import (ChatCompletionBackend, SentenceChecker, VerdictCache, catalog_sentences, make_batches,
+                       parse_verdicts, sentence_key)
+
+
+def catalog(descriptions):
+    return pd.DataFrame({'row_id': range(1, len(descriptions) + 1),
+                         'sku': [f"SKU{i}" for i in range(len(descriptions))], 'description': descriptions})
+
+
+def make_checker(server, tmp_path, **kwargs):
+    options = dict(batch_size=4, concurrency=2, max_retries=2)
+    options.update(kwargs)
+    return SentenceChecker(backend=ChatCompletionBackend(api_key='test', base_url=server.url),
+                           cache_path=str(tmp_path / 'sentences.sqlite'), **options)
+
+
+DESCRIPTIONS = [f"Porcelain tile number {i} for teh kitchen floor." if i % 3 == 0
+                else f"Porcelain tile number {i} for the bathroom wall." for i in range(10)]
+
+
+def test_catalog_sentences_splits_and_skips_short_ones():
+    found = catalog_sentences(catalog(['<p>Matte porcelain tile for floors. Rectified edges on all sides.</p> Ok.',
+                                       None]), ['description'])
+    assert found['sentence'].tolist() == ['Matte porcelain tile for floors.', 'Rectified edges on all sides.']
+    assert found['row'].tolist() == [0, 0]
+
+
+def test_make_batches_by_count_and_size():
+    items = [(str(i), 'x' * 30) for i in range(10)]
+    assert [len(batch) for batch in make_batches(items, batch_size=4, batch_chars=1000)] == [4, 4, 2]
+    assert [len(batch) for batch in make_batches(items, batch_size=40, batch_chars=100)] == [3, 3, 3, 1]
+
+
+def test_parse_verdicts_handles_partial_and_malformed_items():
+    batch = [('k0', 'Teh first sentence here.'), ('k1', 'The second sentence here.'), ('k2', 'A third one here.')]
+    content = 'Sure! ' + json.dumps([
+        {'id': 0, 'ok': False, 'correction': 'The first sentence here.'},
+        {'id': '1', 'ok': False, 'correction': 'the  second sentence here.'},  # igual à original
+        'not an object', {'ok': False}, {'id': None}, {'id': 'two'}, {'id': 7, 'ok': False},
+    ])
+
+    verdicts = parse_verdicts(content, batch)
+
+    # k2 não veio na resposta: fica sem veredicto
+    assert verdicts == {'k0': (False, 'The first sentence here.'), 'k1': (True, None)}
+
+
+@pytest.mark.parametrize('content', ["I can't do that.", '{"id": 0, "ok": true}', '[{"id": 0,'])
+def test_parse_verdicts_rejects_responses_without_an_array(content):
+    with pytest.raises(ValueError):
+        parse_verdicts(content, [('k0', 'A sentence long enough.')])
+
+
+def test_check_batches_and_reports_corrections(fake_completions, tmp_path):
+    checker = make_checker(fake_completions, tmp_path)
+
+    report = checker.check(catalog(DESCRIPTIONS), ['description'])
+
+    assert [len(sentences) for sentences, _ in fake_completions.batches] == [4, 4, 2]
+    assert report['row_id'].tolist() == [1, 4, 7, 10]
+    assert report['correction'].str.contains('for the kitchen').all()
+    assert checker.stats['checked'] == 10
+    assert checker.stats['tokens'] == 100
+    assert checker.stats['batches'] == 3
+
+
+def test_cache_hits_skip_the_model(fake_completions, tmp_path):
+    descriptions = DESCRIPTIONS + ['Porcelain tile number 0 for  TEH kitchen floor.']  # repetida após normalizar
+    make_checker(fake_completions, tmp_path).check(catalog(descriptions), ['description'])
+    assert sum(len(sentences) for sentences, _ in fake_completions.batches) == 10
+
+    fake_completions.batches.clear()
+    checker = make_checker(fake_completions, tmp_path)
+    report = checker.check(catalog(descriptions + ['A brand new sentence about teh grout.']), ['description'])
+
+    assert fake_completions.batches == [(['A brand new sentence about teh grout.'], 'ok')]
+    assert checker.stats['cache_hits'] == 10
+    assert len(report) == 6
+
+
+def test_rate_limited_batch_is_retried(fake_completions, tmp_path):
+    fake_completions.respond_with('rate_limited')
+    checker = make_checker(fake_completions, tmp_path, batch_size=10)
+
+    report = checker.check(catalog(DESCRIPTIONS), ['description'])
+
+    assert len(report) == 4
+    assert checker.stats['rate_limited'] == 1
+    assert checker.stats['retries'] == 1
+    assert checker.stats['checked'] == 10
+
+
+def test_malformed_response_is_retried_then_given_up(fake_completions, tmp_path, monkeypatch):
+    monkeypatch.setattr(sentences.time, 'sleep', lambda seconds: None)
+    fake_completions.respond_with('malformed', 'malformed', 'malformed')
+    checker = make_checker(fake_completions, tmp_path, batch_size=10, max_retries=2)
+
+    report = checker.check(catalog(DESCRIPTIONS), ['description'])
+
+    assert report.empty
+    assert checker.stats['failed_batches'] == 1
+    assert checker.stats['unchecked'] == 10
+    # Nada foi para o cache: a próxima verificação manda as frases de novo
+    cache = VerdictCache(checker.cache_path)
+    assert cache.get_many(sentence_key(sentence) for sentence in DESCRIPTIONS) == {}
+    cache.close()
+
+
+def test_partial_and_garbage_verdicts(fake_completions, tmp_path):
+    fake_completions.respond_with('partial', 'garbage')
+    checker = make_checker(fake_completions, tmp_path, batch_size=10, concurrency=1)
+    descriptions = DESCRIPTIONS + [f"Grout number {i} for teh joints between tiles." for i in range(10)]
+
+    report = checker.check(catalog(descriptions), ['description'])
+
+    # Primeiro lote: só metade dos veredictos; segundo: itens inválidos ignorados, os válidos aproveitados
+    assert checker.stats['checked'] == 15
+    assert checker.stats['unchecked'] == 5
+    assert len(report) == 2 + 10
+
+    fake_completions.batches.clear()
+    checker.check(catalog(descriptions), ['description'])
+    assert [len(sentences) for sentences, _ in fake_completions.batches] == [5]
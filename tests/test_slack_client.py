@@ -0,0 +1,140 @@
+import asyncio
+import io
+import threading
+import time
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_client import (AsyncSlackClient, PausingRateLimitRetryHandler, RateLimiter, SlackClient, TIER_LIMITS,
+                          TokenBucket, upload_files)
+from metrics import SLACK_RATE_LIMITED
+
+
+def make_client(fake_slack, tier_limits=None, **kwargs):
+    return SlackClient(token='xoxb-test', base_url=fake_slack.url, limiter=RateLimiter(tier_limits), **kwargs)
+
+
+def rate_limited_count(method):
+    return sum(value for _, labels, value in SLACK_RATE_LIMITED.samples() if dict(labels).get('method') == method)
+
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0 < bucket.try_acquire() <= 0.1
+
+
+def test_token_bucket_pause_blocks_until_retry_after():
+    bucket = TokenBucket(rate=100, capacity=5)
+    bucket.pause(0.3)
+    assert bucket.try_acquire() == pytest.approx(0.3, abs=0.05)
+    started_at = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started_at >= 0.25
+
+
+def test_retries_after_429_honouring_retry_after(fake_slack):
+    fake_slack.rate_limit('chat.update', times=1, retry_after=1)
+    client = make_client(fake_slack)
+    before = rate_limited_count('chat.update')
+
+    started_at = time.monotonic()
+    response = client.chat_update(channel='C1', ts='1.0', text='hello')
+
+    assert response['ok']
+    assert time.monotonic() - started_at >= 1
+    assert [call['status'] for call in fake_slack.calls_to('chat.update')] == [429, 200]
+    assert rate_limited_count('chat.update') == before + 1
+
+
+def test_429_pauses_other_calls_to_the_same_method(fake_slack):
+    fake_slack.rate_limit('chat.update', times=1, retry_after=1)
+    client = make_client(fake_slack)
+
+    first = threading.Thread(target=client.chat_update, kwargs={'channel': 'C1', 'ts': '1.0', 'text': 'a'})
+    first.start()
+    while not fake_slack.calls_to('chat.update', status=429):
+        time.sleep(0.01)
+    client.chat_update(channel='C2', ts='2.0', text='b')
+    first.join()
+
+    limited_at = fake_slack.calls_to('chat.update', status=429)[0]['t']
+    assert all(call['t'] - limited_at >= 0.9 for call in fake_slack.calls_to('chat.update', status=200))
+    # Outros métodos não são segurados
+    client.auth_test()
+    assert fake_slack.calls_to('auth.test', status=200)
+
+
+def test_gives_up_after_max_retries(fake_slack):
+    fake_slack.rate_limit('chat.update', times=5, retry_after=0)
+    limiter = RateLimiter()
+    client = SlackClient(token='xoxb-test', base_url=fake_slack.url, limiter=limiter,
+                         retry_handlers=[PausingRateLimitRetryHandler(limiter, max_retry_count=2)])
+
+    with pytest.raises(SlackApiError) as excinfo:
+        client.chat_update(channel='C1', ts='1.0', text='hello')
+
+    assert excinfo.value.response.status_code == 429
+    assert len(fake_slack.calls_to('chat.update')) == 3
+
+
+def test_post_message_burst_is_queued_per_channel(fake_slack):
+    client = make_client(fake_slack, dict(TIER_LIMITS, post=(10, 2)))
+
+    started_at = time.monotonic()
+    for i in range(5):
+        client.chat_postMessage(channel='CBUSY', text=f"message {i}")
+    busy_elapsed = time.monotonic() - started_at
+    started_at = time.monotonic()
+    client.chat_postMessage(channel='COTHER', text='other channel')
+
+    # 2 na rajada, as outras 3 espaçadas a 10/s; nenhuma falha, nenhum 429
+    assert busy_elapsed >= 0.25
+    assert time.monotonic() - started_at < 0.1
+    assert len(fake_slack.calls_to('chat.postMessage', status=200)) == 6
+
+
+def test_concurrent_calls_share_the_client_under_latency(fake_slack):
+    fake_slack.latency = 0.3
+    client = make_client(fake_slack)
+    threads = [threading.Thread(target=client.auth_test) for _ in range(5)]
+
+    started_at = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - started_at < 1.0
+    assert len(fake_slack.calls_to('auth.test', status=200)) == 5
+
+
+def test_upload_retries_rate_limited_steps(fake_slack):
+    fake_slack.latency = 0.05
+    fake_slack.rate_limit('files.completeUploadExternal', times=1, retry_after=0)
+    client = make_client(fake_slack)
+    files = [(f"part{i}.csv", io.BytesIO(b'a,b\n1,2\n' * 100)) for i in range(3)]
+
+    upload_files(client, 'C1', files, 'Export')
+
+    assert len(fake_slack.calls_to('upload')) == 3
+    assert len(fake_slack.calls_to('files.completeUploadExternal', status=200)) == 3
+    assert sum(call['bytes'] for call in fake_slack.calls_to('upload')) == 3 * 800
+
+
+def test_async_client_retries_after_429_and_shares_the_limiter(fake_slack):
+    fake_slack.rate_limit('chat.update', times=1, retry_after=1)
+    limiter = RateLimiter()
+
+    async def update():
+        client = AsyncSlackClient(token='xoxb-test', base_url=fake_slack.url, limiter=limiter)
+        return await client.chat_update(channel='C1', ts='1.0', text='hello')
+
+    started_at = time.monotonic()
+    response = asyncio.run(update())
+
+    assert response['ok']
+    assert time.monotonic() - started_at >= 1
+    assert [call['status'] for call in fake_slack.calls_to('chat.update')] == [429, 200]
+    # A pausa vale também para o cliente síncrono que usa o mesmo limitador
+    assert limiter.bucket('chat.update').blocked_until > 0
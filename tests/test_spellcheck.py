@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from spellcheck import SpellChecker, SymSpell, edit_distance, is_inflection
+
+
+def test_edit_distance():
+    assert edit_distance('tile', 'tile', 2) == 0
+    assert edit_distance('tile', 'tiles', 2) == 1
+    assert edit_distance('porcelian', 'porcelain', 2) == 1  # transposição conta uma vez
+    assert edit_distance('kitchen', 'kichten', 2) == 2
+    # Acima do limite a conta para e devolve limite + 1
+    assert edit_distance('tile', 'lamp', 2) == 3
+    assert edit_distance('tile', 'tiles and more', 2) == 3
+
+
+def test_lookup_prefers_distance_then_frequency():
+    engine = SymSpell(max_edit_distance=2)
+    engine.add_words({'porcelain': 10, 'ceramic': 50, 'cement': 5, 'cemented': 1})
+
+    assert engine.lookup('porcelain') is None
+    assert engine.lookup('porcelian') == 'porcelain'
+    assert engine.lookup('ceramik') == 'ceramic'
+    # 'cemetn' está a 1 de 'cement' e a 2 de 'ceramic'
+    assert engine.lookup('cemetn') == 'cement'
+    assert engine.lookup('wallpaper') is None
+
+
+def test_lookup_breaks_ties_by_frequency():
+    engine = SymSpell(max_edit_distance=1)
+    engine.add_words({'mate': 1, 'matt': 20})
+    assert engine.lookup('matx') == 'matt'
+
+
+def test_lookup_beyond_the_prefix():
+    engine = SymSpell(max_edit_distance=2, prefix_length=7)
+    engine.add_words({'waterproofing': 3})
+    assert engine.lookup('waterproofng') == 'waterproofing'
+
+
+@pytest.mark.parametrize('word, suggestion', [('tiles', 'tile'), ('kitchens', 'kitchen'), ('boxes', 'box'),
+                                              ('painted', 'paint'), ('tiling', 'tile'), ('shelves', 'shelf'),
+                                              ('batteries', 'battery'), ('fitted', 'fit'), ('tile', 'tiles')])
+def test_inflections(word, suggestion):
+    assert is_inflection(word, suggestion)
+
+
+@pytest.mark.parametrize('word, suggestion', [('porcelian', 'porcelain'), ('tils', 'tile'), ('colour', 'color')])
+def test_not_inflections(word, suggestion):
+    assert not is_inflection(word, suggestion)
+
+
+def catalog(extra=()):
+    names = ['Porcelain tile', 'Porcelain tiles for kitchens', 'Grey porcelain tile', 'Porcelian wall tile',
+             'Kitchen tile', 'Kitchen porcelain tile', 'Kitchen tile set'] + list(extra)
+    return pd.DataFrame({'row_id': range(1, len(names) + 1), 'sku': [f"SKU{i}" for i in range(len(names))],
+                         'name': names})
+
+
+def test_check_flags_typos_but_not_inflections(tmp_path):
+    checker = SpellChecker(cache_path=str(tmp_path / 'spellcheck.parquet'), min_count=3)
+
+    report = checker.check(catalog(), columns=['name'])
+
+    assert report[['row_id', 'word', 'suggestion']].values.tolist() == [[4, 'porcelian', 'porcelain']]
+    assert report['attribute'].tolist() == ['name']
+
+
+def test_check_only_rechecks_new_texts(tmp_path):
+    checker = SpellChecker(cache_path=str(tmp_path / 'spellcheck.parquet'), min_count=3)
+    checker.check(catalog(), columns=['name'])
+    engine = checker._engine
+
+    # Nada mudou: tudo vem do cache
+    report = checker.check(catalog(), columns=['name'])
+    assert checker.stats['checked'] == 0
+    assert len(report) == 1
+
+    # Um produto novo: só o texto dele é verificado, com o vocabulário já montado
+    report = checker.check(catalog(['Kitchen tyle']), columns=['name'])
+    assert checker.stats['checked'] == 1
+    assert checker._engine is engine
+    assert sorted(report['word']) == ['porcelian', 'tyle']
+
+    # Um processo novo lê os resultados do arquivo de cache
+    fresh = SpellChecker(cache_path=str(tmp_path / 'spellcheck.parquet'), min_count=3)
+    assert len(fresh.check(catalog(['Kitchen tyle']), columns=['name'])) == 2
+    assert fresh.stats['checked'] == 0
+
+
+def test_dictionary_change_invalidates_the_cache(tmp_path):
+    dictionary = tmp_path / 'dictionary.txt'
+    dictionary.write_text('wall 100\n')
+    checker = SpellChecker(cache_path=str(tmp_path / 'spellcheck.parquet'), dictionary_path=str(dictionary),
+                           min_count=3)
+    checker.check(catalog(), columns=['name'])
+
+    dictionary.write_text('wall 100\nporcelian 1\n')
+    report = checker.check(catalog(), columns=['name'])
+
+    assert checker.stats['checked'] == checker.stats['unique_texts']
+    assert report.empty
@@ -0,0 +1,68 @@
+import os
+import time
+import pytest
+from supervisor import Supervisor, merge_job_stats
+
+
+# Alvos de nível de módulo: os workers são iniciados com spawn e importam este arquivo de novo
+def sleep_forever(index):
+    while True:
+        time.sleep(1)
+
+
+def crash_once(index):
+    marker = os.path.join(os.environ['SUPERVISOR_TEST_DIR'], f"started-{index}")
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(3)
+    sleep_forever(index)
+
+
+def report():
+    return {'jobs': {'queue_depth': 1, 'running': {'export': 1}, 'inflight_keys': 0, 'counters': {}}}
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_rejects_fork():
+    with pytest.raises(ValueError):
+        Supervisor(sleep_forever, 1, start_method='fork')
+
+
+def test_workers_report_heartbeats():
+    supervisor = Supervisor(sleep_forever, 2, report=report, heartbeat_interval=0.2).start()
+    try:
+        assert wait_for(lambda: supervisor.health()['status'] == 'ok')
+        health = supervisor.health()
+        assert all(worker['alive'] and worker['pid'] != os.getpid() for worker in health['workers'])
+        assert health['jobs']['queue_depth'] == 2
+        assert health['jobs']['running'] == {'export': 2}
+    finally:
+        supervisor.stop()
+    assert not any(worker['alive'] for worker in supervisor.health()['workers'])
+
+
+def test_crashed_worker_is_restarted(tmp_path, monkeypatch):
+    # O diretório do marcador chega ao worker pelo ambiente, herdado pelo processo novo
+    monkeypatch.setenv('SUPERVISOR_TEST_DIR', str(tmp_path))
+    monkeypatch.setattr('supervisor.WORKER_RESTART_DELAY', 0.1)
+    supervisor = Supervisor(crash_once, 1, heartbeat_interval=0.2).start()
+    try:
+        assert wait_for(lambda: supervisor.health()['workers'][0]['restarts'] == 1)
+        assert supervisor.health()['workers'][0]['last_exitcode'] == 3
+        assert wait_for(lambda: supervisor.health()['status'] == 'ok')
+    finally:
+        supervisor.stop()
+
+
+def test_merge_job_stats():
+    merged = merge_job_stats([{'queue_depth': 2, 'running': {'a': 1}, 'counters': {'done': 3}},
+                              {'queue_depth': 1, 'running': {'a': 1, 'b': 2}, 'inflight_keys': 1}])
+    assert merged == {'queue_depth': 3, 'running': {'a': 2, 'b': 2}, 'inflight_keys': 1, 'counters': {'done': 3}}